@@ -0,0 +1,122 @@
+"""
+This is responsible for the images and fonts of the pygame front-end.
+Paths are resolved from the location of the package, not from the working directory, so the game starts from anywhere.
+Every image is decoded once; the piece sprites are scaled once per tile size and kept, so going back to a window size
+seen before costs nothing. With an atlas directory the scaled sprites of a tile size are also saved as one PNG strip
+and loaded from it on the next start. Fonts and rendered text are kept as well, since text is drawn every frame.
+"""
+
+import os
+from collections import OrderedDict
+
+import pygame as p
+
+# The Images folder next to the Chess package
+ImageDirectory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Images")
+
+
+class AssetManager():
+    pieces = ("bR", "bN", "bB", "bQ", "bK", "bp", "wR", "wN", "wB", "wQ", "wK", "wp")
+    # Number of rendered text surfaces that are kept, the ones used longest ago are dropped first
+    maxTexts = 256
+
+    def __init__(self, imageDirectory=ImageDirectory, atlasDirectory=None):
+        self.imageDirectory = imageDirectory
+        self.atlasDirectory = atlasDirectory
+        self.images = {}
+        self.sprites = {}   # {tile size: {piece: scaled surface}}
+        self.fonts = {}
+        self.texts = OrderedDict()
+
+    def path(self, name):
+        return os.path.join(self.imageDirectory, name)
+
+    '''
+    This decodes an image of the image directory once. Images are converted to the display's pixel format
+    (with convert_alpha) when a display mode is set, which makes blitting them much faster.
+    '''
+    def image(self, name):
+        surface = self.images.get(name)
+        if surface is None:
+            surface = p.image.load(self.path(name))
+            if p.display.get_surface() is not None:
+                surface = surface.convert_alpha()
+                self.images[name] = surface     # Only converted images are kept, so they get converted once a mode is set
+        return surface
+
+    def icon(self):
+        return self.image("mechanical-gears.png")
+
+    '''
+    The piece sprites {piece: surface} scaled to size x size pixels
+    '''
+    def pieceSprites(self, size):
+        sprites = self.sprites.get(size)
+        if sprites is None:
+            sprites = self.loadAtlas(size)
+            if sprites is None:
+                sprites = {piece: p.transform.scale(self.image(piece + ".png"), (size, size)) for piece in self.pieces}
+                self.saveAtlas(size, sprites)
+            self.sprites[size] = sprites
+        return sprites
+
+    def atlasPath(self, size):
+        return os.path.join(self.atlasDirectory, "pieces-%d.png" % size)
+
+    '''
+    This loads the sprites of a tile size from the atlas, or returns None when there is no up to date atlas
+    '''
+    def loadAtlas(self, size):
+        if self.atlasDirectory is None:
+            return None
+        path = self.atlasPath(size)
+        try:
+            atlasTime = os.path.getmtime(path)
+            if any(os.path.getmtime(self.path(piece + ".png")) > atlasTime for piece in self.pieces):
+                return None     # A piece image changed after the atlas was made
+            atlas = p.image.load(path)
+        except (OSError, p.error):
+            return None
+        if atlas.get_size() != (size * len(self.pieces), size):
+            return None
+        if p.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+        return {piece: atlas.subsurface(p.Rect(i * size, 0, size, size)).copy() for i, piece in enumerate(self.pieces)}
+
+    '''
+    This saves the sprites of a tile size side by side in one PNG, in the order of pieces
+    '''
+    def saveAtlas(self, size, sprites):
+        if self.atlasDirectory is None:
+            return
+        atlas = p.Surface((size * len(self.pieces), size), p.SRCALPHA)
+        for i, piece in enumerate(self.pieces):
+            atlas.blit(sprites[piece], (i * size, 0))
+        try:
+            os.makedirs(self.atlasDirectory, exist_ok=True)
+            p.image.save(atlas, self.atlasPath(size))
+        except (OSError, p.error):
+            pass    # The atlas only saves time on the next start, the game runs the same without it
+
+    def font(self, name, size, bold=False, italic=False):
+        key = (name, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is None:
+            font = p.font.SysFont(name, size, bold, italic)
+            self.fonts[key] = font
+        return font
+
+    '''
+    The surface of a text rendered in a font and color, rendered once and kept
+    '''
+    def text(self, text, size, color, name="Verdana", bold=True, italic=False):
+        key = (text, size, tuple(p.Color(color)), name, bold, italic)
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.font(name, size, bold, italic).render(text, False, color)
+            self.texts[key] = surface
+            if len(self.texts) > self.maxTexts:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(key)
+        return surface
@@ -0,0 +1,369 @@
+"""
+This is responsible for evaluating many positions at once with NumPy, for scoring large position sets (self-play
+dumps, opening trees) where calling Evaluation.evaluate once per position is the bottleneck.
+Positions are packed into an int8 array of piece codes, shape (N, 8, 8), or of one-hot piece planes, shape
+(N, 12, 64), and scored with whole-array operations: material and the tapered piece-square tables of Evaluation,
+plus a mobility term (the tiles attacked by the knights, bishops, rooks and queens that their side does not occupy).
+scalarEvaluate is the same score computed one position at a time in plain Python, as the reference.
+NumPy is only needed by the batch functions. It can be run from the command line: python -m Chess.BatchEvaluation --help
+"""
+
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:     # The scalar reference works without it
+    np = None
+
+from Chess import Bitboard
+from Chess import ChessEngine
+from Chess import Evaluation
+from Chess import PositionLoader
+
+# Piece codes of the packed boards: 0 is an empty tile and pieceOrder[i] has code i + 1 (plane i of the planes).
+# The order and the tile numbering (row * 8 + column, bit 0 is a8) are those of the bitboard backend.
+pieceOrder = Bitboard.pieceNames
+pieceCodes = {piece: code for code, piece in enumerate(pieceOrder, 1)}
+fenCodes = {ord(letter): pieceCodes[piece] for letter, piece in ChessEngine.fenToPiece.items()}
+
+# Centipawns per tile attacked by the pieces of a type, counted once however many of them attack it,
+# when the tile is not taken by their own side
+mobilityWeights = {"N": 4, "B": 5, "R": 2, "Q": 1}
+mobilityDirections = {"B": range(4, 8), "R": range(4), "Q": range(8)}   # Indices of ChessEngine.kingDirections
+
+
+'''
+The tiles attacked by pieces of one kind standing on tiles, a ray stopping at the first piece in its way
+'''
+
+def attackedTiles(tiles, kind, board):
+    attacked = set()
+    for r, c in tiles:
+        if kind == "N":
+            attacked.update(ChessEngine.knightTargets[r][c])
+            continue
+        rays = ChessEngine.tileRays[r][c]
+        for i in mobilityDirections[kind]:
+            for endRow, endCol in rays[i]:
+                attacked.add((endRow, endCol))
+                if board[endRow][endCol] != "--":
+                    break
+    return attacked
+
+
+'''
+The reference: the same score as evaluateBatch for one BoardState, visiting its pieces and their rays in Python.
+It does not need NumPy.
+'''
+
+def scalarEvaluate(bs, mobility=True):
+    score = Evaluation.evaluate(bs)
+    if not mobility:
+        return score
+    board = bs.board
+    total = 0
+    for piece, tiles in bs.pieceLocations.items():
+        weight = mobilityWeights.get(piece[1])
+        if tiles and weight is not None:
+            color = piece[0]
+            count = sum(1 for r, c in attackedTiles(tiles, piece[1], board) if board[r][c][0] != color)
+            total += weight * count if color == "w" else -weight * count
+    return score + (total if bs.whiteToMove else -total)
+
+
+def requireNumpy():
+    if np is None:
+        raise ImportError("Batch evaluation needs NumPy (pip install numpy)")
+
+
+'''
+The piece-square scores and phase weights of Evaluation as arrays indexed by piece code (row 0 is the empty tile),
+and the piece code of every pair of characters of BoardState.board; built on first use so that importing this module
+does not need NumPy
+'''
+
+tables = None
+
+
+def getTables():
+    global tables
+    if tables is None:
+        requireNumpy()
+        middlegame = np.zeros((13, 64), np.int32)
+        endgame = np.zeros((13, 64), np.int32)
+        phase = np.zeros(13, np.int32)
+        tileCodes = np.zeros((256, 256), np.int8)
+        for piece, code in pieceCodes.items():
+            middlegame[code] = Evaluation.middlegameScores[piece]
+            endgame[code] = Evaluation.endgameScores[piece]
+            phase[code] = Evaluation.phaseWeights[piece[1]]
+            tileCodes[ord(piece[0]), ord(piece[1])] = code
+        tables = (middlegame, endgame, phase, tileCodes)
+    return tables
+
+
+'''
+This packs BoardStates into an (N, 8, 8) int8 array of piece codes and an (N,) bool array of whiteToMove.
+The tiles are read from board, which every backend keeps, as one string per position and turned into codes all at
+once.
+'''
+
+def packBoards(positions):
+    tileCodes = getTables()[3]
+    positions = list(positions)
+    text = "".join(["".join(map("".join, bs.board)) for bs in positions]).encode("ascii")
+    characters = np.frombuffer(text, np.uint8).reshape(-1, 64, 2)
+    boards = tileCodes[characters[:, :, 0], characters[:, :, 1]].reshape(-1, 8, 8)
+    return boards, np.fromiter((bs.whiteToMove for bs in positions), bool, len(positions))
+
+
+'''
+This packs FEN strings the same way without building a BoardState for each of them, which is most of the cost of
+scoring a position file. Only the piece placement and side to move fields are read.
+'''
+
+def packFENs(fens):
+    requireNumpy()
+    fens = list(fens)
+    codes = bytearray(64 * len(fens))
+    whiteToMove = np.empty(len(fens), bool)
+    for i, fen in enumerate(fens):
+        placement, _, rest = fen.partition(" ")
+        tile = 64 * i
+        end = tile + 64
+        for letter in placement.encode():
+            if 49 <= letter <= 56:      # "1" to "8" empty tiles
+                tile += letter - 48
+            elif letter != 47:          # A "/" ends a row, which the tiles of the row have already counted
+                code = fenCodes.get(letter)
+                if code is None or tile >= end:
+                    raise ValueError("Invalid FEN piece placement: " + fen)
+                codes[tile] = code
+                tile += 1
+        if tile != end:
+            raise ValueError("Invalid FEN piece placement: " + fen)
+        whiteToMove[i] = not rest.startswith("b")
+    return np.frombuffer(codes, np.int8).reshape(-1, 8, 8), whiteToMove
+
+
+'''
+This turns (N, 8, 8) piece codes into (N, 12, 64) int8 one-hot planes, plane i being the tiles of pieceOrder[i],
+and planesToBoards turns them back
+'''
+
+def boardsToPlanes(boards):
+    requireNumpy()
+    codes = boards.reshape(len(boards), 1, 64)
+    return (codes == np.arange(1, 13, dtype=np.int8).reshape(1, 12, 1)).astype(np.int8)
+
+
+def planesToBoards(planes):
+    requireNumpy()
+    codes = np.arange(1, 13, dtype=np.int8).reshape(1, 12, 1)
+    return (planes * codes).sum(axis=1, dtype=np.int8).reshape(-1, 8, 8)
+
+
+'''
+Bitboards: an (N,) uint64 array holds one set of tiles per position. Moving a set one step in a direction (dr, dc) is
+a shift by dr * 8 + dc bits; the tiles that arrive on the wrong side of the board (a piece stepping right from the
+h file lands on the a file of the next row) are masked away with fileMasks[dc].
+'''
+
+def fileMask(columns):
+    return sum(1 << (r * 8 + c) for r in range(8) for c in columns)
+
+
+fileMasks = {-2: fileMask(range(6)), -1: fileMask(range(7)), 0: fileMask(range(8)), 1: fileMask(range(1, 8)),
+             2: fileMask(range(2, 8))}
+
+
+def shiftBits(bitboards, bits):
+    return bitboards << np.uint64(bits) if bits > 0 else bitboards >> np.uint64(-bits)
+
+
+def shift(bitboards, dr, dc):
+    return shiftBits(bitboards, dr * 8 + dc) & np.uint64(fileMasks[dc])
+
+
+'''
+The tiles attacked in direction (dr, dc) by the sliders, up to and including the first piece in the way.
+This is a Kogge-Stone fill: the sliders spread through the empty tiles in 3 doubling steps instead of 7 single ones.
+'''
+
+def slide(sliders, empty, dr, dc):
+    bits = dr * 8 + dc
+    passable = empty & np.uint64(fileMasks[dc])
+    for steps in (1, 2, 4):
+        sliders = sliders | (passable & shiftBits(sliders, bits * steps))
+        passable = passable & shiftBits(passable, bits * steps)
+    return shift(sliders, dr, dc)
+
+
+def popCount(bitboards):
+    if hasattr(np, "bitwise_count"):    # NumPy 2
+        return np.bitwise_count(bitboards)
+    byteCounts = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+    return byteCounts[bitboards.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+'''
+This packs (N, 8, 8) piece codes into (N, 13) uint64 bitboards, one per piece code (column 0 is the empty tiles)
+'''
+
+def boardsToBitboards(boards):
+    codes = boards.reshape(len(boards), 1, 64) == np.arange(13, dtype=np.int8).reshape(1, 13, 1)
+    return np.packbits(codes, axis=2, bitorder="little").view("<u8").reshape(len(boards), 13)
+
+
+'''
+The weighted mobility of the side whose pieces have the codes first to first + 5, for every position
+'''
+
+def sideMobility(bitboards, first, empty):
+    own = np.bitwise_or.reduce(bitboards[:, first:first + 6], axis=1)
+    mobility = np.zeros(len(bitboards), np.int32)
+    for kind, weight in mobilityWeights.items():
+        pieces = bitboards[:, first + pieceOrder.index("w" + kind)]
+        if not pieces.any():
+            continue
+        attacked = np.zeros_like(pieces)
+        if kind == "N":
+            for dr, dc in ChessEngine.knightMoves:
+                attacked |= shift(pieces, dr, dc)
+        else:
+            for i in mobilityDirections[kind]:
+                attacked |= slide(pieces, empty, *ChessEngine.kingDirections[i])
+        mobility += weight * popCount(attacked & ~own).astype(np.int32)
+    return mobility
+
+
+'''
+This scores a batch of positions from the side of the player to move, as Evaluation.evaluate plus the mobility term
+(without it when mobility is False). boards are (N, 8, 8) piece codes or (N, 12, 64) planes, whiteToMove an (N,)
+bool array. Returns an (N,) int32 array of centipawns.
+'''
+
+def evaluateBatch(boards, whiteToMove, mobility=True):
+    middlegameTable, endgameTable, phaseTable = getTables()[:3]
+    boards = np.asarray(boards)
+    if boards.shape[1:] == (12, 64):
+        boards = planesToBoards(boards)
+    elif boards.shape[1:] != (8, 8):
+        raise ValueError("Expected boards of shape (N, 8, 8) or (N, 12, 64), not %s" % (boards.shape,))
+    # Index code * 64 + tile of the flattened tables (int32 indices gather faster than intp ones)
+    indices = boards.reshape(len(boards), 64).astype(np.int32) * 64 + np.arange(64, dtype=np.int32)
+    middlegame = middlegameTable.ravel()[indices].sum(axis=1)
+    endgame = endgameTable.ravel()[indices].sum(axis=1)
+    bitboards = boardsToBitboards(boards)
+    phase = np.zeros(len(boards), np.int32)
+    for code in range(1, 13):
+        if phaseTable[code]:
+            phase += phaseTable[code] * popCount(bitboards[:, code]).astype(np.int32)
+    phase = np.minimum(phase, Evaluation.MaxPhase)
+    scores = (middlegame * phase + endgame * (Evaluation.MaxPhase - phase)) // Evaluation.MaxPhase
+    if mobility:
+        scores += sideMobility(bitboards, 1, bitboards[:, 0]) - sideMobility(bitboards, 7, bitboards[:, 0])
+    return np.where(whiteToMove, scores, -scores).astype(np.int32)
+
+
+'''
+This scores BoardStates or FEN strings in batches of batchSize positions (the arrays of a batch stay small enough
+for the CPU caches) and returns one int32 array of all the scores
+'''
+
+def evaluatePositions(positions, mobility=True, batchSize=4096):
+    requireNumpy()
+    positions = list(positions)
+    scores = []
+    for start in range(0, len(positions), batchSize):
+        batch = positions[start:start + batchSize]
+        boards, whiteToMove = packFENs(batch) if isinstance(batch[0], str) else packBoards(batch)
+        scores.append(evaluateBatch(boards, whiteToMove, mobility))
+    return np.concatenate(scores) if scores else np.zeros(0, np.int32)
+
+
+'''
+This plays random games from the start position and returns the FEN of every position reached, as a benchmark set
+'''
+
+def randomPositions(count, seed=0, maxPlies=200):
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        bs = ChessEngine.BoardState()
+        for _ in range(maxPlies):
+            moves = bs.getLegalMoves()
+            if not moves or len(fens) >= count:
+                break
+            bs.makeMove(rng.choice(moves))
+            fens.append(bs.toFEN())
+    return fens
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the NumPy batch evaluation against the scalar one")
+    parser.add_argument("files", nargs="*", help="FEN/EPD files to score (default: positions of random games)")
+    parser.add_argument("-n", "--positions", type=int, default=20000,
+                        help="number of random positions, or the most positions read from the files")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random games")
+    parser.add_argument("--batch", type=int, default=4096, help="positions per batch (default: 4096)")
+    parser.add_argument("--no-mobility", action="store_true", help="score material and piece-square tables only")
+    parser.add_argument("--planes", action="store_true", help="evaluate (N, 12, 64) planes instead of (N, 8, 8) boards")
+    args = parser.parse_args(argv)
+    requireNumpy()
+    mobility = not args.no_mobility
+
+    if args.files:
+        fens = []
+        for path in args.files:
+            for _, fen, _ in PositionLoader.iterFENs(path, skipInvalid=True):
+                if len(fens) >= args.positions:
+                    break
+                fens.append(fen)
+    else:
+        fens = randomPositions(args.positions, args.seed)
+    if not fens:
+        print("No positions")
+        return 1
+    positions = [ChessEngine.BoardState.fromFEN(fen) for fen in fens]
+
+    start = time.perf_counter()
+    reference = [scalarEvaluate(bs, mobility) for bs in positions]
+    scalarSeconds = time.perf_counter() - start
+
+    packSeconds = evaluateSeconds = fenSeconds = 0.0
+    scores = []
+    for first in range(0, len(positions), args.batch):
+        start = time.perf_counter()
+        boards, whiteToMove = packBoards(positions[first:first + args.batch])
+        if args.planes:
+            boards = boardsToPlanes(boards)
+        packSeconds += time.perf_counter() - start
+        start = time.perf_counter()
+        scores.append(evaluateBatch(boards, whiteToMove, mobility))
+        evaluateSeconds += time.perf_counter() - start
+        start = time.perf_counter()
+        packFENs(fens[first:first + args.batch])
+        fenSeconds += time.perf_counter() - start
+    mismatches = int((np.concatenate(scores) != np.array(reference, np.int32)).sum())
+
+    count = len(positions)
+    batchSeconds = packSeconds + evaluateSeconds
+    rate = lambda seconds: count / seconds if seconds > 0 else float("inf")
+    print("%d positions, %s, batches of %d %s" % (count, "with mobility" if mobility else "without mobility",
+                                                   args.batch, "(N, 12, 64) planes" if args.planes else "(N, 8, 8)"))
+    print("scalar     %8.3fs  %10.0f positions/s" % (scalarSeconds, rate(scalarSeconds)))
+    print("pack       %8.3fs  %10.0f positions/s  (from FEN strings %.0f positions/s)" % (
+        packSeconds, rate(packSeconds), rate(fenSeconds)))
+    print("evaluate   %8.3fs  %10.0f positions/s" % (evaluateSeconds, rate(evaluateSeconds)))
+    print("batch      %8.3fs  %10.0f positions/s  %.1fx the scalar evaluation" % (
+        batchSeconds, rate(batchSeconds), scalarSeconds / batchSeconds if batchSeconds > 0 else float("inf")))
+    print("%d scores differ from the scalar reference" % mismatches)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+This is a bitboard backend of BoardState, selected with ChessEngine.BoardState(backend="bitboard").
+Every piece type of every color is stored as one 64-bit integer with a bit set for each tile it occupies.
+Tile (row, column) is bit row * 8 + column, so bit 0 is a8 and bit 63 is h1.
+The bitboards are the position: makeMove and undoMove toggle them and keep a flat list of the piece on every tile,
+which moves are built from, but not the 2d list of strings and pieceLocations of BoardState. Those are built from
+the bitboards when the rest of the program (main.py, notation, evaluation) reads them.
+"""
+
+from Chess import ChessEngine
+
+pieceNames = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+allTiles = (1 << 64) - 1
+
+
+'''
+Precomputed attack tables. Every entry is the bitboard of the tiles attacked from a tile on an empty board.
+'''
+
+def tileBitboard(r, c):
+    return 1 << (r * 8 + c) if 0 <= r <= 7 and 0 <= c <= 7 else 0
+
+
+def stepAttacks(steps):
+    return [sum(tileBitboard(sq // 8 + d[0], sq % 8 + d[1]) for d in steps) for sq in range(64)]
+
+
+def rayAttacks(d):
+    rays = []
+    for sq in range(64):
+        ray = 0
+        r, c = sq // 8 + d[0], sq % 8 + d[1]
+        while 0 <= r <= 7 and 0 <= c <= 7:
+            ray |= tileBitboard(r, c)
+            r, c = r + d[0], c + d[1]
+        rays.append(ray)
+    return rays
+
+
+KnightAttacks = stepAttacks(ChessEngine.knightMoves)
+KingAttacks = stepAttacks(ChessEngine.kingDirections)
+# The tiles a pawn of each color attacks (white pawns capture towards row 0)
+PawnAttacks = {"w": stepAttacks(((-1, -1), (-1, 1))), "b": stepAttacks(((1, -1), (1, 1)))}
+
+# Rays going towards higher bits have their nearest blocker at the lowest set bit, the others at the highest set bit
+RaysNorth, RaysSouth, RaysWest, RaysEast = (rayAttacks(d) for d in ((-1, 0), (1, 0), (0, -1), (0, 1)))
+RaysNorthWest, RaysNorthEast, RaysSouthWest, RaysSouthEast = (rayAttacks(d) for d in ((-1, -1), (-1, 1), (1, -1), (1, 1)))
+RookRays = [RaysNorth[sq] | RaysSouth[sq] | RaysWest[sq] | RaysEast[sq] for sq in range(64)]
+BishopRays = [RaysNorthWest[sq] | RaysNorthEast[sq] | RaysSouthWest[sq] | RaysSouthEast[sq] for sq in range(64)]
+
+
+def buildBetween():
+    between = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for d in ChessEngine.kingDirections:
+            tiles = 0
+            r, c = sq // 8 + d[0], sq % 8 + d[1]
+            while 0 <= r <= 7 and 0 <= c <= 7:
+                between[sq][r * 8 + c] = tiles
+                tiles |= tileBitboard(r, c)
+                r, c = r + d[0], c + d[1]
+    return between
+
+
+# The tiles strictly between two tiles on the same line (0 if they are not on a common line)
+Between = buildBetween()
+
+
+'''
+Slider attacks: the empty board ray is cut behind the nearest blocker of every direction
+'''
+
+def rookAttacks(sq, occupied):
+    attacks = 0
+    ray = RaysSouth[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysSouth[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RaysEast[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysEast[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RaysNorth[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysNorth[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = RaysWest[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysWest[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def bishopAttacks(sq, occupied):
+    attacks = 0
+    ray = RaysSouthWest[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysSouthWest[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RaysSouthEast[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysSouthEast[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = RaysNorthWest[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysNorthWest[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = RaysNorthEast[sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RaysNorthEast[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+'''
+This yields the index of every set bit, lowest first
+'''
+
+def bitIndices(bitboard):
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardState(ChessEngine.BoardState):
+    backend = "bitboard"
+
+    def __init__(self, backend="bitboard"):
+        super().__init__()
+
+    '''
+    board and pieceLocations are not updated by makeMove and undoMove: they are built from the bitboards when they are
+    read, and kept until the next move. They are views for the rest of the program, changing them does not change the
+    position.
+    '''
+    @property
+    def board(self):
+        if self.boardView is None:
+            squares = self.squares
+            self.boardView = [squares[r * 8:r * 8 + 8] for r in range(8)]
+        return self.boardView
+
+    @board.setter
+    def board(self, board):     # BoardState.__init__ and loadFEN set the whole board, loadPieceLocations follows
+        self.squares = [piece for row in board for piece in row]
+        self.boardView = None
+
+    @property
+    def pieceLocations(self):
+        if self.locationsView is None:
+            self.locationsView = {piece: {(sq // 8, sq % 8) for sq in bitIndices(self.bitboards[piece])}
+                                  for piece in pieceNames}
+        return self.locationsView
+
+    '''
+    This builds the bitboards from the piece of every tile
+    '''
+    def loadPieceLocations(self):
+        self.bitboards = dict.fromkeys(pieceNames, 0)
+        self.colorBitboards = {"w": 0, "b": 0}
+        for sq, piece in enumerate(self.squares):
+            if piece != "--":
+                self.bitboards[piece] |= 1 << sq
+                self.colorBitboards[piece[0]] |= 1 << sq
+        self.boardView = None
+        self.locationsView = None
+
+    def makeMove(self, move):
+        if self.squares[move.startRow * 8 + move.startCol] != "--":
+            self.placeMove(move)
+            self.recordMove(move)
+
+    '''
+    This moves the pieces of a move on the bitboards and in squares (the piece of every tile, which moves need for
+    their pieceMoved and pieceCaptured)
+    '''
+    def placeMove(self, move):
+        squares = self.squares
+        start = move.startRow * 8 + move.startCol
+        end = start + (move.endRow - move.startRow) * 8 + move.endCol - move.startCol
+        squares[start] = "--"
+        squares[end] = move.pieceMoved[0] + move.promotionChoice if move.isPawnPromotion else move.pieceMoved
+        if move.isEnpassantMove:
+            squares[move.startRow * 8 + move.endCol] = "--"
+        elif move.isCastleMove:
+            if end > start:     # Kingside Castle
+                squares[end - 1] = squares[end + 1]
+                squares[end + 1] = "--"
+            else:   # Queenside Castle
+                squares[end + 1] = squares[end - 2]
+                squares[end - 2] = "--"
+        self.toggleMove(move, start, end)
+
+    def unplaceMove(self, move):
+        squares = self.squares
+        start = move.startRow * 8 + move.startCol
+        end = start + (move.endRow - move.startRow) * 8 + move.endCol - move.startCol
+        squares[start] = move.pieceMoved
+        if move.isEnpassantMove:
+            squares[end] = "--"
+            squares[move.startRow * 8 + move.endCol] = move.pieceCaptured
+        else:
+            squares[end] = move.pieceCaptured
+            if move.isCastleMove:
+                if end > start:     # Kingside Castle
+                    squares[end + 1] = squares[end - 1]
+                    squares[end - 1] = "--"
+                else:   # Queenside Castle
+                    squares[end - 2] = squares[end + 1]
+                    squares[end + 1] = "--"
+        self.toggleMove(move, start, end)
+
+    '''
+    This flips the bits changed by a move. Flipping the same bits again takes the move back, so it is used by both
+    makeMove and undoMove.
+    '''
+    def toggleMove(self, move, start, end):
+        bitboards = self.bitboards
+        colorBitboards = self.colorBitboards
+        color = move.pieceMoved[0]
+        startBit = 1 << start
+        endBit = 1 << end
+        bitboards[move.pieceMoved] ^= startBit
+        if move.isPawnPromotion:
+            bitboards[color + move.promotionChoice] ^= endBit
+        else:
+            bitboards[move.pieceMoved] ^= endBit
+        colorBitboards[color] ^= startBit | endBit
+        if move.pieceCaptured != "--":
+            if move.isEnpassantMove:
+                captureBit = 1 << (move.startRow * 8 + move.endCol)
+            else:
+                captureBit = endBit
+            bitboards[move.pieceCaptured] ^= captureBit
+            colorBitboards[move.pieceCaptured[0]] ^= captureBit
+        if move.isCastleMove:
+            if end > start:     # Kingside Castle
+                rookBits = (endBit << 1) | (endBit >> 1)
+            else:   # Queenside Castle
+                rookBits = (endBit >> 2) | (endBit << 1)
+            bitboards[color + "R"] ^= rookBits
+            colorBitboards[color] ^= rookBits
+        self.boardView = None
+        self.locationsView = None
+
+    '''
+    The bitboard of the pieces of byColor that attack tile sq, with the given occupied tiles
+    '''
+    def attackersTo(self, sq, byColor, occupied):
+        bitboards = self.bitboards
+        enemyColor = "b" if byColor == "w" else "w"
+        return (KnightAttacks[sq] & bitboards[byColor + "N"]) | \
+               (PawnAttacks[enemyColor][sq] & bitboards[byColor + "p"]) | \
+               (KingAttacks[sq] & bitboards[byColor + "K"]) | \
+               (rookAttacks(sq, occupied) & (bitboards[byColor + "R"] | bitboards[byColor + "Q"])) | \
+               (bishopAttacks(sq, occupied) & (bitboards[byColor + "B"] | bitboards[byColor + "Q"]))
+
+    def isSquareAttacked(self, square, byColor):
+        return self.attackersTo(square[0] * 8 + square[1], byColor,
+                                self.colorBitboards["w"] | self.colorBitboards["b"]) != 0
+
+    '''
+    All legal moves, generated from the bitboards. Checks and pins are found once per position:
+    a pinned piece may only move between the king and its pinner, and a single check limits every
+    non-king move to the checking piece and the tiles between it and the king.
+    With quiet=False only the captures and promotions are generated.
+    '''
+    def getLegalMoves(self, quiet=True):
+        bitboards = self.bitboards
+        squares = self.squares
+        unpack = ChessEngine.Move.unpack
+        if self.whiteToMove:
+            allyColor, enemyColor, forward, startRow, lastRow = "w", "b", -8, 6, 0
+        else:
+            allyColor, enemyColor, forward, startRow, lastRow = "b", "w", 8, 1, 7
+        own = self.colorBitboards[allyColor]
+        enemy = self.colorBitboards[enemyColor]
+        occupied = own | enemy
+        kingBit = bitboards[allyColor + "K"]
+        kingSq = kingBit.bit_length() - 1
+        king = allyColor + "K"
+        moves = []
+
+        # King moves, tested with the king removed so that it does not hide the tiles behind it
+        withoutKing = occupied ^ kingBit
+        for sq in bitIndices(KingAttacks[kingSq] & (~own if quiet else enemy)):
+            if not self.attackersTo(sq, enemyColor, withoutKing):
+                moves.append(unpack(kingSq | sq << 6, king, squares[sq]))
+
+        checkers = self.attackersTo(kingSq, enemyColor, occupied)
+        if checkers & (checkers - 1):   # Double check, only the king can move
+            return moves
+        if checkers:
+            targetMask = (Between[kingSq][checkers.bit_length() - 1] | checkers) & ~own
+        else:
+            targetMask = ~own & allTiles
+            if quiet:
+                self.getCastleMoves(kingSq, enemyColor, occupied, moves)
+        # Without quiet moves, pawn pushes are only kept to the last rank (promotions) and other moves to enemy pieces
+        pushMask = targetMask if quiet else targetMask & (0xff << (lastRow * 8))
+        if not quiet:
+            targetMask &= enemy
+
+        # Pinned pieces: an enemy slider on a line with the king with exactly one allied piece between them
+        pins = {}
+        snipers = (RookRays[kingSq] & (bitboards[enemyColor + "R"] | bitboards[enemyColor + "Q"])) | \
+                  (BishopRays[kingSq] & (bitboards[enemyColor + "B"] | bitboards[enemyColor + "Q"]))
+        for sniperSq in bitIndices(snipers):
+            blockers = Between[kingSq][sniperSq] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pins[blockers.bit_length() - 1] = Between[kingSq][sniperSq] | (1 << sniperSq)
+
+        for sq in bitIndices(bitboards[allyColor + "N"]):
+            if sq not in pins:
+                self.addMoves(sq, KnightAttacks[sq] & targetMask, moves)
+        for sq in bitIndices(bitboards[allyColor + "B"] | bitboards[allyColor + "Q"]):
+            self.addMoves(sq, bishopAttacks(sq, occupied) & targetMask & pins.get(sq, allTiles), moves)
+        for sq in bitIndices(bitboards[allyColor + "R"] | bitboards[allyColor + "Q"]):
+            self.addMoves(sq, rookAttacks(sq, occupied) & targetMask & pins.get(sq, allTiles), moves)
+
+        pawn = allyColor + "p"
+        for sq in bitIndices(bitboards[pawn]):
+            pinMask = pins.get(sq, allTiles)
+            pushSq = sq + forward
+            if not (1 << pushSq) & occupied:
+                if (1 << pushSq) & pushMask & pinMask:
+                    self.addPawnMoves(sq, pushSq, pawn, lastRow, moves)
+                doubleSq = pushSq + forward
+                if sq // 8 == startRow and not (1 << doubleSq) & occupied and (1 << doubleSq) & pushMask & pinMask:
+                    moves.append(unpack(sq | doubleSq << 6, pawn, "--"))
+            for captureSq in bitIndices(PawnAttacks[allyColor][sq] & enemy & targetMask & pinMask):
+                self.addPawnMoves(sq, captureSq, pawn, lastRow, moves)
+
+        if self.possibleEnpassant:
+            self.getEnpassantMoves(kingSq, allyColor, enemyColor, occupied, moves)
+        return moves
+
+    '''
+    Moves are built from their packed form (ChessEngine.Move.pack) and the pieces of squares
+    '''
+    def addMoves(self, sq, targets, moves):
+        squares = self.squares
+        piece = squares[sq]
+        unpack = ChessEngine.Move.unpack
+        for endSq in bitIndices(targets):
+            moves.append(unpack(sq | endSq << 6, piece, squares[endSq]))
+
+    def addPawnMoves(self, sq, endSq, pawn, lastRow, moves):
+        code = sq | endSq << 6
+        captured = self.squares[endSq]
+        if endSq // 8 == lastRow:   # One move per promotion choice
+            for choice in range(len(ChessEngine.Move.promotionChoices)):
+                moves.append(ChessEngine.Move.unpack(code | choice << 12, pawn, captured))
+        else:
+            moves.append(ChessEngine.Move.unpack(code, pawn, captured))
+
+    '''
+    Castling, when the side to move is not in check: the tiles between the king and the rook have to be empty and the
+    tiles the king crosses not attacked. The rights are only kept while the king and rook are on their home tiles.
+    '''
+    def getCastleMoves(self, kingSq, enemyColor, occupied, moves):
+        rights = self.currentCastlingRights
+        kingside, queenside = (rights.wKs, rights.wQs) if enemyColor == "b" else (rights.bKs, rights.bQs)
+        king = self.squares[kingSq]
+        if kingside and not occupied & (3 << (kingSq + 1)) and \
+                not self.attackersTo(kingSq + 1, enemyColor, occupied) and \
+                not self.attackersTo(kingSq + 2, enemyColor, occupied):
+            moves.append(ChessEngine.Move.unpack(kingSq | (kingSq + 2) << 6 | 1 << 15, king, "--"))
+        if queenside and not occupied & (7 << (kingSq - 3)) and \
+                not self.attackersTo(kingSq - 1, enemyColor, occupied) and \
+                not self.attackersTo(kingSq - 2, enemyColor, occupied):
+            moves.append(ChessEngine.Move.unpack(kingSq | (kingSq - 2) << 6 | 1 << 15, king, "--"))
+
+    '''
+    Enpassant captures are checked by looking at the king's lines after both pawns have left their tiles,
+    which also covers pins, a capture that removes a checking pawn and a rook uncovered on the rank.
+    '''
+    def getEnpassantMoves(self, kingSq, allyColor, enemyColor, occupied, moves):
+        bitboards = self.bitboards
+        endRow, endCol = self.possibleEnpassant
+        endSq = endRow * 8 + endCol
+        captureSq = endSq + (8 if allyColor == "w" else -8)
+        enemyPawns = bitboards[enemyColor + "p"] ^ (1 << captureSq)
+        for sq in bitIndices(PawnAttacks[enemyColor][endSq] & bitboards[allyColor + "p"]):
+            after = occupied ^ (1 << sq) ^ (1 << captureSq) ^ (1 << endSq)
+            if (KnightAttacks[kingSq] & bitboards[enemyColor + "N"]) or \
+                    (PawnAttacks[allyColor][kingSq] & enemyPawns) or \
+                    (rookAttacks(kingSq, after) & (bitboards[enemyColor + "R"] | bitboards[enemyColor + "Q"])) or \
+                    (bishopAttacks(kingSq, after) & (bitboards[enemyColor + "B"] | bitboards[enemyColor + "Q"])):
+                continue
+            moves.append(ChessEngine.Move.unpack(sq | endSq << 6 | 1 << 14, allyColor + "p", enemyColor + "p"))
@@ -2,11 +2,31 @@
 This is responsible for storing all the information about the current state of the chess game.
 It is responsible for determining any valid move in any given board_state.
 It is responsible for keeping a move log.
+It is responsible for reading and writing positions in FEN (Forsyth-Edwards Notation).
+It is responsible for keeping a Zobrist key that identifies the current position.
+It is responsible for keeping the material, piece-square and game phase sums the static evaluation is read from.
 """
 
+import importlib
+import random
+from array import array
+from collections import OrderedDict
+
+from Chess import Evaluation
+
+StartFEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
 
 class BoardState():
-    def __init__(self):
+    # Name of the board representation, other backends are subclasses selected with BoardState(backend=...)
+    backend = "list"
+
+    def __new__(cls, backend="list"):
+        if cls is BoardState and backend != "list":
+            cls = getBackend(backend)
+        return object.__new__(cls)
+
+    def __init__(self, backend="list"):
         # The board is 8x8. It is represented by a 2d list
         # Each element of the list is described by two characters in accordance to algebraic notation:
         # The first character represents the color of the piece:
@@ -25,81 +45,435 @@ class BoardState():
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
 
         self.whiteToMove = True
-        self.moveLog = []
+        self.moveLog = MoveLog()
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
         self.possibleEnpassant = ()
         self.currentCastlingRights = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.wQs,
-                                             self.currentCastlingRights.bKs, self.currentCastlingRights.bQs)]
+        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.bKs,
+                                             self.currentCastlingRights.wQs, self.currentCastlingRights.bQs)]
+        self.enpassantLog = [self.possibleEnpassant]
+        # Half moves since the last capture or pawn move (fifty move rule) and the number of the full move
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1
+        self.checkmate = False
+        self.stalemate = False
+        # Tiles of every piece {"wp": {(6, 0), ...}, ...}, updated by makeMove and undoMove
+        self.loadPieceLocations()
+        # Pinned pieces of the side to move and the direction of their pin, only filled while generating moves
+        self.pins = {}
+        # False while only captures and promotions are generated (getLegalMoves(quiet=False))
+        self.quietMoves = True
+        # 64-bit Zobrist key of the position, updated by makeMove and restored from its log by undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        # Material, middlegame and endgame scores (material plus piece-square tables, from White's side) and game phase
+        # of the pieces on the board, updated by makeMove and restored from their log by undoMove
+        self.loadEvaluation()
+        # Optional MoveCache consulted by getValidMoves, kept when another position is loaded
+        self.moveCache = None
+
+    '''
+    This creates a BoardState from a FEN string
+    '''
+    @classmethod
+    def fromFEN(cls, fen, backend="list"):
+        bs = cls(backend)
+        bs.loadFEN(fen)
+        return bs
+
+    '''
+    This replaces the whole state (including the logs) with the position described by a FEN string.
+    The move counters are optional, so that EPD positions can be loaded as well.
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN piece placement needs 8 ranks: " + fen)
+        board = []
+        whiteKingLocation = blackKingLocation = None
+        for r in range(8):
+            row = []
+            for char in ranks[r]:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in fenToPiece:
+                    if char == "K":
+                        whiteKingLocation = (r, len(row))
+                    elif char == "k":
+                        blackKingLocation = (r, len(row))
+                    row.append(fenToPiece[char])
+                else:
+                    raise ValueError("Invalid piece " + repr(char) + " in FEN: " + fen)
+            if len(row) != 8:
+                raise ValueError("FEN rank " + str(8 - r) + " does not have 8 tiles: " + fen)
+            board.append(row)
+        if whiteKingLocation is None or blackKingLocation is None:
+            raise ValueError("FEN needs a king of each color: " + fen)
+        if fields[1] not in ("w", "b"):
+            raise ValueError("Invalid side to move in FEN: " + fen)
+        castling = fields[2]
+        if castling != "-" and (not castling or castling.strip("KQkq")):
+            raise ValueError("Invalid castling rights in FEN: " + fen)
+        enpassant = ()
+        if fields[3] != "-":
+            if len(fields[3]) != 2 or fields[3][0] not in Move.filesToColumns or fields[3][1] not in "36":
+                raise ValueError("Invalid enpassant tile in FEN: " + fen)
+            enpassant = (Move.ranksToRows[fields[3][1]], Move.filesToColumns[fields[3][0]])
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Invalid move counters in FEN: " + fen)
+
+        self.board = board
+        self.whiteToMove = fields[1] == "w"
+        self.moveLog = MoveLog()
+        self.whiteKingLocation = whiteKingLocation
+        self.blackKingLocation = blackKingLocation
+        self.possibleEnpassant = enpassant
+        # A right whose king or rook is not on its home tile could never be used, and castling with it would move a
+        # rook that is not there, so it is dropped
+        self.currentCastlingRights = CastleRights(
+            "K" in castling and board[7][4] == "wK" and board[7][7] == "wR",
+            "k" in castling and board[0][4] == "bK" and board[0][7] == "bR",
+            "Q" in castling and board[7][4] == "wK" and board[7][0] == "wR",
+            "q" in castling and board[0][4] == "bK" and board[0][0] == "bR")
+        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.bKs,
+                                             self.currentCastlingRights.wQs, self.currentCastlingRights.bQs)]
+        self.enpassantLog = [self.possibleEnpassant]
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = fullmoveNumber
         self.checkmate = False
         self.stalemate = False
+        self.loadPieceLocations()
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.loadEvaluation()
+
+    '''
+    This builds the tile sets of every piece from the board
+    '''
+    def loadPieceLocations(self):
+        self.pieceLocations = {piece: set() for piece in pieceToFen}
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    self.pieceLocations[self.board[r][c]].add((r, c))
+
+    '''
+    This returns the FEN string of the current position
+    '''
+    def toFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                else:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += pieceToFen[piece]
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.currentCastlingRights
+        castling = ("K" if rights.wKs else "") + ("Q" if rights.wQs else "") + \
+                   ("k" if rights.bKs else "") + ("q" if rights.bQs else "")
+        enpassant = "-"
+        if self.possibleEnpassant:
+            enpassant = Move.columnsToFiles[self.possibleEnpassant[1]] + Move.rowsToRanks[self.possibleEnpassant[0]]
+        return " ".join(("/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enpassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
 
     def makeMove(self, move):
         if self.board[move.startRow][move.startCol] != "--":
-            self.board[move.startRow][move.startCol] = "--"
-            self.board[move.endRow][move.endCol] = move.pieceMoved
-            self.moveLog.append(move)
-            self.whiteToMove = not self.whiteToMove
+            self.placeMove(move)
+            self.recordMove(move)
+
+    '''
+    This takes back the last move and returns it (None if there is no move to undo)
+    '''
+    def undoMove(self):
+        move = None
+        if len(self.moveLog) != 0:      # finds out if there is a move to undo
+            move = self.forgetMove()
+            self.unplaceMove(move)
+        return move
+
+    '''
+    This moves the pieces of a move on the board and in pieceLocations. It is the part of makeMove a backend with
+    another board representation replaces.
+    '''
+    def placeMove(self, move):
+        self.board[move.startRow][move.startCol] = "--"
+        self.board[move.endRow][move.endCol] = move.pieceMoved
+        if move.isPawnPromotion:
+            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionChoice
+        if move.isEnpassantMove:
+            self.board[move.startRow][move.endCol] = "--"
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]   # Rook move
+                self.board[move.endRow][move.endCol+1] = "--"   # Removes Rook from original tile
+            else:   # Queenside Castle
+                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]
+                self.board[move.endRow][move.endCol-2] = "--"
+        self.movePieceLocations(move)
+
+    def unplaceMove(self, move):
+        self.board[move.startRow][move.startCol] = move.pieceMoved
+        self.board[move.endRow][move.endCol] = move.pieceCaptured
+        # Undo enpassant move
+        if move.isEnpassantMove:
+            self.board[move.endRow][move.endCol] = "--" # Leave ending tile blank
+            self.board[move.startRow][move.endCol] = move.pieceCaptured
+        # Undo castle move
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
+                self.board[move.endRow][move.endCol-1] = "--"
+            else:   # Queenside Castle
+                self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
+                self.board[move.endRow][move.endCol+1] = "--"
+        self.unmovePieceLocations(move)
+
+    '''
+    This records a move in everything but the pieces: the move log, side to move, king tiles, enpassant tile, move
+    counters, castling rights, Zobrist key and evaluation sums, with the logs undoMove restores them from
+    '''
+    def recordMove(self, move):
+        self.moveLog.append(move)
+        self.whiteToMove = not self.whiteToMove
+
+        if move.pieceMoved == "wK":
+            self.whiteKingLocation = (move.endRow, move.endCol)
+        elif move.pieceMoved == "bK":
+            self.blackKingLocation = (move.endRow, move.endCol)
+
+        if move.pieceMoved[1] == "p" and abs(move.startRow-move.endRow) == 2:
+            self.possibleEnpassant = ((move.startRow + move.endRow) // 2, move.startCol)
+        else:
+            self.possibleEnpassant = ()
+        self.enpassantLog.append(self.possibleEnpassant)
+
+        if move.pieceMoved[1] == "p" or move.pieceCaptured != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.pieceMoved[0] == "b":
+            self.fullmoveNumber += 1
 
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.endRow, move.endCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.endRow, move.endCol)
+        self.updateCastleRights(move)
+        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.bKs,
+                                                 self.currentCastlingRights.wQs, self.currentCastlingRights.bQs))
+        self.updateZobristKey(move)
+        self.zobristLog.append(self.zobristKey)
+        self.updateEvaluation(move)
 
-            if move.isPawnPromotion:
-                self.board[move.endRow][move.endCol] = move.pieceMoved[0] + "Q"
+    '''
+    This takes the last move out of the move log and restores everything recordMove changed, and returns the move
+    '''
+    def forgetMove(self):
+        move = self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove     # switches player's turn
+        # Update the position of the King's position if needed
+        if move.pieceMoved == "wK":
+            self.whiteKingLocation = (move.startRow, move.startCol)
+        elif move.pieceMoved == "bK":
+            self.blackKingLocation = (move.startRow, move.startCol)
+        # Restore the enpassant tile of the previous position
+        self.enpassantLog.pop()
+        self.possibleEnpassant = self.enpassantLog[-1]
+        # Restore the Zobrist key and the evaluation sums
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.evaluationLog.pop()
+        self.material, self.middlegameScore, self.endgameScore, self.phase = self.evaluationLog[-1]
+        # Restore the move counters
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        if move.pieceMoved[0] == "b":
+            self.fullmoveNumber -= 1
+        # Undo castling rights
+        self.castleRightsLog.pop()
+        newRights = self.castleRightsLog[-1]
+        self.currentCastlingRights = CastleRights(newRights.wKs, newRights.bKs, newRights.wQs, newRights.bQs)
+        return move
 
+    '''
+    This moves the tiles of the pieces a move has moved, promoted, captured or castled in pieceLocations
+    '''
+    def movePieceLocations(self, move):
+        locations = self.pieceLocations
+        endTile = (move.endRow, move.endCol)
+        locations[move.pieceMoved].remove((move.startRow, move.startCol))
+        if move.isPawnPromotion:
+            locations[move.pieceMoved[0] + move.promotionChoice].add(endTile)
+        else:
+            locations[move.pieceMoved].add(endTile)
+        if move.pieceCaptured != "--":
+            locations[move.pieceCaptured].remove((move.startRow, move.endCol) if move.isEnpassantMove else endTile)
+        if move.isCastleMove:
+            rooks = locations[move.pieceMoved[0] + "R"]
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                rooks.remove((move.endRow, move.endCol+1))
+                rooks.add((move.endRow, move.endCol-1))
+            else:   # Queenside Castle
+                rooks.remove((move.endRow, move.endCol-2))
+                rooks.add((move.endRow, move.endCol+1))
+
+    def unmovePieceLocations(self, move):
+        locations = self.pieceLocations
+        endTile = (move.endRow, move.endCol)
+        if move.isPawnPromotion:
+            locations[move.pieceMoved[0] + move.promotionChoice].remove(endTile)
+        else:
+            locations[move.pieceMoved].remove(endTile)
+        locations[move.pieceMoved].add((move.startRow, move.startCol))
+        if move.pieceCaptured != "--":
+            locations[move.pieceCaptured].add((move.startRow, move.endCol) if move.isEnpassantMove else endTile)
+        if move.isCastleMove:
+            rooks = locations[move.pieceMoved[0] + "R"]
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                rooks.remove((move.endRow, move.endCol-1))
+                rooks.add((move.endRow, move.endCol+1))
+            else:   # Queenside Castle
+                rooks.remove((move.endRow, move.endCol+1))
+                rooks.add((move.endRow, move.endCol-2))
+
+    '''
+    This changes the Zobrist key by the pieces a move has moved, placed and captured, the castling rights and
+    enpassant tile it has changed and the side to move. It must be called at the end of makeMove, once the logs
+    have the rights and enpassant tile from before and after the move.
+    '''
+    def updateZobristKey(self, move):
+        key = self.zobristKey ^ zobristBlackToMove
+        start = move.startRow * 8 + move.startCol
+        end = move.endRow * 8 + move.endCol
+        key ^= zobristPieces[move.pieceMoved][start]
+        if move.isPawnPromotion:
+            key ^= zobristPieces[move.pieceMoved[0] + move.promotionChoice][end]
+        else:
+            key ^= zobristPieces[move.pieceMoved][end]
+        if move.pieceCaptured != "--":
             if move.isEnpassantMove:
-                self.board[move.startRow][move.endCol] = "--"
-            if move.pieceMoved[1] == "p" and abs(move.startRow-move.endRow) == 2:
-                self.possibleEnpassant = ((move.startRow + move.endRow) // 2, move.startCol)
+                key ^= zobristPieces[move.pieceCaptured][move.startRow * 8 + move.endCol]
             else:
-                self.possibleEnpassant = ()
+                key ^= zobristPieces[move.pieceCaptured][end]
+        if move.isCastleMove:
+            rookKeys = zobristPieces[move.pieceMoved[0] + "R"]
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                key ^= rookKeys[end + 1] ^ rookKeys[end - 1]
+            else:   # Queenside Castle
+                key ^= rookKeys[end - 2] ^ rookKeys[end + 1]
+        previousEnpassant = self.enpassantLog[-2]
+        if previousEnpassant != self.possibleEnpassant:
+            if previousEnpassant:
+                key ^= zobristEnpassant[previousEnpassant[1]]
+            if self.possibleEnpassant:
+                key ^= zobristEnpassant[self.possibleEnpassant[1]]
+        previousRights = self.castleRightsLog[-2]
+        rights = self.currentCastlingRights
+        if previousRights.wKs != rights.wKs:
+            key ^= zobristCastling[0]
+        if previousRights.bKs != rights.bKs:
+            key ^= zobristCastling[1]
+        if previousRights.wQs != rights.wQs:
+            key ^= zobristCastling[2]
+        if previousRights.bQs != rights.bQs:
+            key ^= zobristCastling[3]
+        self.zobristKey = key
 
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2:    # Kingside Castle
-                    self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]   # Rook move
-                    self.board[move.endRow][move.endCol+1] = "--"   # Removes Rook from original tile
-                else:   # Queenside Castle
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]
-                    self.board[move.endRow][move.endCol-2] = "--"
+    '''
+    This computes the Zobrist key of the position from scratch. It is used to start the key and to verify it.
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= zobristPieces[piece][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        rights = self.currentCastlingRights
+        for i, right in enumerate((rights.wKs, rights.bKs, rights.wQs, rights.bQs)):
+            if right:
+                key ^= zobristCastling[i]
+        if self.possibleEnpassant:
+            key ^= zobristEnpassant[self.possibleEnpassant[1]]
+        return key
 
-            self.updateCastleRights(move)
-            self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.bKs,
-                                                     self.currentCastlingRights.wQs, self.currentCastlingRights.bQs))
+    '''
+    This changes the evaluation sums by the pieces a move has moved, promoted, captured or castled: the score of
+    every piece that leaves a tile is taken away and the score of every piece that arrives is added
+    '''
+    def updateEvaluation(self, move):
+        start = move.startRow * 8 + move.startCol
+        end = move.endRow * 8 + move.endCol
+        moved = move.pieceMoved
+        material = self.material
+        middlegame = self.middlegameScore - middlegameScores[moved][start]
+        endgame = self.endgameScore - endgameScores[moved][start]
+        phase = self.phase
+        placed = moved
+        if move.isPawnPromotion:
+            placed = moved[0] + move.promotionChoice
+            material += materialScores[placed] - materialScores[moved]
+            phase += phaseWeights[move.promotionChoice]
+        middlegame += middlegameScores[placed][end]
+        endgame += endgameScores[placed][end]
+        captured = move.pieceCaptured
+        if captured != "--":
+            tile = move.startRow * 8 + move.endCol if move.isEnpassantMove else end
+            material -= materialScores[captured]
+            middlegame -= middlegameScores[captured][tile]
+            endgame -= endgameScores[captured][tile]
+            phase -= phaseWeights[captured[1]]
+        if move.isCastleMove:
+            rook = moved[0] + "R"
+            if move.endCol - move.startCol == 2:    # Kingside Castle
+                rookStart, rookEnd = end + 1, end - 1
+            else:   # Queenside Castle
+                rookStart, rookEnd = end - 2, end + 1
+            middlegame += middlegameScores[rook][rookEnd] - middlegameScores[rook][rookStart]
+            endgame += endgameScores[rook][rookEnd] - endgameScores[rook][rookStart]
+        self.material = material
+        self.middlegameScore = middlegame
+        self.endgameScore = endgame
+        self.phase = phase
+        self.evaluationLog.append((material, middlegame, endgame, phase))
 
-    def undoMove(self):
-        if len(self.moveLog) != 0:      # finds out if there is a move to undo
-            move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
-            self.whiteToMove = not self.whiteToMove     # switches player's turn
-            # Update the position of the King's position if needed
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
-            # Undo enpassant move
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = "--" # Leave ending tile blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.possibleEnpassant = (move.endRow, move.endCol)
-            # Undo a 2 tiles pawn advance
-            if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
-                self.possibleEnpassant = ()
-            # Undo castling rights
-            self.castleRightsLog.pop()
-            newRights = self.castleRightsLog[-1]
-            self.currentCastlingRights = CastleRights(newRights.wKs, newRights.bKs, newRights.wQs, newRights.bQs)
-            # Undo castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2:    # Kingside Castle
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = "--"
-                else:   # Queenside Castle
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                    self.board[move.endRow][move.endCol+1] = "--"
+    '''
+    This computes the evaluation sums (material, middlegame score, endgame score, phase) from scratch, by visiting the
+    tiles of every piece. It is used to start the sums and to verify them.
+    '''
+    def computeEvaluation(self):
+        material = middlegame = endgame = phase = 0
+        for piece, tiles in self.pieceLocations.items():
+            if tiles:
+                middlegameTable = middlegameScores[piece]
+                endgameTable = endgameScores[piece]
+                for r, c in tiles:
+                    middlegame += middlegameTable[r * 8 + c]
+                    endgame += endgameTable[r * 8 + c]
+                material += materialScores[piece] * len(tiles)
+                phase += phaseWeights[piece[1]] * len(tiles)
+        return material, middlegame, endgame, phase
+
+    def loadEvaluation(self):
+        self.material, self.middlegameScore, self.endgameScore, self.phase = self.computeEvaluation()
+        self.evaluationLog = [(self.material, self.middlegameScore, self.endgameScore, self.phase)]
 
     def updateCastleRights(self, move):
         if move.pieceMoved == "wK":
@@ -134,176 +508,326 @@ class BoardState():
                 elif move.endCol == 7:
                     self.currentCastlingRights.bKs = False
 
+    '''
+    All legal moves, with the checkmate and stalemate flags updated for the side to move.
+    With a moveCache, a position seen before is a lookup instead of a generation.
+    '''
     def getValidMoves(self):
-        temp_possibleEnpassant = self.possibleEnpassant
-        temp_castlingRights = CastleRights(self.currentCastlingRights.wKs, self.currentCastlingRights.bKs,
-                                            self.currentCastlingRights.wQs, self.currentCastlingRights.bQs)
-        # All legal moves
-        # generale all possible moves
-        moves = self.getPossibleMoves()
+        cache = self.moveCache
+        if cache is not None:
+            entry = cache.get(self.zobristKey)
+            if entry is not None:
+                moves, self.checkmate, self.stalemate = entry
+                return list(moves)
+        moves = self.getLegalMoves()
+        self.updateGameStatus(moves)
+        if cache is not None:
+            cache.put(self.zobristKey, (tuple(moves), self.checkmate, self.stalemate))
+        return moves
+
+    '''
+    All legal moves, without touching the checkmate and stalemate flags (the search calls this at every node).
+    The checks and pins against the king are found once per position, so that every generated move
+    is already legal apart from king moves (whose end tile is checked) and enpassant captures (which are played).
+    With quiet=False only the legal captures and promotions are generated, for the quiescence search.
+    '''
+    def getLegalMoves(self, quiet=True):
         if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            kingRow, kingCol = self.whiteKingLocation
+            enemyColor = "b"
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            kingRow, kingCol = self.blackKingLocation
+            enemyColor = "w"
+        self.pins, checks = self.checkForPinsAndChecks(kingRow, kingCol)
+        self.quietMoves = quiet
+        possibleMoves = self.getPossibleMoves()
+        self.pins = {}
+        self.quietMoves = True
+        if len(checks) == 0:
+            if quiet:
+                self.getCastleMoves(kingRow, kingCol, possibleMoves)
+            validTiles = None
+        elif len(checks) == 1:      # The checking piece has to be captured or blocked, or the king has to move
+            validTiles = self.getCheckBlockTiles(kingRow, kingCol, checks[0])
+        else:       # Double check, only the king can move
+            validTiles = ()
 
+        moves = []
+        king = self.board[kingRow][kingCol]
+        self.board[kingRow][kingCol] = "--"     # The king is lifted so that it does not hide the tiles behind it
+        for move in possibleMoves:
+            if move.pieceMoved[1] == "K":
+                if move.isCastleMove or not self.isSquareAttacked((move.endRow, move.endCol), enemyColor):
+                    moves.append(move)
+            elif validTiles is None or (move.endRow, move.endCol) in validTiles or move.isEnpassantMove:
+                moves.append(move)
+        self.board[kingRow][kingCol] = king
+        # An enpassant capture removes two pawns from a rank, the only safe test is to play it
+        return [move for move in moves if not move.isEnpassantMove or self.isLegalByMakeUndo(move)]
 
-        # for each move make the move
-        for i in range(len(moves)-1, -1, -1):  # When removing from a list go backwards through list to avoid skipping elements in list
-            self.makeMove(moves[i])
-        # for all opponent's moves, see if the king is under attack
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+    '''
+    This sets the checkmate and stalemate flags from the legal moves of the side to move
+    '''
+    def updateGameStatus(self, moves):
         if len(moves) == 0:
             if self.inCheck():
                 self.checkmate = True
-                print("Checkmate!")
             else:
                 self.stalemate = True
-                print("Stalemate")
         else:
             self.checkmate = False
             self.stalemate = False
 
-        self.possibleEnpassant = temp_possibleEnpassant
-        self.currentCastlingRights = temp_castlingRights
+    '''
+    All legal moves, found by playing every possible move and keeping those that do not leave the king in check.
+    This is the original generator, it is much slower and is kept as a reference for perft comparisons.
+    getValidMovesMakeUndo sets the checkmate and stalemate flags as well, getLegalMovesMakeUndo leaves them alone.
+    '''
+    def getValidMovesMakeUndo(self):
+        moves = self.getLegalMovesMakeUndo()
+        self.updateGameStatus(moves)
         return moves
 
-    def inCheck(self):
+    def getLegalMovesMakeUndo(self):
+        moves = self.getPossibleMoves()
         if self.whiteToMove:
-            return self.tileUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
         else:
-            return self.tileUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
+            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+        return [move for move in moves if self.isLegalByMakeUndo(move)]
 
-    def tileUnderAttack(self, r, c):
+    def isLegalByMakeUndo(self, move):
+        self.makeMove(move)
         self.whiteToMove = not self.whiteToMove
-        opponentMoves = self.getPossibleMoves()
+        legal = not self.inCheck()
         self.whiteToMove = not self.whiteToMove
-        for move in opponentMoves:
-            if move.endRow == r and move.endCol == c:    # Tile under attack
+        self.undoMove()
+        return legal
+
+    '''
+    This scans outwards from the tile (r, c) of the side to move's king, along the 8 lines and the knight jumps.
+    It returns the pins as {(row, column) of the pinned piece: direction of the pin}
+    and the checks as a list of (row, column, rowDirection, columnDirection) of every checking piece.
+    The side to move's own king is ignored, so that (r, c) can also be a tile the king wants to move to.
+    '''
+    def checkForPinsAndChecks(self, r, c):
+        pins = {}
+        checks = []
+        if self.whiteToMove:
+            enemyColor, allyColor, pawnRowDirection = "b", "w", -1
+        else:
+            enemyColor, allyColor, pawnRowDirection = "w", "b", 1
+        locations = self.pieceLocations
+        enemyQueens = locations[enemyColor + "Q"]
+        # Without an enemy slider for a line only its first tile matters (a pawn or king next to the tile)
+        orthogonalSliders = bool(locations[enemyColor + "R"] or enemyQueens)
+        diagonalSliders = bool(locations[enemyColor + "B"] or enemyQueens)
+        rays = tileRays[r][c]
+        for j in range(8):
+            d = kingDirections[j]
+            possiblePin = None
+            i = 0
+            ray = rays[j] if (orthogonalSliders if j < 4 else diagonalSliders) else rays[j][:1]
+            for endRow, endCol in ray:
+                i += 1
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != "K":
+                    if possiblePin is None:     # First allied piece on the line could be pinned
+                        possiblePin = (endRow, endCol)
+                    else:       # Second allied piece on the line, no pin or check is possible in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    # Directions 0-3 are orthogonal, 4-7 are diagonal
+                    if (j < 4 and (pieceType == "R" or pieceType == "Q")) or \
+                            (j >= 4 and (pieceType == "B" or pieceType == "Q")) or \
+                            (i == 1 and pieceType == "K") or \
+                            (i == 1 and pieceType == "p" and j >= 4 and d[0] == pawnRowDirection):
+                        if possiblePin is None:
+                            checks.append((endRow, endCol, d[0], d[1]))
+                        else:
+                            pins[possiblePin] = d
+                    break   # Any enemy piece blocks the line
+        for endRow, endCol in locations[enemyColor + "N"]:
+            if (endRow - r) * (endCol - c) in (2, -2):     # A knight jump is 1 by 2 tiles
+                checks.append((endRow, endCol, endRow - r, endCol - c))
+        return pins, checks
+
+    '''
+    The tiles a non-king move can end on to answer a single check: the checking piece and the tiles between it and the king
+    '''
+    def getCheckBlockTiles(self, kingRow, kingCol, check):
+        checkRow, checkCol, dRow, dCol = check
+        if self.board[checkRow][checkCol][1] == "N":   # A knight check cannot be blocked
+            return {(checkRow, checkCol)}
+        validTiles = set()
+        for i in range(1, 8):
+            tile = (kingRow + dRow * i, kingCol + dCol * i)
+            validTiles.add(tile)
+            if tile == (checkRow, checkCol):
+                break
+        return validTiles
+
+    '''
+    Whether a piece pinned along pinDirection (None if it is not pinned) may move in the direction d
+    '''
+    def isAllowedByPin(self, pinDirection, d):
+        return pinDirection is None or pinDirection == d or (pinDirection[0] == -d[0] and pinDirection[1] == -d[1])
+
+    def inCheck(self):
+        if self.whiteToMove:
+            return self.isSquareAttacked(self.whiteKingLocation, "b")
+        else:
+            return self.isSquareAttacked(self.blackKingLocation, "w")
+
+    '''
+    Whether the opponent of the side to move attacks the tile (r, c)
+    '''
+    def tileUnderAttack(self, r, c):
+        return self.isSquareAttacked((r, c), "b" if self.whiteToMove else "w")
+
+    '''
+    Whether any piece of byColor ("w" or "b") attacks the tile square = (row, column).
+    Instead of generating the attacker's moves, this checks the attacker's knights against the tile, looks for a
+    pawn or king on the tiles they attack from, and for the first piece on every line that an attacking slider
+    could use; it stops at the first attacker found.
+    '''
+    def isSquareAttacked(self, square, byColor):
+        r, c = square
+        board = self.board
+        locations = self.pieceLocations
+        for endRow, endCol in locations[byColor + "N"]:
+            if (endRow - r) * (endCol - c) in (2, -2):     # A knight jump is 1 by 2 tiles
+                return True
+        # White pawns capture towards row 0, so they attack a tile from the row below it
+        pawnRow = r + 1 if byColor == "w" else r - 1
+        if 0 <= pawnRow <= 7:
+            pawn = byColor + "p"
+            if (c-1 >= 0 and board[pawnRow][c-1] == pawn) or (c+1 <= 7 and board[pawnRow][c+1] == pawn):
                 return True
+        king = byColor + "K"
+        for endRow, endCol in kingTargets[r][c]:
+            if board[endRow][endCol] == king:
+                return True
+        queens = locations[byColor + "Q"]
+        first = 0 if locations[byColor + "R"] or queens else 4
+        last = 8 if locations[byColor + "B"] or queens else 4
+        rays = tileRays[r][c]
+        for j in range(first, last):
+            sliders = "RQ" if j < 4 else "BQ"   # Directions 0-3 are orthogonal, 4-7 are diagonal
+            for endRow, endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    continue
+                if endPiece[0] == byColor and endPiece[1] in sliders:
+                    return True
+                break   # The first piece on the line blocks it
         return False
 
     def getPossibleMoves(self):
         # All possible moves (this means that it does not consider exposing the king to checks)
+        # Only the tiles of the side to move's pieces are visited, not the whole board
         moves = []
-        for r in range(len(self.board)):    # Number of rows
-            for c in range(len(self.board[r])):     # Number of columns in a given row
-                turn = self.board[r][c][0]
-                if turn == "w" and self.whiteToMove or turn == "b" and not self.whiteToMove:
-                    piece = self.board[r][c][1]
-                    if piece == "p":
-                        self.getPawnMoves(r, c, moves)
-                    elif piece == "R":
-                        self.getRookMoves(r, c, moves)
-                    elif piece == "N":
-                        self.getKnightMoves(r, c, moves)
-                    elif piece == "B":
-                        self.getBishopMoves(r, c, moves)
-                    elif piece == "Q":
-                        self.getQueenMoves(r, c, moves)
-                    elif piece == "K":
-                        self.getKingMoves(r, c, moves)
+        color = "w" if self.whiteToMove else "b"
+        locations = self.pieceLocations
+        for piece, getMoves in (("p", self.getPawnMoves), ("N", self.getKnightMoves), ("B", self.getBishopMoves),
+                                ("R", self.getRookMoves), ("Q", self.getQueenMoves), ("K", self.getKingMoves)):
+            for r, c in locations[color + piece]:
+                getMoves(r, c, moves)
         return moves
 
     def getPawnMoves(self, r, c, moves):
+        pinDirection = self.pins.get((r, c))
         if self.whiteToMove and self.board[r][c][0] == "w":
-            if self.board[r-1][c] == "--":
-                moves.append(Move((r, c), (r-1, c), self.board))
+            if self.board[r-1][c] == "--" and self.isAllowedByPin(pinDirection, (-1, 0)) and \
+                    (self.quietMoves or r == 1):    # A push to the last rank is a promotion
+                self.addPawnMove((r, c), (r-1, c), moves)
                 if r == 6 and self.board[r-2][c] == "--":
                     moves.append(Move((r, c), (r-2, c), self.board))
-            if c-1 >= 0 and self.board[r-1][c-1][0] == "b":  # checks if on the diagonal left tile there is a black piece to capture
-                moves.append(Move((r, c), (r-1, c-1), self.board))
-            elif c-1 >= 0 and (r-1, c-1) == self.possibleEnpassant:
-                moves.append(Move((r, c), (r - 1, c - 1), self.board, isEnpassantMove=True))
-            if c+1 <= 7 and self.board[r-1][c+1][0] == "b":
-                moves.append(Move((r, c), (r-1, c+1), self.board))
-            elif c-1 >= 0 and (r-1, c+1) == self.possibleEnpassant:
-                moves.append(Move((r, c), (r - 1, c+1), self.board, isEnpassantMove=True))
+            if self.isAllowedByPin(pinDirection, (-1, -1)):
+                if c-1 >= 0 and self.board[r-1][c-1][0] == "b":  # checks if on the diagonal left tile there is a black piece to capture
+                    self.addPawnMove((r, c), (r-1, c-1), moves)
+                elif c-1 >= 0 and (r-1, c-1) == self.possibleEnpassant:
+                    moves.append(Move((r, c), (r - 1, c - 1), self.board, isEnpassantMove=True))
+            if self.isAllowedByPin(pinDirection, (-1, 1)):
+                if c+1 <= 7 and self.board[r-1][c+1][0] == "b":
+                    self.addPawnMove((r, c), (r-1, c+1), moves)
+                elif c+1 <= 7 and (r-1, c+1) == self.possibleEnpassant:
+                    moves.append(Move((r, c), (r - 1, c+1), self.board, isEnpassantMove=True))
 
         elif not self.whiteToMove and self.board[r][c][0] == "b":
-            if self.board[r+1][c] == "--":
-                moves.append(Move((r, c), (r+1, c), self.board))
+            if self.board[r+1][c] == "--" and self.isAllowedByPin(pinDirection, (1, 0)) and \
+                    (self.quietMoves or r == 6):
+                self.addPawnMove((r, c), (r+1, c), moves)
                 if r == 1 and self.board[r+2][c] == "--":
                     moves.append(Move((r, c), (r+2, c), self.board))
-            if c-1 >= 0 and self.board[r+1][c-1][0] == "w":   # checks if on the diagonal left tile there is a black piece to capture
-                moves.append(Move((r, c), (r+1, c-1), self.board))
-            elif c-1 >= 0 and (r+1, c-1) == self.possibleEnpassant:
-                moves.append(Move((r, c), (r+1, c-1), self.board, isEnpassantMove=True))
-            if c+1 <= 7 and self.board[r+1][c+1][0] == "w":
-                moves.append(Move((r, c), (r+1, c+1), self.board))
-            elif c-1 >= 0 and (r+1, c+1) == self.possibleEnpassant:
-                moves.append(Move((r, c), (r+1, c+1), self.board, isEnpassantMove=True))
+            if self.isAllowedByPin(pinDirection, (1, -1)):
+                if c-1 >= 0 and self.board[r+1][c-1][0] == "w":   # checks if on the diagonal left tile there is a black piece to capture
+                    self.addPawnMove((r, c), (r+1, c-1), moves)
+                elif c-1 >= 0 and (r+1, c-1) == self.possibleEnpassant:
+                    moves.append(Move((r, c), (r+1, c-1), self.board, isEnpassantMove=True))
+            if self.isAllowedByPin(pinDirection, (1, 1)):
+                if c+1 <= 7 and self.board[r+1][c+1][0] == "w":
+                    self.addPawnMove((r, c), (r+1, c+1), moves)
+                elif c+1 <= 7 and (r+1, c+1) == self.possibleEnpassant:
+                    moves.append(Move((r, c), (r+1, c+1), self.board, isEnpassantMove=True))
+
+    def addPawnMove(self, startTile, endTile, moves):
+        if endTile[0] == 0 or endTile[0] == 7:  # A pawn reaching the last rank adds one move per promotion choice
+            for piece in Move.promotionChoices:
+                moves.append(Move(startTile, endTile, self.board, promotionChoice=piece))
+        else:
+            moves.append(Move(startTile, endTile, self.board))
 
     def getRookMoves(self, r, c, moves):
-        directions = ((-1, 0), (1, 0), (0, -1), (0, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break   # Rook stops before friendly piece
-                else:
-                    break   # Rook reaches end of the board
+        self.getSliderMoves(r, c, 0, 4, moves)      # Directions 0-3 are orthogonal
 
     def getKnightMoves(self, r, c, moves):
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        if (r, c) in self.pins:     # A pinned knight can never move
+            return
         enemyColor = "b" if self.whiteToMove else "w"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                endPiece = self.board[endRow][endCol]
-                if endPiece == "--" or endPiece[0] == enemyColor:
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        for endRow, endCol in knightTargets[r][c]:
+            endPiece = self.board[endRow][endCol]
+            if (endPiece == "--" and self.quietMoves) or endPiece[0] == enemyColor:
+                moves.append(Move((r, c), (endRow, endCol), self.board))
 
     def getBishopMoves(self, r, c, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:
-                        break  # Bishop stops before friendly piece
-                else:
-                    break  # Bishop reaches end of the board
+        self.getSliderMoves(r, c, 4, 8, moves)      # Directions 4-7 are diagonal
 
     def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+        self.getSliderMoves(r, c, 0, 8, moves)
 
-    def getKingMoves(self, r, c, moves):
-        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+    '''
+    Moves along the precomputed rays of tile (r, c) with index first to last-1 in kingDirections.
+    A slider stops on the first enemy piece (capturing it) or before the first friendly piece.
+    '''
+    def getSliderMoves(self, r, c, first, last, moves):
         enemyColor = "b" if self.whiteToMove else "w"
-        for i in range(8):
-            endRow = r + kingMoves[i][0]
-            endCol = c + kingMoves[i][1]
-            if 0 <= endRow <= 7 and 0 <= endCol < 8:
+        pinDirection = self.pins.get((r, c))
+        rays = tileRays[r][c]
+        for j in range(first, last):
+            if pinDirection is not None and not self.isAllowedByPin(pinDirection, kingDirections[j]):
+                continue
+            for endRow, endCol in rays[j]:
                 endPiece = self.board[endRow][endCol]
-                if endPiece == "--" or endPiece[0] == enemyColor:
+                if endPiece == "--":
+                    if self.quietMoves:
+                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                elif endPiece[0] == enemyColor:
                     moves.append(Move((r, c), (endRow, endCol), self.board))
+                    break
+                else:
+                    break   # Stops before friendly piece
 
+    def getKingMoves(self, r, c, moves):
+        enemyColor = "b" if self.whiteToMove else "w"
+        for endRow, endCol in kingTargets[r][c]:
+            endPiece = self.board[endRow][endCol]
+            if (endPiece == "--" and self.quietMoves) or endPiece[0] == enemyColor:
+                moves.append(Move((r, c), (endRow, endCol), self.board))
 
     def getCastleMoves(self, r, c, moves):
-        if self.tileUnderAttack(r, c):
+        if self.tileUnderAttack(r, c):      # Cannot castle out of check
             return
         if (self.whiteToMove and self.currentCastlingRights.wKs) or (not self.whiteToMove and self.currentCastlingRights.bKs):
             self.getKingsideCastleMoves(r, c, moves)
@@ -321,6 +845,65 @@ class BoardState():
                 moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
 
 
+# Board representations that can be selected with BoardState(backend=...), by name: "module.Class"
+backends = {
+    "bitboard": "Chess.Bitboard.BitboardState",
+    "mailbox": "Chess.Mailbox.MailboxState",
+}
+
+
+def getBackend(name):
+    if name not in backends:
+        raise ValueError("Unknown board backend " + repr(name) + ", expected one of: list, " + ", ".join(backends))
+    moduleName, className = backends[name].rsplit(".", 1)
+    return getattr(importlib.import_module(moduleName), className)
+
+
+# Directions of a king step, the first 4 are orthogonal (rook lines), the last 4 diagonal (bishop lines)
+kingDirections = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def onBoardSteps(r, c, steps):
+    return tuple((r + d[0], c + d[1]) for d in steps if 0 <= r + d[0] <= 7 and 0 <= c + d[1] <= 7)
+
+
+def ray(r, c, d):
+    tiles = []
+    endRow, endCol = r + d[0], c + d[1]
+    while 0 <= endRow <= 7 and 0 <= endCol <= 7:
+        tiles.append((endRow, endCol))
+        endRow, endCol = endRow + d[0], endCol + d[1]
+    return tuple(tiles)
+
+
+# Precomputed tables of every tile [row][column], so that move generation needs no bounds checks:
+# the tiles a knight or king reaches, and the 8 rays (tiles from nearest to furthest) in the order of kingDirections
+knightTargets = [[onBoardSteps(r, c, knightMoves) for c in range(8)] for r in range(8)]
+kingTargets = [[onBoardSteps(r, c, kingDirections) for c in range(8)] for r in range(8)]
+tileRays = [[tuple(ray(r, c, d) for d in kingDirections) for c in range(8)] for r in range(8)]
+
+# Conversion between the FEN piece letters and the two characters tile strings
+fenToPiece = {"K": "wK", "Q": "wQ", "R": "wR", "B": "wB", "N": "wN", "P": "wp",
+              "k": "bK", "q": "bQ", "r": "bR", "b": "bB", "n": "bN", "p": "bp"}
+pieceToFen = {v: k for k, v in fenToPiece.items()}
+
+# Scores of the pieces of Evaluation by tile (row * 8 + column), from White's side
+materialScores = Evaluation.materialScores
+middlegameScores = Evaluation.middlegameScores
+endgameScores = Evaluation.endgameScores
+phaseWeights = Evaluation.phaseWeights
+
+# Zobrist keys: a random 64-bit number for every piece on every tile (row * 8 + column), for black to move,
+# for each castling right (in the order of CastleRights) and for the column of the enpassant tile.
+# The key of a position is the XOR of the numbers of everything in it. The seed is fixed so keys can be stored.
+zobristRandom = random.Random(20210421)
+zobristPieces = {piece: [zobristRandom.getrandbits(64) for _ in range(64)] for piece in fenToPiece.values()}
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = [zobristRandom.getrandbits(64) for _ in range(4)]
+zobristEnpassant = [zobristRandom.getrandbits(64) for _ in range(8)]
+
+
 class CastleRights():
     def __init__(self, wKs, bKs, wQs, bQs):
         self.wKs = wKs
@@ -330,6 +913,9 @@ class CastleRights():
 
 
 class Move():
+    # Slots instead of a __dict__: a Move is a single small allocation, thousands are built per getValidMoves call
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "isPawnPromotion",
+                 "promotionChoice", "isEnpassantMove", "isCastleMove", "moveID")
 
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
                    "5": 3, "6": 2, "7": 1, "8": 0}
@@ -337,8 +923,10 @@ class Move():
     filesToColumns = {"a": 0, "b": 1, "c": 2, "d": 3,
                       "e": 4, "f": 5, "g": 6, "h": 7}
     columnsToFiles = {v: k for k, v in filesToColumns.items()}
+    # The first choice is the default one, used when the player does not pick a piece
+    promotionChoices = ("Q", "R", "B", "N")
 
-    def __init__(self, startTile, endTile, board, isEnpassantMove=False, isCastleMove=False):
+    def __init__(self, startTile, endTile, board, isEnpassantMove=False, isCastleMove=False, promotionChoice="Q"):
         self.startRow = startTile[0]
         self.startCol = startTile[1]
         self.endRow = endTile[0]
@@ -346,11 +934,16 @@ class Move():
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
         self.isPawnPromotion = (self.pieceMoved == "wp" and self.endRow == 0 or self.pieceMoved == "bp" and self.endRow == 7)
+        self.promotionChoice = promotionChoice
         self.isEnpassantMove = isEnpassantMove
         if self.isEnpassantMove:
             self.pieceCaptured = "wp" if self.pieceMoved == "bp" else "bp"
         self.isCastleMove = isCastleMove
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        # Start tile (bits 0-5), end tile (bits 6-11) and promotion choice (bits 12-13) of a tile index row * 8 + column.
+        # A queen promotion has choice 0, so a move built from the player's clicks matches it.
+        self.moveID = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.isPawnPromotion:
+            self.moveID |= self.promotionChoices.index(promotionChoice) << 12
 
     '''
     Overriding the equals method
@@ -360,8 +953,181 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
+    def __repr__(self):
+        return "Move(" + self.getChessNotation() + ")"
+
+    '''
+    The move as a 16-bit integer: the moveID (start, end, promotion choice) plus an enpassant flag (bit 14)
+    and a castle flag (bit 15). The pieces are not part of it, they come from the board or from the move log.
+    '''
+    def pack(self):
+        return self.moveID | self.isEnpassantMove << 14 | self.isCastleMove << 15
+
+    '''
+    This builds the Move of a packed 16-bit integer, given the piece that moved and the piece it captured
+    '''
+    @classmethod
+    def unpack(cls, code, pieceMoved, pieceCaptured):
+        move = cls.__new__(cls)
+        start = code & 63
+        end = code >> 6 & 63
+        move.startRow = start >> 3
+        move.startCol = start & 7
+        move.endRow = end >> 3
+        move.endCol = end & 7
+        move.pieceMoved = pieceMoved
+        move.pieceCaptured = pieceCaptured
+        move.isPawnPromotion = (pieceMoved == "wp" and move.endRow == 0 or pieceMoved == "bp" and move.endRow == 7)
+        move.promotionChoice = cls.promotionChoices[code >> 12 & 3]
+        move.isEnpassantMove = bool(code >> 14 & 1)
+        move.isCastleMove = bool(code >> 15 & 1)
+        move.moveID = code & 0x3fff
+        return move
+
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionChoice.lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.columnsToFiles[c] + self.rowsToRanks[r]
+
+
+'''
+The moves played, stored as one 32-bit integer each in an array instead of a list of Move objects:
+the 16-bit packed move (Move.pack) with the moved piece in bits 16-19 and the captured piece in bits 20-23.
+Moves are decoded back into Move objects only when they are read.
+'''
+class MoveLog():
+    __slots__ = ("entries",)
+
+    # 4-bit piece codes of the log entries
+    pieces = ("--", "wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+    pieceCodes = {piece: code for code, piece in enumerate(pieces)}
+
+    def __init__(self, moves=()):
+        self.entries = array("I")
+        for move in moves:
+            self.append(move)
+
+    def append(self, move):
+        self.entries.append(move.pack() | self.pieceCodes[move.pieceMoved] << 16 | self.pieceCodes[move.pieceCaptured] << 20)
+
+    def decode(self, entry):
+        return Move.unpack(entry & 0xffff, self.pieces[entry >> 16 & 15], self.pieces[entry >> 20 & 15])
+
+    def pop(self):
+        return self.decode(self.entries.pop())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.decode(entry) for entry in self.entries[index]]
+        return self.decode(self.entries[index])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield self.decode(entry)
+
+
+'''
+A least recently used cache of the legal moves and the checkmate/stalemate flags of positions, keyed by Zobrist key
+(which covers the pieces, the side to move, the castling rights and the enpassant tile, all the moves depend on).
+When more than maxSize positions are stored the one used longest ago is dropped.
+'''
+class MoveCache():
+    def __init__(self, maxSize=4096):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return "%d positions, %d hits, %d misses (%.0f%% hit rate)" % (
+            len(self.entries), self.hits, self.misses, 100 * self.hitRate())
+
+
+'''
+The legal moves of a position indexed for the front-end: the moves from every start tile, the move between two tiles
+(one per promotion choice for a promotion) and, for every start tile, the tiles to highlight when it is selected
+(itself and its end tiles). It is built once per position, so a click or a frame is a dictionary lookup however many
+moves there are. It iterates and has a length like the list of moves it was built from.
+'''
+class MoveIndex():
+    def __init__(self, moves=()):
+        self.moves = list(moves)
+        self.byStart = {}   # {(row, column): [moves starting there]}
+        self.byTiles = {}   # {((row, column), (row, column)): {promotion choice: move}}
+        for move in self.moves:
+            start = (move.startRow, move.startCol)
+            self.byStart.setdefault(start, []).append(move)
+            self.byTiles.setdefault((start, (move.endRow, move.endCol)), {})[move.promotionChoice] = move
+        self.highlighted = {start: frozenset([start] + [(move.endRow, move.endCol) for move in moves])
+                            for start, moves in self.byStart.items()}
+
+    def movesFrom(self, tile):
+        return self.byStart.get(tile, ())
+
+    '''
+    The legal move from start to end, or None. For a promotion the piece is promotionChoice (a queen by default).
+    '''
+    def find(self, start, end, promotionChoice="Q"):
+        choices = self.byTiles.get((start, end))
+        if choices is None:
+            return None
+        return choices.get(promotionChoice) if len(choices) > 1 else next(iter(choices.values()))
+
+    '''
+    The pieces a pawn can promote to by moving from start to end, empty when the move is not a legal promotion
+    '''
+    def promotionChoices(self, start, end):
+        choices = self.byTiles.get((start, end), {})
+        return tuple(choices) if len(choices) > 1 else ()
+
+    '''
+    The tiles to highlight when tile is selected: the tile and the end tiles of its moves
+    '''
+    def highlights(self, tile):
+        return self.highlighted.get(tile) or frozenset((tile,))
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def __getitem__(self, index):
+        return self.moves[index]
@@ -0,0 +1,133 @@
+"""
+This is responsible for the static evaluation of a BoardState, in centipawns.
+The score is material plus piece-square tables, with a middlegame and an endgame table for every piece that are
+blended by the game phase (how much non-pawn material is left), so that the king hides early and centralises late.
+The tables are written from White's side with row 0 being the 8th rank, like BoardState.board, and mirrored for Black.
+"""
+
+pieceValues = {"p": 100, "N": 320, "B": 330, "R": 500, "Q": 900, "K": 0}
+
+# Phase weight of every piece type, the full set of pieces is MaxPhase (the start position)
+phaseWeights = {"p": 0, "N": 1, "B": 1, "R": 2, "Q": 4, "K": 0}
+MaxPhase = 24
+
+pawnTable = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0)
+
+pawnEndgameTable = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0)
+
+knightTable = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+
+bishopTable = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+
+rookTable = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0)
+
+queenTable = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20)
+
+kingTable = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+
+kingEndgameTable = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+middlegameTables = {"p": pawnTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable, "K": kingTable}
+endgameTables = {"p": pawnEndgameTable, "N": knightTable, "B": bishopTable, "R": rookTable, "Q": queenTable,
+                 "K": kingEndgameTable}
+
+
+def pieceSquareScores(tables):
+    scores = {}
+    for kind, table in tables.items():
+        scores["w" + kind] = tuple(pieceValues[kind] + table[sq] for sq in range(64))
+        # Black's table is White's flipped top to bottom, and counts against White
+        scores["b" + kind] = tuple(-(pieceValues[kind] + table[(7 - sq // 8) * 8 + sq % 8]) for sq in range(64))
+    return scores
+
+
+# Material of every piece, from White's side: materialScores["bN"] == -320
+materialScores = {color + kind: (value if color == "w" else -value) for kind, value in pieceValues.items()
+                  for color in "wb"}
+
+# Material plus position of every piece on every tile (r * 8 + c), from White's side: middlegameScores["bN"][sq] < 0
+middlegameScores = pieceSquareScores(middlegameTables)
+endgameScores = pieceSquareScores(endgameTables)
+
+
+'''
+This blends a middlegame and an endgame score by the phase (MaxPhase is a full middlegame, 0 a bare endgame)
+'''
+
+def taper(middlegame, endgame, phase):
+    phase = min(phase, MaxPhase)    # Promotions can take the phase above the start position
+    return (middlegame * phase + endgame * (MaxPhase - phase)) // MaxPhase
+
+
+'''
+This scores a position from the side of the player to move. BoardState keeps the sums of the scores of its pieces up
+to date as moves are made and taken back, so this reads them instead of visiting the board.
+'''
+
+def evaluate(bs):
+    score = taper(bs.middlegameScore, bs.endgameScore, bs.phase)
+    return score if bs.whiteToMove else -score
@@ -0,0 +1,260 @@
+"""
+This is responsible for playing games without a window: the rules of main.py's game loop (legal moves, checkmate,
+stalemate) plus the draw rules a finished automated game needs, with the moves coming from scripted move sources.
+It does not import pygame unless positions are rendered, and rendering draws on an off-screen surface
+(SDL_VIDEODRIVER=dummy is set if no video driver is), so games run on servers without a display.
+It can be run from the command line: python -m Chess.Headless --help
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from Chess import Book
+from Chess import ChessEngine
+from Chess import Profiling
+from Chess import Search
+from Chess import Tablebase
+
+
+'''
+Move sources. A player is any object with a chooseMove(bs, validMoves) method that returns one of validMoves,
+or None to stop the game there (a script that ran out of moves)
+'''
+
+class ScriptedPlayer():
+    '''
+    Plays the moves of a whole game, in the coordinate notation of Move.getChessNotation ("e2e4", "e7e8q").
+    The move for ply i of the game is moves[i], so the same script can be given to both sides.
+    A move that is not legal in the position raises a ValueError.
+    '''
+    def __init__(self, moves):
+        self.moves = moves.split() if isinstance(moves, str) else list(moves)
+
+    def chooseMove(self, bs, validMoves):
+        ply = len(bs.moveLog)
+        if ply >= len(self.moves):
+            return None
+        notation = self.moves[ply]
+        for move in validMoves:
+            if move.getChessNotation() == notation:
+                return move
+        raise ValueError("Illegal scripted move " + notation + " in " + bs.toFEN())
+
+
+class RandomPlayer():
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def chooseMove(self, bs, validMoves):
+        return self.random.choice(validMoves)
+
+
+class GreedyPlayer():
+    '''
+    Plays the capture or promotion that wins the most material (the most valuable victim, taken by the least valuable
+    attacker), or a random move when there is none
+    '''
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def chooseMove(self, bs, validMoves):
+        best = max(Search.captureOrder(move) for move in validMoves)
+        return self.random.choice([move for move in validMoves if Search.captureOrder(move) == best])
+
+
+class EnginePlayer():
+    '''
+    Plays the move of a Search.Searcher, within a depth, time (seconds) and/or node budget.
+    With a Book.OpeningBook it plays a book move, picked by weight, while the position is in the book, and with
+    Tablebase.Tablebases the perfect move of the endgames they hold.
+    '''
+    def __init__(self, depth=None, timeLimit=None, nodeLimit=None, book=None, seed=None, tablebases=None):
+        if depth is None and timeLimit is None and nodeLimit is None:
+            depth = 2
+        self.depth = depth or Search.MaxPly - 1
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.searcher = Search.Searcher()
+        self.book = book
+        self.random = random.Random(seed)
+        self.tablebases = tablebases
+
+    def chooseMove(self, bs, validMoves):
+        if self.book is not None:
+            move = self.book.weightedMove(bs, validMoves, self.random)
+            if move is not None:
+                return move
+        if self.tablebases is not None:
+            move = self.tablebases.bestMove(bs, validMoves)
+            if move is not None:
+                return move
+        return self.searcher.search(bs, self.depth, self.timeLimit, self.nodeLimit).move
+
+
+class GameResult():
+    def __init__(self, result, reason, moves, fen, seconds):
+        self.result = result    # "1-0", "0-1", "1/2-1/2" or "*" (unfinished)
+        self.reason = reason
+        self.moves = moves      # The moves played, in coordinate notation
+        self.fen = fen          # The final position
+        self.seconds = seconds
+
+    def __str__(self):
+        return "%-7s %-21s %3d plies  %6.2fs  %s" % (self.result, self.reason, len(self.moves), self.seconds, self.fen)
+
+
+'''
+The result and reason of a finished game, or None while it goes on. validMoves are the moves of the side to move.
+Threefold repetition uses the Zobrist keys of the positions since the last capture or pawn move.
+'''
+
+def gameOutcome(bs, validMoves):
+    if len(validMoves) == 0:
+        if bs.inCheck():
+            return ("0-1" if bs.whiteToMove else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if bs.halfmoveClock >= 100:
+        return "1/2-1/2", "fifty move rule"
+    recent = bs.zobristLog[-(bs.halfmoveClock + 1):]
+    if recent.count(bs.zobristKey) >= 3:
+        return "1/2-1/2", "threefold repetition"
+    if isInsufficientMaterial(bs):
+        return "1/2-1/2", "insufficient material"
+    return None
+
+
+'''
+Only kings, or kings and a single bishop or knight: neither side can ever mate
+'''
+
+def isInsufficientMaterial(bs):
+    locations = bs.pieceLocations
+    minors = 0
+    for piece, tiles in locations.items():
+        if tiles:
+            if piece[1] in "pRQ":
+                return False
+            if piece[1] in "BN":
+                minors += len(tiles)
+    return minors <= 1
+
+
+'''
+This plays one game between two players from fen and returns its GameResult. Games longer than maxPlies are left
+unfinished ("*"). onMove, if given, is called with the BoardState after every move (to render or log it).
+'''
+
+def playGame(white, black, fen=ChessEngine.StartFEN, maxPlies=600, backend="list", onMove=None):
+    start = time.perf_counter()
+    bs = ChessEngine.BoardState.fromFEN(fen, backend)
+    moves = []
+    outcome = None
+    while len(moves) < maxPlies:
+        validMoves = bs.getLegalMoves()
+        outcome = gameOutcome(bs, validMoves)
+        if outcome is not None:
+            break
+        move = (white if bs.whiteToMove else black).chooseMove(bs, validMoves)
+        if move is None:
+            outcome = ("*", "end of script")
+            break
+        bs.makeMove(move)
+        moves.append(move.getChessNotation())
+        if onMove is not None:
+            onMove(bs)
+    if outcome is None:
+        outcome = ("*", "ply limit")
+    return GameResult(outcome[0], outcome[1], moves, bs.toFEN(), time.perf_counter() - start)
+
+
+class OffscreenRenderer():
+    '''
+    Saves PNG images of positions drawn by Render.BoardRenderer on an off-screen surface.
+    pygame and Render are only imported here, so games that are not rendered never need them.
+    '''
+    def __init__(self, directory):
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        import pygame
+        from Chess import Render
+        self.pygame = pygame
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        Render.loadImages()
+        self.surface = pygame.Surface((Render.Width, Render.Height))
+        self.renderer = Render.BoardRenderer(self.surface)
+
+    def save(self, bs, name):
+        self.renderer.render(bs, ChessEngine.MoveIndex(), ())
+        self.pygame.image.save(self.surface, os.path.join(self.directory, name + ".png"))
+
+
+Players = ("random", "greedy", "engine", "script")
+
+
+def makePlayer(kind, args, seed, book=None, tablebases=None):
+    if kind == "random":
+        return RandomPlayer(seed)
+    if kind == "greedy":
+        return GreedyPlayer(seed)
+    if kind == "engine":
+        return EnginePlayer(args.depth, args.time, args.nodes, book, seed, tablebases)
+    return ScriptedPlayer(args.moves or "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play games without a window")
+    parser.add_argument("-n", "--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--white", choices=Players, default="random")
+    parser.add_argument("--black", choices=Players, default="random")
+    parser.add_argument("--moves", help='moves of the script players, in coordinate notation: "e2e4 e7e5 ..."')
+    parser.add_argument("--fen", default=ChessEngine.StartFEN, help="start position of every game")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random players (game i uses seed + i)")
+    parser.add_argument("--max-plies", type=int, default=600, help="plies after which a game is left unfinished")
+    parser.add_argument("-d", "--depth", type=int, help="search depth of the engine players")
+    parser.add_argument("-t", "--time", type=float, help="seconds per move of the engine players")
+    parser.add_argument("--nodes", type=int, help="nodes per move of the engine players")
+    parser.add_argument("--book", help="Polyglot opening book of the engine players")
+    parser.add_argument("--tablebases", metavar="DIR", help="endgame tables of the engine players")
+    parser.add_argument("-b", "--backend", choices=["list"] + sorted(ChessEngine.backends), default="list")
+    parser.add_argument("--render", metavar="DIR", help="save a PNG of the final position of every game in DIR")
+    parser.add_argument("--render-moves", action="store_true", help="with --render, save a PNG after every move")
+    parser.add_argument("--profile", metavar="PATH", help="instrument the engine and write a JSON report to PATH")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    renderer = OffscreenRenderer(args.render) if args.render else None
+    book = Book.OpeningBook(args.book) if args.book else None
+    tablebases = Tablebase.Tablebases(args.tablebases) if args.tablebases else None
+    if args.profile:
+        Profiling.profiler.enable()
+    tally = {}
+    start = time.perf_counter()
+    for game in range(args.games):
+        white = makePlayer(args.white, args, args.seed + 2 * game, book, tablebases)
+        black = makePlayer(args.black, args, args.seed + 2 * game + 1, book, tablebases)
+        onMove = None
+        if renderer is not None and args.render_moves:
+            def onMove(bs, game=game):
+                renderer.save(bs, "game%04d-ply%03d" % (game + 1, len(bs.moveLog)))
+        result = playGame(white, black, args.fen, args.max_plies, args.backend, onMove)
+        if renderer is not None:
+            renderer.save(ChessEngine.BoardState.fromFEN(result.fen), "game%04d-final" % (game + 1))
+        tally[result.result] = tally.get(result.result, 0) + 1
+        if not args.quiet:
+            print("game %4d  %s" % (game + 1, result))
+    seconds = time.perf_counter() - start
+    print("%d games in %.2fs (%.1f games/s)  %s" % (
+        args.games, seconds, args.games / seconds if seconds > 0 else float("inf"),
+        "  ".join("%s: %d" % (result, count) for result, count in sorted(tally.items()))))
+    if args.profile:
+        Profiling.profiler.disable()
+        print(Profiling.profiler)
+        Profiling.profiler.writeReport(args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+This is an integer mailbox backend of BoardState, selected with ChessEngine.BoardState(backend="mailbox").
+The pieces are small integers on a 10x12 board: the 8x8 tiles are surrounded by a border of OffBoard tiles
+(two rows above and below, one column on each side), so a pawn capture never needs a bounds check.
+Tile (row, column) is index 21 + row * 10 + column.
+Knight and king targets and the slider rays of every tile are precomputed, so generating a move is a table lookup
+and an integer comparison. The integers are the position: makeMove and undoMove update them and the indices of every
+piece, and moves are built from their packed form. The 2d list of strings and pieceLocations of BoardState are built
+from the integers when the rest of the program (main.py, notation) reads them.
+"""
+
+from Chess import ChessEngine
+
+# A piece is its color (White or Black) plus its type, empty tiles are 0 and the border is OffBoard (both color bits)
+Pawn, Knight, Bishop, Rook, Queen, King = 1, 2, 3, 4, 5, 6
+White, Black, OffBoard = 8, 16, 24
+pieceCodes = {"--": 0}
+for color, colorBits in (("w", White), ("b", Black)):
+    for name, kind in (("p", Pawn), ("N", Knight), ("B", Bishop), ("R", Rook), ("Q", Queen), ("K", King)):
+        pieceCodes[color + name] = colorBits | kind
+# The name of every piece code, as read by main.py and stored in Move.pieceMoved and pieceCaptured
+pieceNames = [None] * (OffBoard + 1)
+for name, code in pieceCodes.items():
+    pieceNames[code] = name
+promotionKinds = {"Q": Queen, "R": Rook, "B": Bishop, "N": Knight}
+
+# Index of every tile [row][column] on the 10x12 board, and the (row, column) of every index
+tileIndex = [[21 + r * 10 + c for c in range(8)] for r in range(8)]
+tileOf = [None] * 120
+for r in range(8):
+    for c in range(8):
+        tileOf[tileIndex[r][c]] = (r, c)
+# The tile of every index as row * 8 + column, the tile numbering of ChessEngine.Move.pack
+squareOf = [None] * 120
+for r in range(8):
+    for c in range(8):
+        squareOf[tileIndex[r][c]] = r * 8 + c
+
+# Offsets of the directions on the 10x12 board, in the order of ChessEngine.kingDirections (4 orthogonal, 4 diagonal)
+directionOffsets = tuple(d[0] * 10 + d[1] for d in ChessEngine.kingDirections)
+# The two directions index j is allowed to move along when pinned in direction j (the pin line, both ways)
+pinLines = [frozenset((j, directionOffsets.index(-directionOffsets[j]))) for j in range(8)]
+
+
+def toIndices(tiles):
+    return tuple(tileIndex[r][c] for r, c in tiles)
+
+
+knightTargets = [None] * 120
+kingTargets = [None] * 120
+tileRays = [None] * 120
+for r in range(8):
+    for c in range(8):
+        knightTargets[tileIndex[r][c]] = toIndices(ChessEngine.knightTargets[r][c])
+        kingTargets[tileIndex[r][c]] = toIndices(ChessEngine.kingTargets[r][c])
+        tileRays[tileIndex[r][c]] = tuple(toIndices(ray) for ray in ChessEngine.tileRays[r][c])
+
+
+class MailboxState(ChessEngine.BoardState):
+    backend = "mailbox"
+
+    def __init__(self, backend="mailbox"):
+        super().__init__()
+
+    '''
+    board and pieceLocations are not updated by makeMove and undoMove: they are built from the integer board when they
+    are read, and kept until the next move. They are views for the rest of the program, changing them does not change
+    the position.
+    '''
+    @property
+    def board(self):
+        if self.boardView is None:
+            squares = self.squares
+            self.boardView = [[pieceNames[squares[index]] for index in row] for row in tileIndex]
+        return self.boardView
+
+    @board.setter
+    def board(self, board):     # BoardState.__init__ and loadFEN set the whole board, loadPieceLocations follows
+        self.squares = [OffBoard] * 120
+        for r in range(8):
+            for c in range(8):
+                self.squares[tileIndex[r][c]] = pieceCodes[board[r][c]]
+        self.boardView = None
+
+    @property
+    def pieceLocations(self):
+        if self.locationsView is None:
+            self.locationsView = {pieceNames[piece]: {tileOf[index] for index in indices}
+                                  for piece, indices in self.pieceIndices.items()}
+        return self.locationsView
+
+    '''
+    This builds the indices of every piece from the integer board
+    '''
+    def loadPieceLocations(self):
+        self.pieceIndices = {pieceCodes[piece]: set() for piece in ChessEngine.pieceToFen}
+        for index, piece in enumerate(self.squares):
+            if piece != 0 and piece != OffBoard:
+                self.pieceIndices[piece].add(index)
+        self.boardView = None
+        self.locationsView = None
+
+    def makeMove(self, move):
+        if self.squares[tileIndex[move.startRow][move.startCol]] != 0:
+            self.placeMove(move)
+            self.recordMove(move)
+
+    '''
+    This moves the pieces of a move on the integer board and in pieceIndices
+    '''
+    def placeMove(self, move):
+        squares = self.squares
+        indices = self.pieceIndices
+        start = tileIndex[move.startRow][move.startCol]
+        end = tileIndex[move.endRow][move.endCol]
+        piece = pieceCodes[move.pieceMoved]
+        placed = (piece & OffBoard) | promotionKinds[move.promotionChoice] if move.isPawnPromotion else piece
+        if move.pieceCaptured != "--":
+            captured = start + move.endCol - move.startCol if move.isEnpassantMove else end
+            squares[captured] = 0
+            indices[pieceCodes[move.pieceCaptured]].remove(captured)
+        squares[start] = 0
+        squares[end] = placed
+        indices[piece].remove(start)
+        indices[placed].add(end)
+        if move.isCastleMove:
+            rookStart, rookEnd = (end + 1, end - 1) if end > start else (end - 2, end + 1)
+            rook = squares[rookStart]
+            squares[rookEnd] = rook
+            squares[rookStart] = 0
+            indices[rook].remove(rookStart)
+            indices[rook].add(rookEnd)
+        self.boardView = None
+        self.locationsView = None
+
+    def unplaceMove(self, move):
+        squares = self.squares
+        indices = self.pieceIndices
+        start = tileIndex[move.startRow][move.startCol]
+        end = tileIndex[move.endRow][move.endCol]
+        piece = pieceCodes[move.pieceMoved]
+        placed = squares[end]
+        squares[end] = 0
+        squares[start] = piece
+        indices[placed].remove(end)
+        indices[piece].add(start)
+        if move.pieceCaptured != "--":
+            captured = start + move.endCol - move.startCol if move.isEnpassantMove else end
+            squares[captured] = pieceCodes[move.pieceCaptured]
+            indices[squares[captured]].add(captured)
+        if move.isCastleMove:
+            rookStart, rookEnd = (end + 1, end - 1) if end > start else (end - 2, end + 1)
+            rook = squares[rookEnd]
+            squares[rookStart] = rook
+            squares[rookEnd] = 0
+            indices[rook].remove(rookEnd)
+            indices[rook].add(rookStart)
+        self.boardView = None
+        self.locationsView = None
+
+    def isSquareAttacked(self, square, byColor):
+        return self.isIndexAttacked(tileIndex[square[0]][square[1]], White if byColor == "w" else Black)
+
+    '''
+    Whether a piece of color byColor (White or Black) attacks the tile with the given index
+    '''
+    def isIndexAttacked(self, index, byColor):
+        squares = self.squares
+        knight = byColor | Knight
+        for target in knightTargets[index]:
+            if squares[target] == knight:
+                return True
+        # White pawns capture towards row 0, so they attack a tile from the row below it
+        pawn = byColor | Pawn
+        if byColor == White:
+            if squares[index + 9] == pawn or squares[index + 11] == pawn:
+                return True
+        elif squares[index - 9] == pawn or squares[index - 11] == pawn:
+            return True
+        king = byColor | King
+        for target in kingTargets[index]:
+            if squares[target] == king:
+                return True
+        rays = tileRays[index]
+        for j in range(8):
+            slider = Rook if j < 4 else Bishop      # Directions 0-3 are orthogonal, 4-7 are diagonal
+            for target in rays[j]:
+                piece = squares[target]
+                if piece == 0:
+                    continue
+                if piece == byColor | slider or piece == byColor | Queen:
+                    return True
+                break   # The first piece on the line blocks it
+        return False
+
+    '''
+    The pins {index of the pinned piece: directions it may still move in} and the checks, as
+    (index of the checking piece, offset of the line from the king to it or 0 for a knight), against the king on index
+    '''
+    def findPinsAndChecks(self, index, allyColor, enemyColor):
+        squares = self.squares
+        pins = {}
+        checks = []
+        pawnDirections = (4, 5) if allyColor == White else (6, 7)   # Enemy pawns adjacent on these diagonals give check
+        rays = tileRays[index]
+        for j in range(8):
+            slider = enemyColor | (Rook if j < 4 else Bishop)
+            possiblePin = None
+            first = True
+            for target in rays[j]:
+                piece = squares[target]
+                if piece != 0:
+                    if piece & OffBoard == allyColor:
+                        if possiblePin is not None:
+                            break   # Second allied piece on the line
+                        possiblePin = target
+                    else:
+                        if piece == slider or piece == enemyColor | Queen or \
+                                (first and piece == enemyColor | Pawn and j in pawnDirections):
+                            if possiblePin is None:
+                                checks.append((target, directionOffsets[j]))
+                            else:
+                                pins[possiblePin] = pinLines[j]
+                        break   # Any enemy piece blocks the line
+                first = False
+        knight = enemyColor | Knight
+        for target in knightTargets[index]:
+            if squares[target] == knight:
+                checks.append((target, 0))
+        return pins, checks
+
+    '''
+    All legal moves, generated on the integer board with the same pin and check logic as BoardState.getLegalMoves.
+    Moves are built from their packed form (ChessEngine.Move.pack) and the names of the pieces on their tiles.
+    With quiet=False only the captures and promotions are generated.
+    '''
+    def getLegalMoves(self, quiet=True):
+        if self.whiteToMove:
+            kingIndex = tileIndex[self.whiteKingLocation[0]][self.whiteKingLocation[1]]
+            allyColor, enemyColor = White, Black
+        else:
+            kingIndex = tileIndex[self.blackKingLocation[0]][self.blackKingLocation[1]]
+            allyColor, enemyColor = Black, White
+        pins, checks = self.findPinsAndChecks(kingIndex, allyColor, enemyColor)
+        squares = self.squares
+        unpack = ChessEngine.Move.unpack
+        moves = []
+        king = squares[kingIndex]
+        kingName = pieceNames[king]
+        kingSquare = squareOf[kingIndex]
+        squares[kingIndex] = 0      # The king is lifted so that it does not hide the tiles behind it
+        for target in kingTargets[kingIndex]:
+            targetPiece = squares[target]
+            if (targetPiece & OffBoard == enemyColor or (quiet and targetPiece == 0)) and \
+                    not self.isIndexAttacked(target, enemyColor):
+                moves.append(unpack(kingSquare | squareOf[target] << 6, kingName, pieceNames[targetPiece]))
+        squares[kingIndex] = king
+        if len(checks) > 1:     # Double check, only the king can move
+            return moves
+        if checks:      # The checking piece has to be captured or blocked
+            checkIndex, offset = checks[0]
+            validTiles = {checkIndex}
+            if offset != 0:     # A knight check cannot be blocked
+                validTiles.update(range(kingIndex + offset, checkIndex, offset))
+        else:
+            validTiles = None
+            if quiet:
+                self.getCastleMoves(kingIndex, enemyColor, moves)
+        self.getIndexMoves(allyColor, enemyColor, pins, validTiles, quiet, moves)
+        if self.possibleEnpassant:
+            self.getEnpassantMoves(allyColor, moves)
+        return moves
+
+    '''
+    All moves of allyColor's pieces other than the king, with pinned pieces kept on their pin line and, when
+    validTiles is not None, ending on one of validTiles. Moves to an empty tile are left out when quiet is False.
+    '''
+    def getIndexMoves(self, allyColor, enemyColor, pins, validTiles, quiet, moves):
+        squares = self.squares
+        unpack = ChessEngine.Move.unpack
+        for piece, indices in self.pieceIndices.items():     # Only the indices of allyColor's pieces are visited
+            kind = piece & 7
+            if piece & OffBoard != allyColor or kind == King:
+                continue
+            if kind == Pawn:
+                for index in indices:
+                    self.getIndexPawnMoves(index, allyColor, enemyColor, pins.get(index), validTiles, quiet, moves)
+                continue
+            name = pieceNames[piece]
+            for index in indices:
+                square = squareOf[index]
+                pinDirections = pins.get(index)
+                if kind == Knight:
+                    if pinDirections is None:       # A pinned knight can never move
+                        for target in knightTargets[index]:
+                            targetPiece = squares[target]
+                            if (targetPiece & OffBoard == enemyColor or (quiet and targetPiece == 0)) and \
+                                    (validTiles is None or target in validTiles):
+                                moves.append(unpack(square | squareOf[target] << 6, name, pieceNames[targetPiece]))
+                    continue
+                rays = tileRays[index]
+                for j in range(4 if kind == Bishop else 0, 4 if kind == Rook else 8):
+                    if pinDirections is not None and j not in pinDirections:
+                        continue
+                    for target in rays[j]:
+                        targetPiece = squares[target]
+                        if targetPiece & OffBoard == allyColor:
+                            break   # Stops before friendly piece
+                        if (quiet or targetPiece != 0) and (validTiles is None or target in validTiles):
+                            moves.append(unpack(square | squareOf[target] << 6, name, pieceNames[targetPiece]))
+                        if targetPiece != 0:
+                            break
+
+    def getIndexPawnMoves(self, index, allyColor, enemyColor, pinDirections, validTiles, quiet, moves):
+        squares = self.squares
+        unpack = ChessEngine.Move.unpack
+        if allyColor == White:
+            forward, startRow, lastRow, push, captures, pawn = -10, 6, 0, 0, (4, 5), "wp"
+        else:
+            forward, startRow, lastRow, push, captures, pawn = 10, 1, 7, 2, (6, 7), "bp"
+        square = squareOf[index]
+        if squares[index + forward] == 0 and (pinDirections is None or push in pinDirections) and \
+                (quiet or squareOf[index + forward] >> 3 == lastRow):   # A push to the last rank is a promotion
+            if validTiles is None or index + forward in validTiles:
+                self.addIndexPawnMoves(square, index + forward, pawn, moves)
+            double = index + 2 * forward
+            if square >> 3 == startRow and squares[double] == 0 and (validTiles is None or double in validTiles):
+                moves.append(unpack(square | squareOf[double] << 6, pawn, "--"))
+        for j in captures:
+            if pinDirections is not None and j not in pinDirections:
+                continue
+            target = index + directionOffsets[j]
+            if squares[target] & OffBoard == enemyColor and (validTiles is None or target in validTiles):
+                self.addIndexPawnMoves(square, target, pawn, moves)
+
+    def addIndexPawnMoves(self, square, target, pawn, moves):
+        code = square | squareOf[target] << 6
+        captured = pieceNames[self.squares[target]]
+        if squareOf[target] >> 3 in (0, 7):     # One move per promotion choice
+            for choice in range(len(ChessEngine.Move.promotionChoices)):
+                moves.append(ChessEngine.Move.unpack(code | choice << 12, pawn, captured))
+        else:
+            moves.append(ChessEngine.Move.unpack(code, pawn, captured))
+
+    '''
+    An enpassant capture removes two pawns from a rank, the only safe test is to play it. The pawns that can take are
+    the ones a pawn of the other color on the enpassant tile would attack.
+    '''
+    def getEnpassantMoves(self, allyColor, moves):
+        endRow, endCol = self.possibleEnpassant
+        endIndex = tileIndex[endRow][endCol]
+        if allyColor == White:
+            pawn, enemyPawn, froms = "wp", "bp", (endIndex + 9, endIndex + 11)
+        else:
+            pawn, enemyPawn, froms = "bp", "wp", (endIndex - 9, endIndex - 11)
+        for index in froms:
+            if self.squares[index] == allyColor | Pawn:
+                move = ChessEngine.Move.unpack(squareOf[index] | squareOf[endIndex] << 6 | 1 << 14, pawn, enemyPawn)
+                if self.isLegalByMakeUndo(move):
+                    moves.append(move)
+
+    '''
+    Castling, when the side to move is not in check: the tiles between the king and the rook have to be empty and the
+    tiles the king crosses not attacked. The rights are only kept while the king and rook are on their home tiles.
+    '''
+    def getCastleMoves(self, kingIndex, enemyColor, moves):
+        squares = self.squares
+        rights = self.currentCastlingRights
+        kingside, queenside = (rights.wKs, rights.wQs) if enemyColor == Black else (rights.bKs, rights.bQs)
+        king = pieceNames[squares[kingIndex]]
+        kingSquare = squareOf[kingIndex]
+        if kingside and squares[kingIndex + 1] == 0 and squares[kingIndex + 2] == 0 and \
+                not self.isIndexAttacked(kingIndex + 1, enemyColor) and \
+                not self.isIndexAttacked(kingIndex + 2, enemyColor):
+            moves.append(ChessEngine.Move.unpack(kingSquare | (kingSquare + 2) << 6 | 1 << 15, king, "--"))
+        if queenside and squares[kingIndex - 1] == squares[kingIndex - 2] == squares[kingIndex - 3] == 0 and \
+                not self.isIndexAttacked(kingIndex - 1, enemyColor) and \
+                not self.isIndexAttacked(kingIndex - 2, enemyColor):
+            moves.append(ChessEngine.Move.unpack(kingSquare | (kingSquare - 2) << 6 | 1 << 15, king, "--"))
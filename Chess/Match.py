@@ -0,0 +1,337 @@
+"""
+This is responsible for self-play matches between two move-selection policies, the way engine changes are qualified.
+Games are played in a pool of processes (one per core by default) and written to a PGN file in game order as they
+finish. The result of the first policy is reported with a 95% confidence interval of its score and Elo difference, and
+a sequential probability ratio test (SPRT) can stop the match as soon as it is clear whether the first policy is
+elo1 stronger or elo0 stronger than the second.
+Every game has its own seeds, made from the match seed and the game number, so a match replays identically with the
+same options whatever the number of processes. Game pairs share a random opening and swap colors.
+It can be run from the command line: python -m Chess.Match --help
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import math
+import os
+import random
+import sys
+import time
+
+from Chess import Book
+from Chess import ChessEngine
+from Chess import Headless
+from Chess import Pgn
+from Chess import Tablebase
+
+
+'''
+This builds the player of a policy. A policy is "random", "greedy", "engine" (searching to depth plies or nodes
+nodes a move, playing from the Polyglot book at bookPath and the endgame tables of tablebaseDirectory when they are
+given) or "package.module:name", where name is called with the seed and returns an object with a
+chooseMove(bs, validMoves) method, like the players of Chess.Headless.
+'''
+
+def makePolicy(policy, seed, depth=None, nodes=None, bookPath=None, tablebaseDirectory=None):
+    if policy == "random":
+        return Headless.RandomPlayer(seed)
+    if policy == "greedy":
+        return Headless.GreedyPlayer(seed)
+    if policy == "engine":
+        return Headless.EnginePlayer(depth, None, nodes, openBook(bookPath) if bookPath else None, seed,
+                                     openTablebases(tablebaseDirectory) if tablebaseDirectory else None)
+    moduleName, _, name = policy.partition(":")
+    if not name:
+        raise ValueError("Unknown policy " + policy + ', expected random, greedy, engine or "module:name"')
+    return getattr(importlib.import_module(moduleName), name)(seed)
+
+
+# The books and tables opened by this process, {path: Book.OpeningBook or Tablebase.Tablebases}; the pages of
+# mapped files are shared by the processes
+openBooks = {}
+
+
+def openBook(path):
+    book = openBooks.get(path)
+    if book is None:
+        book = openBooks[path] = Book.OpeningBook(path)
+    return book
+
+
+def openTablebases(directory):
+    tablebases = openBooks.get(directory)
+    if tablebases is None:
+        tablebases = openBooks[directory] = Tablebase.Tablebases(directory)
+    return tablebases
+
+
+class OpeningPlayer():
+    '''
+    Plays the moves of an opening (coordinate notation, from the start of the game) and then the moves of player
+    '''
+    def __init__(self, opening, player):
+        self.opening = Headless.ScriptedPlayer(opening)
+        self.player = player
+
+    def chooseMove(self, bs, validMoves):
+        move = self.opening.chooseMove(bs, validMoves)
+        return move if move is not None else self.player.chooseMove(bs, validMoves)
+
+
+'''
+plies random moves from fen, fewer if the game ends before
+'''
+
+def randomOpening(fen, plies, seed):
+    rng = random.Random(seed)
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    opening = []
+    for _ in range(plies):
+        validMoves = bs.getLegalMoves()
+        if not validMoves:
+            break
+        move = rng.choice(validMoves)
+        bs.makeMove(move)
+        opening.append(move.getChessNotation())
+    return opening
+
+
+'''
+This plays game number index of a match in a worker process and returns (index, first policy's score, result,
+reason, plies, seconds, PGN text). The first policy has White in even games and Black in odd ones.
+'''
+
+def playMatchGame(index, options):
+    seed = options["seed"]
+    opening = randomOpening(options["fen"], options["openingPlies"], "%d:opening:%d" % (seed, index // 2))
+    first = makePolicy(options["first"], "%d:first:%d" % (seed, index), options["depth"], options["nodes"],
+                       options["book"], options["tablebases"])
+    second = makePolicy(options["second"], "%d:second:%d" % (seed, index), options["depth"], options["nodes"],
+                        options["book"], options["tablebases"])
+    firstIsWhite = index % 2 == 0
+    white, black = (first, second) if firstIsWhite else (second, first)
+    whiteName, blackName = ((options["first"], options["second"]) if firstIsWhite else
+                            (options["second"], options["first"]))
+    game = Headless.playGame(OpeningPlayer(opening, white), OpeningPlayer(opening, black), options["fen"],
+                             options["maxPlies"], options["backend"])
+
+    score = {"1-0": 1.0, "0-1": 0.0}.get(game.result, 0.5)   # Unfinished games count as draws
+    if not firstIsWhite:
+        score = 1.0 - score
+    tags = {"Event": "Chess.Match", "Site": "?", "Date": options["date"], "Round": index + 1,
+            "White": whiteName, "Black": blackName, "Termination": game.reason}
+    text = Pgn.formatGame(tags, Pgn.coordinatesToSAN(game.moves, options["fen"]), game.result, options["fen"])
+    return index, score, game.result, game.reason, len(game.moves), game.seconds, text
+
+
+class MatchStats():
+    '''
+    Wins, draws and losses of the first policy, with the statistics of its score
+    '''
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def add(self, score):
+        if score == 1.0:
+            self.wins += 1
+        elif score == 0.0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games() if self.games() else 0.5
+
+    '''
+    The variance of the score of one game
+    '''
+    def variance(self):
+        games = self.games()
+        if games == 0:
+            return 0.0
+        mean = self.score()
+        return (self.wins * (1 - mean) ** 2 + self.draws * (0.5 - mean) ** 2 + self.losses * mean ** 2) / games
+
+    '''
+    The 95% confidence interval (low, high) of the expected score: a Wilson score interval with the variance of the
+    wins, draws and losses. Unlike the normal interval it keeps a width when every game had the same result, and it
+    only reaches 0 or 1 on the side of a score of 0% or 100%.
+    '''
+    def scoreInterval(self, z=1.96):
+        games = self.games()
+        if games == 0:
+            return 0.0, 1.0
+        spread = z * z / games
+        center = (self.score() + spread / 2) / (1 + spread)
+        margin = z * math.sqrt(self.variance() / games + spread / (4 * games)) / (1 + spread)
+        return max(0.0, center - margin), min(1.0, center + margin)
+
+    def elo(self):
+        return scoreToElo(self.score())
+
+    def eloInterval(self):
+        low, high = self.scoreInterval()
+        return scoreToElo(low), scoreToElo(high)
+
+    '''
+    The likelihood of superiority: the probability that the first policy is the stronger one, from wins and losses
+    '''
+    def los(self):
+        decisive = self.wins + self.losses
+        if decisive == 0:
+            return 0.5
+        return 0.5 * (1 + math.erf((self.wins - self.losses) / math.sqrt(2 * decisive)))
+
+    '''
+    The log-likelihood ratio of "the first policy is elo1 stronger" against "it is elo0 stronger", with the normal
+    approximation of the score of a game. When every game had the same result the variance is 0 and the ratio is
+    infinite, on the side of the hypothesis the score is closer to, so that a sweep ends the test.
+    '''
+    def llr(self, elo0, elo1):
+        if self.games() == 0:
+            return 0.0
+        score0 = eloToScore(elo0)
+        score1 = eloToScore(elo1)
+        fromMidpoint = 2 * self.score() - score0 - score1
+        variance = self.variance()
+        if variance == 0:
+            if abs(fromMidpoint) < 1e-12:   # Rounding of a score on the midpoint
+                return 0.0
+            return math.copysign(math.inf, (score1 - score0) * fromMidpoint)
+        return self.games() * (score1 - score0) * fromMidpoint / (2 * variance)
+
+    def __str__(self):
+        low, high = self.eloInterval()
+        return "+%d =%d -%d  score %.1f%%  elo %s [%s, %s]  los %.1f%%" % (
+            self.wins, self.draws, self.losses, 100 * self.score(), formatElo(self.elo()), formatElo(low),
+            formatElo(high), 100 * self.los())
+
+
+def eloToScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def scoreToElo(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def formatElo(elo):
+    return "%+.0f" % (elo + 0.0) if math.isfinite(elo) else "n/a"    # 0% or 100% has no finite Elo difference
+
+
+'''
+The SPRT decision bounds (lower, upper) of the log-likelihood ratio for the error rates alpha and beta
+'''
+
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+'''
+This plays a match and returns its MatchStats. Results are taken in game order, so the PGN file and the point where
+the SPRT stops do not depend on which process finishes first. progress, if given, is called after every game with
+the game's tuple (see playMatchGame) and the stats so far.
+'''
+
+def playMatch(options, games, workers=None, pgnPath=None, sprt=None, progress=None):
+    stats = MatchStats()
+    writer = Pgn.PgnWriter(pgnPath) if pgnPath else None
+    bounds = sprtBounds(sprt["alpha"], sprt["beta"]) if sprt else None
+    workers = workers or os.cpu_count() or 1
+    finished = {}
+    nextIndex = 0       # The next game to submit
+    nextResult = 0      # The next game to take, in order
+    running = set()
+    stopped = False
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        while nextResult < games and not stopped:
+            # A few games per process in flight keeps every process busy without running far past an SPRT stop
+            while nextIndex < games and len(running) < 2 * workers:
+                running.add(executor.submit(playMatchGame, nextIndex, options))
+                nextIndex += 1
+            done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                finished[game[0]] = game
+            while nextResult in finished and not stopped:
+                game = finished.pop(nextResult)
+                nextResult += 1
+                stats.add(game[1])
+                if writer is not None:
+                    writer.write(game[6])
+                if progress is not None:
+                    progress(game, stats)
+                if bounds is not None:
+                    llr = stats.llr(sprt["elo0"], sprt["elo1"])
+                    stopped = llr <= bounds[0] or llr >= bounds[1]
+        for future in running:
+            future.cancel()
+    if writer is not None:
+        writer.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Self-play match between two move-selection policies")
+    parser.add_argument("first", help='policy under test: random, greedy, engine or "package.module:name"')
+    parser.add_argument("second", help="policy it plays against")
+    parser.add_argument("-n", "--games", type=int, default=100, help="maximum number of games (default: 100)")
+    parser.add_argument("-j", "--workers", type=int, help="processes to play in (default: one per core)")
+    parser.add_argument("--pgn", help="PGN file the games are written to, in game order")
+    parser.add_argument("--seed", type=int, default=0, help="match seed, the same seed replays the same games")
+    parser.add_argument("--fen", default=ChessEngine.StartFEN, help="start position of every game")
+    parser.add_argument("--opening-plies", type=int, default=8,
+                        help="random plies played before the policies take over, the same for both games of a pair")
+    parser.add_argument("--max-plies", type=int, default=400, help="plies after which a game counts as a draw")
+    parser.add_argument("-d", "--depth", type=int, help="search depth of engine policies (default: 2)")
+    parser.add_argument("--nodes", type=int, help="nodes per move of engine policies")
+    parser.add_argument("--book", help="Polyglot opening book of engine policies")
+    parser.add_argument("--tablebases", metavar="DIR", help="endgame tables of engine policies")
+    parser.add_argument("-b", "--backend", choices=["list"] + sorted(ChessEngine.backends), default="list")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+                        help="stop when the first policy is shown to be ELO1 or ELO0 stronger")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate (default: 0.05)")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate (default: 0.05)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    for policy in (args.first, args.second):    # Fails here, not in a worker, on an unknown policy
+        makePolicy(policy, 0, args.depth, args.nodes, args.book, args.tablebases)
+    options = {"first": args.first, "second": args.second, "seed": args.seed, "fen": args.fen,
+               "openingPlies": args.opening_plies, "maxPlies": args.max_plies, "depth": args.depth,
+               "nodes": args.nodes, "book": args.book, "tablebases": args.tablebases,
+               "backend": args.backend, "date": time.strftime("%Y.%m.%d")}
+    sprt = {"elo0": args.sprt[0], "elo1": args.sprt[1], "alpha": args.alpha, "beta": args.beta} if args.sprt else None
+
+    def progress(game, stats):
+        if not args.quiet:
+            index, score, result, reason, plies, seconds = game[:6]
+            llr = "  llr %.2f" % stats.llr(sprt["elo0"], sprt["elo1"]) if sprt else ""
+            print("game %4d  %-7s %-21s %3d plies %6.2fs  %s%s" % (index + 1, result, reason, plies, seconds, stats, llr))
+
+    start = time.perf_counter()
+    stats = playMatch(options, args.games, args.workers, args.pgn, sprt, progress)
+    seconds = time.perf_counter() - start
+    print("%s vs %s: %s" % (args.first, args.second, stats))
+    if sprt:
+        llr = stats.llr(sprt["elo0"], sprt["elo1"])
+        lower, upper = sprtBounds(args.alpha, args.beta)
+        verdict = "H1 accepted" if llr >= upper else "H0 accepted" if llr <= lower else "inconclusive"
+        print("SPRT elo0 %g elo1 %g: llr %.2f [%.2f, %.2f] %s" % (sprt["elo0"], sprt["elo1"], llr, lower, upper, verdict))
+    print("%d games in %.2fs (%.2f games/s, %d processes)" % (
+        stats.games(), seconds, stats.games() / seconds if seconds > 0 else float("inf"),
+        args.workers or os.cpu_count() or 1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+This is responsible for counting the nodes of the BoardState move tree up to a given depth (perft).
+It is used as a benchmark of the move generation and as a correctness check against known node counts.
+Deep counts can be split across a pool of processes: the positions after the first one or two plies are sent to the
+processes as FEN strings (not as BoardStates with their logs) and the counts coming back are added up per root move.
+It can be run from the command line: python -m Chess.Perft --help
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+from Chess import ChessEngine
+
+'''
+Standard reference positions with their published node counts for each depth
+'''
+
+ReferencePositions = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    "promotions": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                   {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    "talkchess": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    "middlegame": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                   {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+}
+
+# Move generators of BoardState that can be counted, by command line name
+Generators = {
+    "legal": "getLegalMoves",
+    "makeundo": "getLegalMovesMakeUndo",
+}
+
+
+'''
+This counts the leaf nodes of the move tree. The last ply is counted without being played (bulk counting)
+'''
+
+def perft(bs, depth, generate=None):
+    if depth == 0:
+        return 1
+    if generate is None:
+        generate = bs.getLegalMoves
+    moves = generate()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        bs.makeMove(move)
+        nodes += perft(bs, depth - 1, generate)
+        bs.undoMove()
+    return nodes
+
+
+'''
+This splits the node count by root move. It is used to find which move of a position is generated wrongly
+'''
+
+def divide(bs, depth, generate=None):
+    if generate is None:
+        generate = bs.getLegalMoves
+    split = {}
+    for move in generate():
+        bs.makeMove(move)
+        split[move.getChessNotation()] = perft(bs, depth - 1, generate)
+        bs.undoMove()
+    return split
+
+
+'''
+Parallel perft. The tree is split at splitDepth plies from the root: every position there is a task, sent to a process
+as (root move, FEN), and the process counts the remaining depth - splitDepth plies of it. Splitting at 2 plies makes
+hundreds of small tasks instead of one per root move, so that the processes finish together even when some root moves
+have far bigger subtrees than others.
+'''
+
+def splitTasks(bs, splitDepth, rootNotation=None):
+    if splitDepth == 0:
+        return [(rootNotation, bs.toFEN())]
+    tasks = []
+    for move in bs.getLegalMoves():
+        bs.makeMove(move)
+        tasks.extend(splitTasks(bs, splitDepth - 1, rootNotation or move.getChessNotation()))
+        bs.undoMove()
+    return tasks
+
+
+'''
+This counts a chunk of tasks in a worker process, loading each position into the same BoardState
+'''
+
+def perftTasks(tasks, depth, generator, backend):
+    bs = ChessEngine.BoardState(backend)
+    generate = getattr(bs, Generators[generator])
+    counts = []
+    for rootNotation, fen in tasks:
+        bs.loadFEN(fen)
+        counts.append((rootNotation, perft(bs, depth, generate)))
+    return counts
+
+
+'''
+This is divide computed by a pool of worker processes (an executor that is already running can be given instead).
+Root moves without any position at the split depth (their reply is mate or stalemate) count 0.
+'''
+
+def parallelDivide(fen, depth, workers=None, splitDepth=2, generator="legal", backend="list", executor=None):
+    bs = ChessEngine.BoardState.fromFEN(fen, backend)
+    if depth < 2:
+        return divide(bs, depth, getattr(bs, Generators[generator]))
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(workers or os.cpu_count() or 1) as executor:
+            return parallelDivide(fen, depth, workers, splitDepth, generator, backend, executor)
+    splitDepth = max(1, min(splitDepth, depth - 1))
+    split = {move.getChessNotation(): 0 for move in bs.getLegalMoves()}
+    tasks = splitTasks(bs, splitDepth)
+    # About 8 chunks per process of the executor used (a given one can have fewer than the CPUs): few enough to keep
+    # the messages between processes cheap, enough to balance the load
+    processes = getattr(executor, "_max_workers", None) or workers or os.cpu_count() or 1
+    size = max(1, len(tasks) // (8 * processes))
+    futures = [executor.submit(perftTasks, tasks[i:i + size], depth - splitDepth, generator, backend)
+               for i in range(0, len(tasks), size)]
+    for future in concurrent.futures.as_completed(futures):
+        for rootNotation, nodes in future.result():
+            split[rootNotation] += nodes
+    return split
+
+
+'''
+This walks the move tree like perft and checks at every node that the incrementally updated Zobrist key and
+evaluation sums equal the ones computed from scratch, and that undoMove gives back those of the position before the
+move.
+It returns the number of nodes checked and raises a ValueError naming the position and move of the first mismatch.
+'''
+
+def checkKeys(bs, depth):
+    if bs.zobristKey != bs.computeZobristKey():
+        raise ValueError("Zobrist key mismatch in " + bs.toFEN())
+    if bs.evaluationLog[-1] != bs.computeEvaluation():
+        raise ValueError("Evaluation mismatch %s != %s in %s" % (bs.evaluationLog[-1], bs.computeEvaluation(),
+                                                                 bs.toFEN()))
+    if depth == 0:
+        return 1
+    nodes = 1
+    key = bs.zobristKey
+    evaluation = bs.evaluationLog[-1]
+    for move in bs.getLegalMoves():
+        bs.makeMove(move)
+        try:
+            nodes += checkKeys(bs, depth - 1)
+        except ValueError as error:
+            raise ValueError(move.getChessNotation() + " " + str(error))
+        bs.undoMove()
+        if bs.zobristKey != key:
+            raise ValueError("Zobrist key not restored after undoing " + move.getChessNotation() + " in " + bs.toFEN())
+        if (bs.material, bs.middlegameScore, bs.endgameScore, bs.phase) != evaluation:
+            raise ValueError("Evaluation not restored after undoing " + move.getChessNotation() + " in " + bs.toFEN())
+    return nodes
+
+
+class PerftResult():
+    def __init__(self, name, depth, nodes, seconds, expected=None, generator="legal", backend="list", workers=1):
+        self.name = name
+        self.generator = generator
+        self.backend = backend
+        self.workers = workers  # Processes the count was split across, 1 for a count in this process
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.expected = expected
+
+    def nodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds > 0 else float("inf")
+
+    def passed(self):
+        return self.expected is None or self.expected == self.nodes
+
+    def configuration(self):
+        return self.generator + "/" + self.backend + (" x%d" % self.workers if self.workers > 1 else "")
+
+    def __str__(self):
+        status = "" if self.expected is None else ("  ok" if self.passed() else "  FAIL (expected %d)" % self.expected)
+        return "%-12s %-18s depth %d  %12d nodes  %8.2fs  %10.0f nodes/s%s" % (
+            self.name, self.configuration(), self.depth, self.nodes, self.seconds, self.nodesPerSecond(), status)
+
+
+'''
+This times a perft run of one position and compares it with the expected node count if one is known.
+With more than one worker the count is split across a pool of processes (the executor, if one is given).
+'''
+
+def runPerft(name, fen, depth, expected=None, generator="legal", backend="list", workers=1, splitDepth=2,
+             executor=None):
+    start = time.perf_counter()
+    if workers > 1:
+        nodes = sum(parallelDivide(fen, depth, workers, splitDepth, generator, backend, executor).values())
+    else:
+        bs = ChessEngine.BoardState.fromFEN(fen, backend)
+        nodes = perft(bs, depth, getattr(bs, Generators[generator]))
+    return PerftResult(name, depth, nodes, time.perf_counter() - start, expected, generator, backend, workers)
+
+
+'''
+This runs every reference position up to the given depth (positions without a known count at that depth are skipped).
+Every depth is run once per (generator, backend) configuration.
+'''
+
+def runSuite(depth, names=None, configurations=(("legal", "list"),), workers=1, splitDepth=2):
+    results = []
+    executor = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for name in names or ReferencePositions:
+            fen, counts = ReferencePositions[name]
+            for d in range(1, depth + 1):
+                if d in counts:
+                    for generator, backend in configurations:
+                        results.append(runPerft(name, fen, d, counts[d], generator, backend, workers, splitDepth,
+                                                executor))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+'''
+This measures how the count of one position scales with the number of processes: it is counted in this process and
+then split across 1, 2, 4, ... up to workers processes (starting each pool is part of the time), and the speedup of
+every run over the single process count is printed with its efficiency (speedup per process)
+'''
+
+def runScaling(name, fen, depth, expected=None, workers=None, splitDepth=2, generator="legal", backend="list"):
+    workers = workers or os.cpu_count() or 1
+    counts = sorted({1 << i for i in range(workers.bit_length()) if 1 << i <= workers} | {workers})
+    baseline = runPerft(name, fen, depth, expected, generator, backend)
+    print("%s  (%d cores)" % (baseline, os.cpu_count() or 1))
+    results = [baseline]
+    for count in counts:
+        start = time.perf_counter()
+        split = parallelDivide(fen, depth, count, splitDepth, generator, backend)
+        result = PerftResult(name, depth, sum(split.values()), time.perf_counter() - start, expected, generator,
+                             backend, count)
+        speedup = baseline.seconds / result.seconds if result.seconds > 0 else float("inf")
+        print("%-12s %2d processes  %8.2fs  %10.0f nodes/s  %5.2fx speedup  %3.0f%% efficiency%s" % (
+            name, count, result.seconds, result.nodesPerSecond(), speedup, 100 * speedup / count,
+            "" if result.passed() and result.nodes == baseline.nodes else "  FAIL (%d nodes)" % result.nodes))
+        results.append(result)
+    return results
+
+
+'''
+This prints the nodes/s of every configuration side by side for the deepest run of each position,
+with how many times faster each one is than the first configuration
+'''
+
+def printComparison(results):
+    deepest = {}
+    for result in results:
+        deepest.setdefault(result.name, {})[result.configuration()] = result
+    for name, byConfiguration in deepest.items():
+        baseline = next(iter(byConfiguration.values()))
+        columns = []
+        for configuration, result in byConfiguration.items():
+            speedup = baseline.seconds / result.seconds if result.seconds > 0 else float("inf")
+            columns.append("%s %10.0f nodes/s (%.1fx)" % (configuration, result.nodesPerSecond(), speedup))
+        print("%-12s depth %d  %s" % (name, baseline.depth, "  ".join(columns)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft node counts and throughput of the ChessEngine move generator")
+    parser.add_argument("-d", "--depth", type=int, default=3, help="search depth in plies")
+    parser.add_argument("-p", "--position", action="append", choices=sorted(ReferencePositions),
+                        help="reference position to run (can be repeated, default: all of them)")
+    parser.add_argument("--fen", help="run a custom position instead of the reference positions")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move")
+    parser.add_argument("-g", "--generator", choices=sorted(Generators), default="legal",
+                        help="move generator to count with (default: legal)")
+    parser.add_argument("-b", "--backend", choices=["list"] + sorted(ChessEngine.backends), default="list",
+                        help="board representation to count with (default: list)")
+    parser.add_argument("--compare", action="store_true",
+                        help="run the reference positions with the makeundo generator as well and print the speedup")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="run the reference positions with every board backend and print their nodes/s side by side")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="processes to split the counts across (0: one per core, default: 1, in this process)")
+    parser.add_argument("--split-depth", type=int, choices=(1, 2), default=2,
+                        help="plies from the root at which the tree is split into tasks for the processes (default: 2)")
+    parser.add_argument("--scaling", action="store_true",
+                        help="count with 1, 2, 4, ... up to --jobs processes and print the speedup over one process")
+    parser.add_argument("--check-keys", action="store_true",
+                        help="verify the incremental Zobrist key and evaluation against from-scratch ones at every node instead")
+    args = parser.parse_args(argv)
+    workers = args.jobs or os.cpu_count() or 1
+
+    if args.scaling:
+        if args.fen:
+            targets = [("fen", args.fen, None)]
+        else:
+            targets = [(name, ReferencePositions[name][0], ReferencePositions[name][1].get(args.depth))
+                       for name in args.position or ReferencePositions]
+        failed = False
+        for name, fen, expected in targets:
+            results = runScaling(name, fen, args.depth, expected, workers, args.split_depth, args.generator,
+                                 args.backend)
+            failed = failed or not all(result.passed() and result.nodes == results[0].nodes for result in results)
+        return 1 if failed else 0
+
+    if args.check_keys:
+        if args.fen:
+            targets = [("fen", args.fen)]
+        else:
+            targets = [(name, ReferencePositions[name][0]) for name in args.position or ReferencePositions]
+        failed = False
+        for name, fen in targets:
+            try:
+                nodes = checkKeys(ChessEngine.BoardState.fromFEN(fen, args.backend), args.depth)
+                print("%-12s depth %d  %12d nodes  keys and evaluation ok" % (name, args.depth, nodes))
+            except ValueError as error:
+                print("%-12s depth %d  FAIL %s" % (name, args.depth, error))
+                failed = True
+        return 1 if failed else 0
+
+    if args.fen or args.divide:
+        if args.fen:
+            targets = [("fen", args.fen, None)]
+        else:
+            targets = [(name, ReferencePositions[name][0], ReferencePositions[name][1].get(args.depth))
+                       for name in args.position or ReferencePositions]
+        failed = False
+        for name, fen, expected in targets:
+            if args.divide:
+                bs = ChessEngine.BoardState.fromFEN(fen, args.backend)
+                start = time.perf_counter()
+                if workers > 1:
+                    split = parallelDivide(fen, args.depth, workers, args.split_depth, args.generator, args.backend)
+                else:
+                    split = divide(bs, args.depth, getattr(bs, Generators[args.generator]))
+                result = PerftResult(name, args.depth, sum(split.values()), time.perf_counter() - start, expected,
+                                     args.generator, args.backend, workers)
+                for notation in sorted(split):
+                    print("%s: %d" % (notation, split[notation]))
+                print("Moves: %d" % len(split))
+            else:
+                result = runPerft(name, fen, args.depth, expected, args.generator, args.backend, workers,
+                                  args.split_depth)
+            print(result)
+            failed = failed or not result.passed()
+        return 1 if failed else 0
+
+    if args.compare_backends:
+        configurations = [(args.generator, backend) for backend in ["list"] + sorted(ChessEngine.backends)]
+    elif args.compare:
+        configurations = [("makeundo", args.backend), ("legal", args.backend)]
+    else:
+        configurations = [(args.generator, args.backend)]
+    results = runSuite(args.depth, args.position, configurations, workers, args.split_depth)
+    for result in results:
+        print(result)
+    if len(configurations) > 1:
+        printComparison(results)
+    return 0 if all(result.passed() for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
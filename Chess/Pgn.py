@@ -0,0 +1,399 @@
+"""
+This is responsible for reading and writing games in PGN, the text format chess programs exchange games in.
+Moves are in standard algebraic notation (SAN, "Nf3", "exd5", "O-O", "e8=Q+"), which names only the piece type and
+the end tile, plus the start file or rank when another piece of the same type could go there too.
+Files are read one line and one game at a time, so files of any size are read in constant memory ("*.gz" files
+are decompressed on the fly), and games are written one at a time as they finish.
+SAN is turned into moves either strictly, by matching it against the legal moves of the position, or, for trusted
+input such as our own match files, by finding the piece that can reach the end tile, without generating any moves.
+It can be run from the command line to benchmark reading a file: python -m Chess.Pgn --help
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from Chess import ChessEngine
+from Chess import PositionLoader
+from Chess.ChessEngine import Move
+
+# The tags every PGN game starts with, in this order
+SevenTagRoster = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+LineLength = 80
+Results = ("1-0", "0-1", "1/2-1/2", "*")
+
+# Piece letter (none for a pawn), start file, start rank, capture, end tile and promotion of a SAN move
+sanPattern = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+tagPattern = re.compile(r'\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variations, NAGs, move numbers and the words of the movetext
+tokenPattern = re.compile(r"\{[^}]*\}?|;.*|\(|\)|\$\d+|\d+\.+|[^\s{}();$.][^\s{}();$]*")
+
+
+'''
+This gives the SAN of a legal move in the position of bs. validMoves are the legal moves of the position; when not
+given they are only generated if another piece of the same kind moves like it could also reach the end tile. The check and checkmate
+suffixes are found by making the move, the moves of the other side are only generated when it is in check.
+'''
+
+def moveToSAN(bs, move, validMoves=None):
+    if move.isCastleMove:
+        san = "O-O" if move.endCol == 6 else "O-O-O"
+    else:
+        destination = move.getRankFile(move.endRow, move.endCol)
+        capture = move.pieceCaptured != "--"
+        if move.pieceMoved[1] == "p":
+            san = (move.columnsToFiles[move.startCol] + "x" if capture else "") + destination
+            if move.isPawnPromotion:
+                san += "=" + move.promotionChoice
+        else:
+            prefix = ""
+            # Only a piece with a twin (two knights, a promoted queen...) that moves like it could reach the end tile
+            # can need a start file or rank, the legal moves then tell whether the twin really can
+            twins = [tile for tile in bs.pieceLocations[move.pieceMoved] if tile != (move.startRow, move.startCol)]
+            board = bs.board
+            if move.pieceMoved[1] != "K" and any(canReach(board, move.pieceMoved[1], r, c, move.endRow, move.endCol)
+                                                 for r, c in twins):
+                prefix = disambiguation(move, bs.getLegalMoves() if validMoves is None else validMoves)
+            san = move.pieceMoved[1] + prefix + ("x" if capture else "") + destination
+    bs.makeMove(move)
+    if bs.inCheck():
+        san += "#" if len(bs.getLegalMoves()) == 0 else "+"
+    bs.undoMove()
+    return san
+
+
+'''
+The start file, rank or tile a piece move has to name because another piece of the same kind can reach its end tile
+'''
+
+def disambiguation(move, validMoves):
+    rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other.endRow == move.endRow and
+              other.endCol == move.endCol and (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+    if not rivals:
+        return ""
+    if all(other.startCol != move.startCol for other in rivals):
+        return move.columnsToFiles[move.startCol]
+    if all(other.startRow != move.startRow for other in rivals):
+        return move.rowsToRanks[move.startRow]
+    return move.getRankFile(move.startRow, move.startCol)
+
+
+'''
+This replays moves in coordinate notation ("e2e4", "e7e8q") from fen and gives their SAN
+'''
+
+def coordinatesToSAN(moves, fen=ChessEngine.StartFEN):
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    sanMoves = []
+    for notation in moves:
+        validMoves = bs.getLegalMoves()
+        move = next((move for move in validMoves if move.getChessNotation() == notation), None)
+        if move is None:
+            raise ValueError("Illegal move " + notation + " in " + bs.toFEN())
+        sanMoves.append(moveToSAN(bs, move, validMoves))
+        bs.makeMove(move)
+    return sanMoves
+
+
+'''
+This gives the PGN text of a game: its tags, then the numbered SAN moves wrapped at LineLength and the result.
+The Seven Tag Roster is always written, "?" standing in for missing tags. A game that does not start from the start
+position gets the SetUp and FEN tags.
+'''
+
+def formatGame(tags, sanMoves, result="*", fen=ChessEngine.StartFEN):
+    tags = dict(tags)
+    tags["Result"] = result
+    if fen != ChessEngine.StartFEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = fen
+    lines = ['[%s "%s"]' % (name, escape(tags.get(name, "?"))) for name in SevenTagRoster]
+    lines += ['[%s "%s"]' % (name, escape(value)) for name, value in tags.items() if name not in SevenTagRoster]
+    lines.append("")
+
+    fields = fen.split()
+    whiteToMove = fields[1] == "w"
+    moveNumber = int(fields[5]) if len(fields) > 5 else 1
+    tokens = []
+    for i, san in enumerate(sanMoves):
+        if whiteToMove:
+            tokens.append("%d. %s" % (moveNumber, san))
+        else:
+            tokens.append("%d... %s" % (moveNumber, san) if i == 0 else san)
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LineLength:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+'''
+This gives the Move of a SAN move in the position of bs by matching it against the legal moves (validMoves, generated
+when not given). Check, mate and annotation suffixes ("+", "#", "!?") are ignored. A SAN move that is not legal or
+that matches several legal moves raises a ValueError.
+'''
+
+def sanToMove(bs, san, validMoves=None):
+    if validMoves is None:
+        validMoves = bs.getLegalMoves()
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endCol = 6 if len(text) == 3 else 2
+        matches = [move for move in validMoves if move.isCastleMove and move.endCol == endCol]
+    else:
+        parsed = sanPattern.match(text)
+        if parsed is None:
+            raise ValueError("Not a SAN move: " + san)
+        piece, startFile, startRank, destination, promotion = parsed.groups()
+        piece = piece or "p"
+        endRow, endCol = Move.ranksToRows[destination[1]], Move.filesToColumns[destination[0]]
+        startCol = Move.filesToColumns[startFile] if startFile else None
+        startRow = Move.ranksToRows[startRank] if startRank else None
+        matches = [move for move in validMoves if move.pieceMoved[1] == piece and move.endRow == endRow and
+                   move.endCol == endCol and not move.isCastleMove and
+                   (startCol is None or move.startCol == startCol) and (startRow is None or move.startRow == startRow)
+                   and (not move.isPawnPromotion or move.promotionChoice == (promotion or "Q"))]
+    if len(matches) != 1:
+        raise ValueError("%s move %s in %s" % ("Illegal" if not matches else "Ambiguous", san, bs.toFEN()))
+    return matches[0]
+
+
+'''
+This gives the Move of a SAN move of trusted input, which is assumed to be legal, without generating moves: it looks
+for the pieces of the named kind that can reach the end tile and only checks pins when there are several.
+A SAN move that no piece can play raises a ValueError, but illegal moves are not always caught.
+'''
+
+def sanToMoveTrusted(bs, san):
+    text = san.rstrip("+#!?")
+    color = "w" if bs.whiteToMove else "b"
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        kingRow, kingCol = bs.whiteKingLocation if bs.whiteToMove else bs.blackKingLocation
+        return Move((kingRow, kingCol), (kingRow, 6 if len(text) == 3 else 2), bs.board, isCastleMove=True)
+    parsed = sanPattern.match(text)
+    if parsed is None:
+        raise ValueError("Not a SAN move: " + san)
+    piece, startFile, startRank, destination, promotion = parsed.groups()
+    endRow, endCol = Move.ranksToRows[destination[1]], Move.filesToColumns[destination[0]]
+    board = bs.board
+    if piece is None:
+        direction = 1 if bs.whiteToMove else -1    # Row step from the end tile back to the start tile
+        if not 0 <= endRow + direction <= 7:
+            raise ValueError("Illegal move %s in %s" % (san, bs.toFEN()))
+        if startFile:
+            startTile = (endRow + direction, Move.filesToColumns[startFile])
+            isEnpassantMove = board[endRow][endCol] == "--"
+        else:
+            startTile = (endRow + direction, endCol)
+            if board[startTile[0]][endCol] == "--":   # Two tiles push
+                startTile = (endRow + 2 * direction, endCol)
+            isEnpassantMove = False
+        if not 0 <= startTile[0] <= 7 or board[startTile[0]][startTile[1]] != color + "p":
+            raise ValueError("Illegal move %s in %s" % (san, bs.toFEN()))
+        return Move(startTile, (endRow, endCol), board, isEnpassantMove, promotionChoice=promotion or "Q")
+
+    startCol = Move.filesToColumns[startFile] if startFile else None
+    startRow = Move.ranksToRows[startRank] if startRank else None
+    candidates = []
+    for r, c in bs.pieceLocations[color + piece]:
+        if (startCol is None or c == startCol) and (startRow is None or r == startRow) and \
+                canReach(board, piece, r, c, endRow, endCol):
+            candidates.append(Move((r, c), (endRow, endCol), board))
+    if len(candidates) > 1:     # SAN leaves out the start tile of a piece that is pinned
+        candidates = [move for move in candidates if bs.isLegalByMakeUndo(move)]
+    if len(candidates) != 1:
+        raise ValueError("%s move %s in %s" % ("Illegal" if not candidates else "Ambiguous", san, bs.toFEN()))
+    return candidates[0]
+
+
+'''
+Whether a piece (type letter) on (r, c) moves like it could go to (endRow, endCol) on this board
+'''
+
+def canReach(board, piece, r, c, endRow, endCol):
+    dr, dc = endRow - r, endCol - c
+    if piece == "N":
+        return dr * dc in (2, -2)
+    if piece == "K":
+        return max(abs(dr), abs(dc)) == 1
+    if (dr == 0 or dc == 0) and piece == "B" or dr != 0 and dc != 0 and abs(dr) != abs(dc) or \
+            (dr != 0 and dc != 0) and piece == "R":
+        return False
+    stepRow = (dr > 0) - (dr < 0)
+    stepCol = (dc > 0) - (dc < 0)
+    for i in range(1, max(abs(dr), abs(dc))):
+        if board[r + stepRow * i][c + stepCol * i] != "--":
+            return False
+    return True
+
+
+class PgnGame():
+    '''
+    A game as read from a PGN file: its tags {name: value}, its SAN moves and its result
+    '''
+    def __init__(self, tags, moves, result):
+        self.tags = tags
+        self.moves = moves
+        self.result = result
+
+    def fen(self):
+        return self.tags.get("FEN", ChessEngine.StartFEN)
+
+    '''
+    This replays the game and yields (bs, move) for every move, bs being the position the move is played in.
+    The move is made when the next one is asked for, so the caller can look at the position first.
+    '''
+    def replay(self, trusted=False, backend="list"):
+        bs = ChessEngine.BoardState.fromFEN(self.fen(), backend)
+        for san in self.moves:
+            move = sanToMoveTrusted(bs, san) if trusted else sanToMove(bs, san)
+            yield bs, move
+            bs.makeMove(move)
+
+    def __str__(self):
+        return formatGame(self.tags, self.moves, self.result, self.fen())
+
+
+'''
+This yields the PgnGame of every game of the lines of a file. Comments, variations and NAGs are skipped.
+'''
+
+def iterGames(lines):
+    tags = {}
+    moves = []
+    result = "*"
+    inMovetext = False
+    inComment = False
+    depth = 0   # Nesting of the variation being skipped
+    for line in lines:
+        if inComment:
+            end = line.find("}")
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            inComment = False
+        stripped = line.strip()
+        if not stripped or stripped[0] == "%":
+            continue
+        if stripped[0] == "[" and depth == 0:
+            if inMovetext:      # The tags of the next game
+                yield PgnGame(tags, moves, result)
+                tags, moves, result, inMovetext = {}, [], "*", False
+            tag = tagPattern.match(stripped)
+            if tag is not None:
+                tags[tag.group(1)] = unescape(tag.group(2))
+            continue
+        inMovetext = True
+        for token in tokenPattern.findall(stripped):
+            first = token[0]
+            if first == "{":
+                inComment = token[-1] != "}"
+            elif first == "(":
+                depth += 1
+            elif first == ")":
+                depth -= 1
+            elif depth or first == ";" or first == "$" or first.isdigit() and token[-1] == ".":
+                continue
+            elif token in Results:
+                result = token
+            else:
+                moves.append(token)
+    if inMovetext or tags:
+        yield PgnGame(tags, moves, result)
+
+
+'''
+This yields the PgnGame of every game of a PGN file, reading it one line at a time
+'''
+
+def readGames(path):
+    with PositionLoader.openPositionFile(path) as file:
+        yield from iterGames(file)
+
+
+class PgnWriter():
+    '''
+    Appends games to a PGN file, flushing after every game so the file can be followed while it grows
+    '''
+    def __init__(self, path, append=False):
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+        self.games = 0
+
+    def write(self, text):
+        self.file.write(text)
+        self.file.flush()
+        self.games += 1
+
+    def writeGame(self, tags, sanMoves, result="*", fen=ChessEngine.StartFEN):
+        self.write(formatGame(tags, sanMoves, result, fen))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the games of a PGN file and report games/s")
+    parser.add_argument("path", help="PGN file, may be gzipped")
+    parser.add_argument("--trusted", action="store_true", help="resolve SAN without generating legal moves")
+    parser.add_argument("--parse-only", action="store_true", help="only split the file into games and SAN moves")
+    parser.add_argument("--write", metavar="PATH", help="write the replayed games, with regenerated SAN, to PATH")
+    parser.add_argument("-b", "--backend", choices=["list"] + sorted(ChessEngine.backends), default="list")
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    args = parser.parse_args(argv)
+
+    writer = PgnWriter(args.write) if args.write else None
+    games = plies = errors = 0
+    start = time.perf_counter()
+    for game in readGames(args.path):
+        if args.limit is not None and games >= args.limit:
+            break
+        games += 1
+        if args.parse_only:
+            plies += len(game.moves)
+            continue
+        sanMoves = []
+        try:
+            for bs, move in game.replay(args.trusted, args.backend):
+                if writer is not None:
+                    sanMoves.append(moveToSAN(bs, move))
+                plies += 1
+        except ValueError as error:
+            errors += 1
+            print("game %d: %s" % (games, error))
+            continue
+        if writer is not None:
+            writer.writeGame(game.tags, sanMoves, game.result, game.fen())
+    seconds = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+    print("%d games, %d plies, %d errors in %.2fs: %.1f games/s, %.0f plies/s" % (
+        games, plies, errors, seconds, games / seconds if seconds > 0 else float("inf"),
+        plies / seconds if seconds > 0 else float("inf")))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
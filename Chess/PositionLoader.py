@@ -0,0 +1,83 @@
+"""
+This is responsible for loading positions in bulk from FEN and EPD files.
+The files are read one line at a time, so files with millions of positions never have to fit in memory.
+Files ending in ".gz" are decompressed on the fly.
+"""
+
+import gzip
+
+from Chess import ChessEngine
+
+'''
+This opens a position file for reading text, decompressing it if needed
+'''
+
+def openPositionFile(path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+'''
+This splits an EPD/FEN line into the FEN of the position and a dictionary of the EPD operations.
+The move counters of a FEN line are kept, the "hmvc" and "fmvn" operations of an EPD line are turned into counters.
+Example: 'r1bqkbnr/... w KQkq - bm Nf3; id "pos 1";' -> ("r1bqkbnr/... w KQkq - 0 1", {"bm": "Nf3", "id": "pos 1"})
+'''
+
+def splitLine(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("Not a FEN/EPD line: " + line)
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split()
+    if len(counters) == 2 and counters[0].isdigit() and counters[1].isdigit():   # Plain FEN line
+        return " ".join(fields[:4] + counters), {}
+    operations = {}
+    for operation in rest.split(";"):
+        operation = operation.strip()
+        if operation:
+            opcode, _, operand = operation.partition(" ")
+            operations[opcode] = operand.strip().strip('"')
+    return " ".join(fields[:4] + [operations.get("hmvc", "0"), operations.get("fmvn", "1")]), operations
+
+
+'''
+This yields a (line number, FEN, operations) tuple for every position of a file without building any BoardState.
+Empty lines and lines starting with "#" are skipped, lines that are not FEN/EPD raise a ValueError naming the line
+unless skipInvalid is True.
+'''
+
+def iterFENs(path, skipInvalid=False):
+    with openPositionFile(path) as file:
+        for lineNumber, line in enumerate(file, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                try:
+                    fen, operations = splitLine(line)
+                except ValueError as error:
+                    if skipInvalid:
+                        continue
+                    raise ValueError("%s:%d: %s" % (path, lineNumber, error))
+                yield lineNumber, fen, operations
+
+
+'''
+This yields a BoardState for every position of a file (or a (BoardState, operations) tuple if withOperations is True).
+When reuse is True the same BoardState object is loaded again for every line, which avoids building a new one
+per position; the caller must then be done with a position before asking for the next one.
+Invalid lines raise a ValueError that names the line, unless skipInvalid is True.
+'''
+
+def iterPositions(path, withOperations=False, reuse=False, skipInvalid=False):
+    bs = ChessEngine.BoardState() if reuse else None
+    for lineNumber, fen, operations in iterFENs(path, skipInvalid):
+        try:
+            if reuse:
+                bs.loadFEN(fen)
+            else:
+                bs = ChessEngine.BoardState.fromFEN(fen)
+        except ValueError as error:
+            if skipInvalid:
+                continue
+            raise ValueError("%s:%d: %s" % (path, lineNumber, error))
+        yield (bs, operations) if withOperations else bs
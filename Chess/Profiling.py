@@ -0,0 +1,167 @@
+"""
+This is responsible for measuring the engine while it runs: how often the hot BoardState methods are called
+(getValidMoves, getLegalMoves, makeMove, undoMove, tileUnderAttack, isSquareAttacked) and how long they take, as
+histograms with power of two buckets.
+Instrumentation swaps timed wrappers into the BoardState classes when it is enabled and puts the original methods back
+when it is disabled, so a disabled profiler costs nothing at all, not even a flag test per call.
+Reports are plain dictionaries, written as JSON; a whole run can also be recorded with cProfile.
+"""
+
+import cProfile
+import json
+import threading
+import time
+
+from Chess import ChessEngine
+
+InstrumentedMethods = ("getValidMoves", "getLegalMoves", "makeMove", "undoMove", "tileUnderAttack",
+                       "isSquareAttacked")
+Buckets = 32
+
+
+class Histogram():
+    '''
+    Durations in nanoseconds. Bucket 0 holds durations under 1 microsecond and bucket i those from 2^(i-1) to 2^i
+    microseconds.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.last = 0
+        self.buckets = [0] * Buckets
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        self.buckets[min((duration // 1000).bit_length(), Buckets - 1)] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    '''
+    An upper bound of the q quantile (0 < q <= 1): the end of the bucket it falls in
+    '''
+    def percentile(self, q):
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(1000 << i, self.max)
+        return self.max
+
+    def clear(self):
+        self.__init__()
+
+    def toDict(self):
+        return {"count": self.count, "totalMs": self.total / 1e6, "meanUs": self.mean() / 1e3,
+                "minUs": (self.min or 0) / 1e3, "maxUs": self.max / 1e3, "p50Us": self.percentile(0.5) / 1e3,
+                "p99Us": self.percentile(0.99) / 1e3,
+                "buckets": {("<%dus" % (1 << i) if i else "<1us"): count for i, count in enumerate(self.buckets) if count}}
+
+
+class Profiler():
+    '''
+    The histograms of the instrumented methods {name: Histogram} and of anything else timed with record(),
+    such as the frame times of the front-end
+    '''
+    def __init__(self):
+        self.histograms = {}
+        self.patched = []   # (class, name, original method) of the wrappers in place
+        self.local = threading.local()
+
+    def enabled(self):
+        return bool(self.patched)
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def record(self, name, duration):
+        self.histogram(name).add(duration)
+
+    '''
+    This wraps the instrumented methods of BoardState and of every backend that defines its own
+    '''
+    def enable(self):
+        if self.patched:
+            return
+        classes = [ChessEngine.BoardState] + [ChessEngine.getBackend(name) for name in ChessEngine.backends]
+        for cls in classes:
+            for name in InstrumentedMethods:
+                method = cls.__dict__.get(name)
+                if method is not None:
+                    setattr(cls, name, self.wrap(name, method))
+                    self.patched.append((cls, name, method))
+
+    def disable(self):
+        for cls, name, method in reversed(self.patched):
+            setattr(cls, name, method)
+        self.patched = []
+
+    def wrap(self, name, method):
+        histogram = self.histogram(name)
+        clock = time.perf_counter_ns
+        local = self.local
+
+        def timed(*args, **kwargs):
+            # A backend method calling the same method of BoardState through super() is one call, timed once
+            depth = getattr(local, name, 0)
+            if depth:
+                return method(*args, **kwargs)
+            setattr(local, name, 1)
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.add(clock() - start)
+                setattr(local, name, 0)
+        timed.__name__ = method.__name__
+        timed.__doc__ = method.__doc__
+        timed.__wrapped__ = method
+        return timed
+
+    def clear(self):
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+    def report(self):
+        return {name: histogram.toDict() for name, histogram in sorted(self.histograms.items()) if histogram.count}
+
+    def writeReport(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def __str__(self):
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                lines.append("%-18s %9d calls  %9.2f ms  mean %8.2f us  p50 %8.2f us  p99 %8.2f us  max %8.2f us" % (
+                    name, histogram.count, histogram.total / 1e6, histogram.mean() / 1e3,
+                    histogram.percentile(0.5) / 1e3, histogram.percentile(0.99) / 1e3, histogram.max / 1e3))
+        return "\n".join(lines)
+
+
+# The profiler of the process
+profiler = Profiler()
+
+
+'''
+This runs function(*args) under cProfile and writes the statistics to path (read them with pstats or snakeviz)
+'''
+
+def runProfiled(path, function, *args, **kwargs):
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
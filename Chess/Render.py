@@ -0,0 +1,221 @@
+"""
+This is responsible for drawing the board of the pygame front-end: the tiles, the pieces, the highlighted moves, the
+move animation and the texts over the board. main.py draws the window with it and Headless.py draws positions on an
+off-screen surface, so the drawing code does not depend on the game loop.
+"""
+
+import time
+
+import pygame as p
+from Chess import Assets
+
+Width = Height = 800
+Dimension = 8
+# A chessboard is a 8x8 grid
+TileSize = Height // Dimension
+AnimationFPS = 60
+# The animation of a move lasts 5 frames per tile at this rate, however many frames are actually drawn
+Images = {}
+# Piece sprites of the current tile size, from the asset manager
+assets = Assets.AssetManager()
+colors = [p.Color(215, 185, 105), p.Color(95, 60, 30)]
+
+'''
+This initializes a dictionary of the chess images. It is an expensive operation, therefore it is only called once.
+'''
+
+def loadImages():
+    Images.update(assets.pieceSprites(TileSize))
+    # The sprites of every tile size are scaled only once, they are kept by the asset manager
+
+'''
+This fits the board to a new window size: the tiles take the largest size that lets all 8 fit
+'''
+
+def resizeBoard(width, height):
+    global Width, Height, TileSize
+    TileSize = max(min(width, height) // Dimension, 1)
+    Width = Height = TileSize * Dimension
+    loadImages()
+
+'''
+This is responsible for all the graphics on the board.
+The checkerboard is drawn once into a background surface and the highlight overlay is built once. Every frame only
+the tiles whose piece or highlight changed since the last frame are drawn again, and only their rects are sent to
+the display, so a frame where nothing changed costs next to nothing.
+'''
+
+class BoardRenderer():
+    def __init__(self, screen):
+        self.screen = screen
+        self.resize()
+        # Counters: frames rendered, frames with nothing to update, tiles redrawn and seconds spent rendering
+        self.frames = 0
+        self.idleFrames = 0
+        self.tilesDrawn = 0
+        self.renderTime = 0.0
+
+    '''
+    This builds the cached surfaces for the current tile size and forgets what is on the screen
+    '''
+    def resize(self):
+        self.background = p.Surface((Width, Height))
+        DrawTiles(self.background)
+        self.highlight = p.Surface((TileSize, TileSize))
+        self.highlight.set_alpha(80)
+        self.highlight.fill(p.Color("green"))
+        self.drawn = [[None] * Dimension for _ in range(Dimension)]    # (piece, highlighted) shown on every tile
+        self.texts = (None, None, None)
+        self.textRects = []
+
+    '''
+    This forgets what is on the screen, so that the next frame redraws every tile (after an animation drew over it)
+    '''
+    def invalidate(self):
+        self.drawn = [[None] * Dimension for _ in range(Dimension)]
+
+    def invalidateRect(self, rect):
+        for r in range(max(rect.top // TileSize, 0), min((rect.bottom - 1) // TileSize, Dimension - 1) + 1):
+            for c in range(max(rect.left // TileSize, 0), min((rect.right - 1) // TileSize, Dimension - 1) + 1):
+                self.drawn[r][c] = None
+
+    '''
+    This draws the board state, with the moves of the selected ally piece highlighted (validMoves is the
+    ChessEngine.MoveIndex of the position), a message in the middle of the board, a status line in its corner and
+    the performance overlay at the bottom (all None when there is nothing to show)
+    '''
+    def render(self, bs, validMoves, tileSelected, message=None, status=None, performance=None):
+        start = time.perf_counter()
+        highlighted = frozenset()
+        if tileSelected != () and 0 <= tileSelected[0] < Dimension and 0 <= tileSelected[1] < Dimension:
+            r, c = tileSelected
+            if bs.board[r][c][0] == ("w" if bs.whiteToMove else "b"):   # Checks that the selected piece is an ally
+                highlighted = validMoves.highlights(tileSelected)
+        texts = (message, status, performance)
+        if texts != self.texts:
+            for rect in self.textRects:     # The tiles under the old texts have to be drawn again
+                self.invalidateRect(rect)
+
+        rects = []
+        for r in range(Dimension):
+            for c in range(Dimension):
+                tile = (bs.board[r][c], (r, c) in highlighted)
+                if tile != self.drawn[r][c]:
+                    rect = p.Rect(c * TileSize, r * TileSize, TileSize, TileSize)
+                    self.screen.blit(self.background, rect, rect)
+                    if tile[1]:
+                        self.screen.blit(self.highlight, rect)
+                    if tile[0] != "--":
+                        self.screen.blit(Images[tile[0]], rect)
+                    self.drawn[r][c] = tile
+                    rects.append(rect)
+        self.tilesDrawn += len(rects)
+        if rects or texts != self.texts:
+            # Texts are drawn again whenever a tile was, redrawing them over themselves does not change a pixel
+            self.textRects = []
+            if message is not None:
+                self.textRects.append(drawText(self.screen, message))
+            if status is not None:
+                self.textRects.append(drawStatus(self.screen, status))
+            if performance is not None:
+                self.textRects.append(drawOverlay(self.screen, performance))
+            rects.extend(self.textRects)
+            self.texts = texts
+
+        self.frames += 1
+        if rects:
+            if self.screen is p.display.get_surface():     # Off-screen surfaces are drawn on but not displayed
+                p.display.update(rects)
+        else:
+            self.idleFrames += 1
+        self.renderTime += time.perf_counter() - start
+        return rects
+
+    def stats(self):
+        return "%d frames, %d idle (%.0f%%), %d tiles drawn, %.2f ms per frame" % (
+            self.frames, self.idleFrames, 100 * self.idleFrames / max(self.frames, 1), self.tilesDrawn,
+            1000 * self.renderTime / max(self.frames, 1))
+
+
+'''
+This is responsible for drawing the tiles of the board
+'''
+
+def DrawTiles(screen):
+    for r in range(Dimension):
+        for c in range(Dimension):
+            color = colors[((r+c) % 2)]
+            p.draw.rect(screen, color, p.Rect(c*TileSize, r*TileSize, TileSize, TileSize))
+
+'''
+This is responsible for drawing the pieces on the board
+'''
+
+def DrawPieces(screen, board):
+    for r in range(Dimension):
+        for c in range(Dimension):
+            piece = board[r][c]
+            if piece != "--":
+                screen.blit(Images[piece], p.Rect(c * TileSize, r * TileSize, TileSize, TileSize))
+
+def animateMove(move, screen, board, clock, background):
+    change_row = move.endRow - move.startRow
+    change_col = move.endCol - move.startCol
+    framesPerSquare = 5
+    # frameCount = (abs(change_row) + abs(change_col))*framesPerSquare
+    frameCount = max(abs(change_row), abs(change_col)) * framesPerSquare
+    if change_row != 0 and change_col != 0 or (change_row == 1 or change_col == 1):
+        frameCount += framesPerSquare
+    # The piece follows the clock, so the frame rate is not capped: every frame drawn makes the animation smoother
+    duration = frameCount / AnimationFPS
+    start = time.perf_counter()
+    progress = 0
+    while progress < 1:
+        progress = min((time.perf_counter() - start) / duration, 1)
+        r, c = (move.startRow + change_row*progress, move.startCol + change_col*progress)
+        screen.blit(background, (0, 0))
+        DrawPieces(screen, board)
+        # Erase the moving piece in the ending tile
+        endTile = p.Rect(move.endCol*TileSize, move.endRow*TileSize, TileSize, TileSize)
+        screen.blit(background, endTile, endTile)
+        # Draw captured piece
+        if move.pieceCaptured != "--":
+            screen.blit(Images[move.pieceCaptured], endTile)
+        # Draw moving piece
+        screen.blit(Images[move.pieceMoved], p.Rect(c*TileSize, r*TileSize, TileSize, TileSize))
+        p.display.flip()
+        clock.tick()
+
+
+def drawStatus(screen, text):
+    textObject = assets.text(text, 20, p.Color("black"))
+    return screen.blit(textObject, (8, 8))
+
+
+def drawOverlay(screen, text):
+    textObject = assets.text(text, 14, p.Color("black"), bold=False)
+    background = p.Rect(4, Height - textObject.get_height() - 8, textObject.get_width() + 8, textObject.get_height() + 4)
+    screen.fill(p.Color(235, 235, 235), background)
+    screen.blit(textObject, background.move(4, 2))
+    return background
+
+
+'''
+The performance overlay: the time of the last frame, the time from input to its frame and the time of the last
+move generation (on the worker thread), with their means
+'''
+
+def overlayText(profiler):
+    parts = []
+    for label, name in (("frame", "frame"), ("input", "eventLatency"), ("movegen", "getValidMoves")):
+        histogram = profiler.histogram(name)
+        parts.append("%s %.1f ms (mean %.1f)" % (label, histogram.last / 1e6, histogram.mean() / 1e6))
+    return "   ".join(parts)
+
+
+def drawText(screen, text):
+    textObject = assets.text(text, 40, p.Color("black"))
+    textLocation = p.Rect(0, 0, Width, Height).move(Width/2-textObject.get_width()/2, Height/2-textObject.get_height()/2)
+    textRect = screen.blit(textObject, textLocation)
+    textObject = assets.text(text, 40, (180, 180, 180))
+    return textRect.union(screen.blit(textObject, textLocation.move(2, 2)))
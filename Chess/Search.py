@@ -0,0 +1,451 @@
+"""
+This is responsible for choosing a move for the player to move: an alpha-beta (negamax) search with iterative
+deepening under a time and/or node budget, a quiescence search of captures at the leaves, and a transposition table
+keyed by the Zobrist key of BoardState.
+Moves are tried in the order: best move from the transposition table, captures by most valuable victim / least
+valuable attacker, the two killer moves of the ply, then quiet moves by their history score.
+It can be run from the command line as a benchmark: python -m Chess.Search --help
+"""
+
+import argparse
+import sys
+import time
+
+from Chess import ChessEngine
+from Chess import Evaluation
+
+MateScore = 100000
+MateBound = MateScore - 1000    # Scores beyond this are mates, MateScore minus the plies to the mate
+Infinity = MateScore + 1
+MaxPly = 128
+
+# Bound of a transposition table score: the exact score, at least the score (beta cutoff), at most the score
+Exact, Lower, Upper = 0, 1, 2
+
+# Move ordering scores, captures and promotions add the MVV-LVA score on top of theirs
+TableMoveOrder = 1 << 30
+CaptureOrder = 1 << 24
+KillerOrder = 1 << 20
+# Delta pruning margin of the quiescence search: what a capture can win in position on top of the piece's value
+DeltaMargin = 200
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable():
+    '''
+    A fixed number of slots (a power of two) indexed by the low bits of the Zobrist key, so the table never grows.
+    An entry is (key, depth, bound, score, moveID, generation). A slot is overwritten by another position when its
+    entry is left over from an earlier search or was searched no deeper than the new one (depth-preferred replacement).
+    '''
+    def __init__(self, size=1 << 18):
+        self.size = 1 << (max(size, 1).bit_length() - 1)    # Rounded down to a power of two
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def newSearch(self):
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, moveID):
+        index = key & self.mask
+        old = self.entries[index]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.entries[index] = (key, depth, bound, score, moveID, self.generation)
+
+    '''
+    The fraction of the slots in use
+    '''
+    def usage(self):
+        return sum(1 for entry in self.entries if entry is not None) / self.size
+
+
+'''
+Mate scores are stored relative to the position in the table and relative to the root in the search
+'''
+
+def scoreToTable(score, ply):
+    if score > MateBound:
+        return score + ply
+    if score < -MateBound:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score > MateBound:
+        return score - ply
+    if score < -MateBound:
+        return score + ply
+    return score
+
+
+def formatScore(score):
+    if score > MateBound:
+        return "mate %d" % ((MateScore - score + 1) // 2)
+    if score < -MateBound:
+        return "mate -%d" % ((MateScore + score) // 2)
+    return "cp %d" % score
+
+
+class SearchInfo():
+    '''
+    The result of one completed iteration of the search
+    '''
+    def __init__(self, depth, score, nodes, seconds, pv):
+        self.depth = depth
+        self.score = score
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv
+
+    def nodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self):
+        return "depth %2d  score %-9s  nodes %9d  time %7.2fs  %8.0f nodes/s  pv %s" % (
+            self.depth, formatScore(self.score), self.nodes, self.seconds, self.nodesPerSecond(),
+            " ".join(move.getChessNotation() for move in self.pv))
+
+
+class SearchResult():
+    '''
+    The move to play (None when the game is over) and the iterations that led to it, the last one being the deepest
+    '''
+    def __init__(self, move, iterations, nodes, seconds):
+        self.move = move
+        self.iterations = iterations
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def depth(self):
+        return self.iterations[-1].depth if self.iterations else 0
+
+    def score(self):
+        return self.iterations[-1].score if self.iterations else 0
+
+    def nodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds > 0 else float("inf")
+
+
+class Searcher():
+    def __init__(self, tableSize=1 << 18, evaluate=None):
+        self.table = TranspositionTable(tableSize)
+        self.evaluate = evaluate or Evaluation.evaluate
+        self.nodes = 0
+        self.deadline = None
+        self.nodeLimit = None
+        self.nextCheck = 0
+        self.cancelled = None
+        self.killers = []
+        self.history = []
+
+    '''
+    This searches bs deeper and deeper until maxDepth, timeLimit (seconds) or nodeLimit is reached and returns the
+    best move of the deepest completed iteration. The move is one of bs.getValidMoves(), so it can be played directly.
+    info is called with the SearchInfo of every completed iteration. bs is given back in the position it came in.
+    cancelled, if given, is called every 1024 nodes and stops the search as soon as it returns True. It belongs to this
+    search only, so a cancel made before the search started is not lost.
+    '''
+    def search(self, bs, maxDepth=MaxPly - 1, timeLimit=None, nodeLimit=None, info=None, cancelled=None):
+        start = time.perf_counter()
+        self.nodes = 0
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        self.nextCheck = 1024 if nodeLimit is None else min(1024, nodeLimit)
+        self.cancelled = cancelled
+        self.killers = [[None, None] for _ in range(MaxPly)]
+        self.history = [0] * 4096
+        self.table.newSearch()
+
+        rootMoves = bs.getLegalMoves()
+        iterations = []
+        if not rootMoves:
+            return SearchResult(None, iterations, 0, time.perf_counter() - start)
+        bestMove = rootMoves[0]
+        rootLength = len(bs.moveLog)
+        for depth in range(1, min(maxDepth, MaxPly - 1) + 1):
+            try:
+                score, move = self.searchRoot(bs, depth, rootMoves)
+            except SearchTimeout:
+                while len(bs.moveLog) > rootLength:     # Back to the root from wherever the search was stopped
+                    bs.undoMove()
+                break
+            bestMove = move
+            iteration = SearchInfo(depth, score, self.nodes, time.perf_counter() - start, self.principalVariation(bs))
+            iterations.append(iteration)
+            if info is not None:
+                info(iteration)
+            if abs(score) > MateBound or len(rootMoves) == 1:
+                break   # Deeper iterations cannot change a forced mate or a forced move
+        return SearchResult(bestMove, iterations, self.nodes, time.perf_counter() - start)
+
+    def searchRoot(self, bs, depth, rootMoves):
+        entry = self.table.probe(bs.zobristKey)
+        rootMoves = self.orderMoves(rootMoves, entry[4] if entry is not None else None, 0)
+        alpha = -Infinity
+        bestMove = rootMoves[0]
+        for move in rootMoves:
+            bs.makeMove(move)
+            score = -self.negamax(bs, depth - 1, -Infinity, -alpha, 1)
+            bs.undoMove()
+            if score > alpha:
+                alpha = score
+                bestMove = move
+        self.table.store(bs.zobristKey, depth, Exact, scoreToTable(alpha, 0), bestMove.moveID)
+        return alpha, bestMove
+
+    def negamax(self, bs, depth, alpha, beta, ply):
+        if self.isDraw(bs):
+            return 0
+        if depth <= 0 or ply >= MaxPly - 1:
+            return self.quiescence(bs, alpha, beta, ply)
+        self.nodes += 1
+        if self.nodes >= self.nextCheck:
+            self.checkLimits()
+
+        key = bs.zobristKey
+        entry = self.table.probe(key)
+        tableMove = None
+        if entry is not None:
+            tableMove = entry[4]
+            if entry[1] >= depth:
+                score = scoreFromTable(entry[3], ply)
+                if entry[2] == Exact or (entry[2] == Lower and score >= beta) or (entry[2] == Upper and score <= alpha):
+                    return score
+
+        moves = bs.getLegalMoves()
+        if not moves:
+            return -MateScore + ply if bs.inCheck() else 0
+
+        originalAlpha = alpha
+        bestScore = -Infinity
+        bestMove = None
+        for move in self.orderMoves(moves, tableMove, ply):
+            bs.makeMove(move)
+            score = -self.negamax(bs, depth - 1, -beta, -alpha, ply + 1)
+            bs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if move.pieceCaptured == "--" and not move.isPawnPromotion:     # Quiet move refutation
+                            killers = self.killers[ply]
+                            if killers[0] != move.moveID:
+                                killers[1] = killers[0]
+                                killers[0] = move.moveID
+                            self.history[move.moveID & 4095] += depth * depth
+                        break
+
+        if bestScore <= originalAlpha:
+            bound = Upper
+        elif bestScore >= beta:
+            bound = Lower
+        else:
+            bound = Exact
+        self.table.store(key, depth, bound, scoreToTable(bestScore, ply), bestMove.moveID)
+        return bestScore
+
+    '''
+    This only searches captures and promotions, so the static evaluation is never taken in the middle of an exchange.
+    The side to move may stand pat: it is not forced to capture if the evaluation is already good enough.
+    In check there is no standing pat, every evasion is searched and having none is checkmate.
+    Out of check only the captures and promotions are generated (a stalemate is not seen), and a capture is skipped
+    when even winning its piece plus DeltaMargin would leave the score below alpha (delta pruning).
+    '''
+    def quiescence(self, bs, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes >= self.nextCheck:
+            self.checkLimits()
+        if bs.inCheck():
+            captures = bs.getLegalMoves()
+            if not captures:
+                return -MateScore + ply
+            standPat = None
+        else:
+            standPat = self.evaluate(bs)
+            if standPat >= beta:
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+            captures = bs.getLegalMoves(quiet=False)
+        captures.sort(key=captureOrder, reverse=True)
+        for move in captures:
+            if standPat is not None and standPat + captureGain(move) + DeltaMargin <= alpha:
+                continue
+            bs.makeMove(move)
+            score = -self.quiescence(bs, -beta, -alpha, ply + 1)
+            bs.undoMove()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def orderMoves(self, moves, tableMove, ply):
+        killers = self.killers[ply]
+        history = self.history
+
+        def order(move):
+            if move.moveID == tableMove:
+                return TableMoveOrder
+            if move.pieceCaptured != "--" or move.isPawnPromotion:
+                return CaptureOrder + captureOrder(move)
+            if move.moveID == killers[0]:
+                return KillerOrder + 1
+            if move.moveID == killers[1]:
+                return KillerOrder
+            return history[move.moveID & 4095]
+        return sorted(moves, key=order, reverse=True)
+
+    '''
+    The fifty move rule, and any position repeated since the last capture or pawn move (once is enough in a search)
+    '''
+    def isDraw(self, bs):
+        if bs.halfmoveClock >= 100:
+            return True
+        log = bs.zobristLog
+        last = len(log) - 1
+        key = log[last]
+        for i in range(last - 4, max(last - bs.halfmoveClock, 0) - 1, -2):
+            if log[i] == key:
+                return True
+        return False
+
+    '''
+    This ends the search when it was cancelled or ran out of nodes or time. It is called every 1024 nodes.
+    '''
+    def checkLimits(self):
+        if self.cancelled is not None and self.cancelled():
+            raise SearchTimeout()
+        if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        self.nextCheck = self.nodes + 1024
+        if self.nodeLimit is not None:
+            self.nextCheck = min(self.nextCheck, self.nodeLimit)
+
+    '''
+    The expected line of play, read from the best moves stored in the transposition table
+    '''
+    def principalVariation(self, bs, maxLength=32):
+        pv = []
+        seen = set()
+        while len(pv) < maxLength and bs.zobristKey not in seen:
+            seen.add(bs.zobristKey)
+            entry = self.table.probe(bs.zobristKey)
+            if entry is None:
+                break
+            move = next((move for move in bs.getLegalMoves() if move.moveID == entry[4]), None)
+            if move is None:
+                break
+            pv.append(move)
+            bs.makeMove(move)
+        for _ in pv:
+            bs.undoMove()
+        return pv
+
+
+'''
+Most valuable victim first, and among captures of the same victim the least valuable attacker first
+'''
+
+def captureOrder(move):
+    values = Evaluation.pieceValues
+    score = 0
+    if move.pieceCaptured != "--":
+        score = values[move.pieceCaptured[1]] * 16 - values[move.pieceMoved[1]] // 16
+    if move.isPawnPromotion:
+        score += values[move.promotionChoice] * 16
+    return score
+
+
+'''
+The most material a capture or promotion can win: the captured piece, plus the promoted piece in place of the pawn
+'''
+
+def captureGain(move):
+    values = Evaluation.pieceValues
+    gain = values[move.pieceCaptured[1]] if move.pieceCaptured != "--" else 0
+    if move.isPawnPromotion:
+        gain += values[move.promotionChoice] - values["p"]
+    return gain
+
+
+'''
+This finds the best move of bs within the budget with a new Searcher
+'''
+
+def findBestMove(bs, maxDepth=MaxPly - 1, timeLimit=None, nodeLimit=None):
+    return Searcher().search(bs, maxDepth, timeLimit, nodeLimit).move
+
+
+# Positions of the benchmark, from the opening to the endgame
+BenchmarkPositions = {
+    "start": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "italian": "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "middlegame": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "endgame": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "mate": "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alpha-beta search of the ChessEngine positions, and its benchmark")
+    parser.add_argument("--fen", help="position to search (default: the start position)")
+    parser.add_argument("-d", "--depth", type=int, help="maximum depth in plies (default: 5 for --bench)")
+    parser.add_argument("-t", "--time", type=float, help="time budget in seconds")
+    parser.add_argument("-n", "--nodes", type=int, help="node budget")
+    parser.add_argument("-b", "--backend", choices=["list"] + sorted(ChessEngine.backends), default="list",
+                        help="board representation to search with (default: list)")
+    parser.add_argument("--table-size", type=int, default=1 << 18, help="transposition table slots (default: 262144)")
+    parser.add_argument("--bench", action="store_true",
+                        help="search the benchmark positions to a fixed depth and print time to depth and nodes/s")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        depth = args.depth or 5
+        totalNodes = 0
+        totalSeconds = 0.0
+        for name, fen in BenchmarkPositions.items():
+            bs = ChessEngine.BoardState.fromFEN(fen, args.backend)
+            result = Searcher(args.table_size).search(bs, depth, args.time, args.nodes)
+            totalNodes += result.nodes
+            totalSeconds += result.seconds
+            times = "  ".join("d%d %.2fs" % (iteration.depth, iteration.seconds) for iteration in result.iterations)
+            print("%-12s best %-6s %-9s %9d nodes  %8.0f nodes/s  %s" % (
+                name, result.move.getChessNotation(), formatScore(result.score()), result.nodes,
+                result.nodesPerSecond(), times))
+        print("total        %d nodes  %.2fs  %.0f nodes/s" % (
+            totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds > 0 else float("inf")))
+        return 0
+
+    bs = ChessEngine.BoardState.fromFEN(args.fen or ChessEngine.StartFEN, args.backend)
+    if args.depth is None and args.time is None and args.nodes is None:
+        args.depth = 5
+    result = Searcher(args.table_size).search(bs, args.depth or MaxPly - 1, args.time, args.nodes, info=print)
+    if result.move is None:
+        print("No legal moves")
+        return 1
+    print("bestmove %s" % result.move.getChessNotation())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
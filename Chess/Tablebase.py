@@ -0,0 +1,519 @@
+"""
+This is responsible for endgame tablebases: the exact result and distance to mate of every position of an endgame
+with a few pieces, worked out once by retrograde analysis and probed with a single byte read afterwards.
+The endgames are a lone black king against a white king and pieces: KQK, KRK, KPK and KBNK. Positions where Black has
+the pieces are looked up with the colors swapped. Without pawns the white king is moved into the a1-d1-d4 triangle by
+mirroring the board (8 symmetries), with a pawn the board is only mirrored left to right.
+A table is one byte per position index (see Table.index): 0 is a draw, 255 an impossible position, and any other
+value v means mate in v - 1 plies, which the side to move gives when v - 1 is odd and receives when it is even.
+The files are read through mmap, so probing costs no loading time and the tables are shared between processes.
+It can be run from the command line: python -m Chess.Tablebase --help
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from collections import defaultdict
+
+from Chess import ChessEngine
+
+# The Tablebases folder next to the Chess package
+TablebaseDirectory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tablebases")
+Endgames = ("KQK", "KRK", "KPK", "KBNK")
+Magic = b"CTB1"
+HeaderSize = 16     # Magic, then the endgame name padded with spaces
+
+Draw = 0
+Illegal = 255
+Unknown = 254   # Only while generating: a legal position whose value is not known yet
+
+# The squares (row * 8 + column) of the a1-d1-d4 triangle, numbered in the pawnless indices
+triangle = [sq for sq in range(64) if sq % 8 <= 3 and 7 - sq // 8 <= sq % 8]
+triangleIndex = {sq: i for i, sq in enumerate(triangle)}
+# Squares a pawn can stand on in files a-d, numbered in the pawn indices
+pawnSquares = [sq for sq in range(8, 56) if sq % 8 <= 3]
+pawnIndex = {sq: i for i, sq in enumerate(pawnSquares)}
+
+
+def flipFile(sq):
+    return sq ^ 7
+
+
+def flipRank(sq):
+    return sq ^ 56
+
+
+def transpose(sq):
+    return (7 - sq % 8) * 8 + 7 - sq // 8
+
+
+'''
+The mapping of the 64 squares that brings the white king on sq into the triangle: flip files, then ranks, then
+transpose when the king is above the a1-h8 diagonal
+'''
+
+def symmetryOf(sq):
+    steps = []
+    if sq % 8 > 3:
+        steps.append(flipFile)
+        sq = flipFile(sq)
+    if 7 - sq // 8 > 3:
+        steps.append(flipRank)
+        sq = flipRank(sq)
+    if 7 - sq // 8 > sq % 8:
+        steps.append(transpose)
+    mapping = list(range(64))
+    for step in steps:
+        mapping = [step(target) for target in mapping]
+    return tuple(mapping)
+
+
+symmetries = [symmetryOf(sq) for sq in range(64)]
+identity = tuple(range(64))
+fileMirror = tuple(flipFile(sq) for sq in range(64))
+
+
+class Table():
+    '''
+    The index of the positions of one endgame. The pieces are the white king, the black king and then the white
+    pieces of the name in order ("KBNK": wB, wN). An index is, for White to move 0 and Black to move 1:
+    side * positions + (white king square) * 64^(pieces - 1) + ... + (last piece square), where the white king
+    square is its number in the triangle (pawnless) or the pawn square its number in files a-d.
+    '''
+    def __init__(self, name):
+        if name not in Endgames:
+            raise ValueError("Unknown endgame " + repr(name) + ", expected one of: " + ", ".join(Endgames))
+        self.name = name
+        self.pieces = ("wK", "bK") + tuple("w" + ("p" if kind == "P" else kind) for kind in name[1:-1])
+        self.hasPawn = "wp" in self.pieces
+        self.sizes = [64] * len(self.pieces)
+        if self.hasPawn:
+            self.sizes[self.pieces.index("wp")] = len(pawnSquares)
+        else:
+            self.sizes[0] = len(triangle)
+        self.positions = 1
+        for size in self.sizes:
+            self.positions *= size
+        self.size = 2 * self.positions
+
+    '''
+    The index of the squares of self.pieces, which must already be in their canonical form
+    '''
+    def index(self, squares, whiteToMove):
+        index = 0
+        for piece, sq, size in zip(self.pieces, squares, self.sizes):
+            if size == 64:
+                index = index * 64 + sq
+            elif piece == "wp":
+                index = index * size + pawnIndex[sq]
+            else:
+                index = index * size + triangleIndex[sq]
+        return index if whiteToMove else self.positions + index
+
+    '''
+    The squares and side to move of an index
+    '''
+    def decode(self, index):
+        whiteToMove = index < self.positions
+        index %= self.positions
+        squares = []
+        for piece, size in zip(reversed(self.pieces), reversed(self.sizes)):
+            index, number = divmod(index, size)
+            if size == 64:
+                squares.append(number)
+            elif piece == "wp":
+                squares.append(pawnSquares[number])
+            else:
+                squares.append(triangle[number])
+        squares.reverse()
+        return squares, whiteToMove
+
+    '''
+    The index of any squares of self.pieces, mirrored into their canonical form
+    '''
+    def canonicalIndex(self, squares, whiteToMove):
+        if self.hasPawn:
+            mapping = fileMirror if squares[self.pieces.index("wp")] % 8 > 3 else identity
+        else:
+            mapping = symmetries[squares[0]]
+        return self.index([mapping[sq] for sq in squares], whiteToMove)
+
+    '''
+    The indices of the same position: with the white king on the a1-h8 diagonal a pawnless position and its
+    mirror image along that diagonal are both canonical, and have the same value
+    '''
+    def equivalentIndices(self, index):
+        if self.hasPawn:
+            return (index,)
+        squares, whiteToMove = self.decode(index)
+        if transpose(squares[0]) != squares[0]:
+            return (index,)
+        mirrored = self.index([transpose(sq) for sq in squares], whiteToMove)
+        return (index,) if mirrored == index else (index, mirrored)
+
+
+'''
+The endgame name of a position and whether its colors have to be swapped, or (None, False) for positions with other
+material. pieceLocations is BoardState.pieceLocations.
+'''
+
+def endgameOf(pieceLocations):
+    white = "".join(piece[1].upper() * len(pieceLocations["w" + piece[1]]) for piece in ("wQ", "wR", "wB", "wN", "wp"))
+    black = "".join(piece[1].upper() * len(pieceLocations["b" + piece[1]]) for piece in ("wQ", "wR", "wB", "wN", "wp"))
+    if white and not black and "K" + white + "K" in Endgames:
+        return "K" + white + "K", False
+    if black and not white and "K" + black + "K" in Endgames:
+        return "K" + black + "K", True
+    return None, False
+
+
+'''
+Whether neither side has mating material: bare kings, or a king and one bishop or knight against a king
+'''
+
+def isDeadDraw(pieceLocations):
+    pieces = [piece for piece, tiles in pieceLocations.items() for _ in tiles if piece[1] != "K"]
+    return len(pieces) == 0 or len(pieces) == 1 and pieces[0][1] in "BN"
+
+
+'''
+The (result, plies) of a table byte from the side to move: result 1 win, 0 draw, -1 loss, plies to mate
+'''
+
+def decodeValue(value):
+    if value == Draw or value >= Unknown:
+        return 0, 0
+    plies = value - 1
+    return (1 if plies % 2 else -1), plies
+
+
+class Tablebases():
+    '''
+    The tables of a directory, opened through mmap the first time they are probed. Missing tables are not probed.
+    '''
+    def __init__(self, directory=TablebaseDirectory):
+        self.directory = directory
+        self.tables = {}    # {name: (Table, mmap) or None when there is no file}
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".ctb")
+
+    def open(self, name):
+        if name not in self.tables:
+            self.tables[name] = None
+            try:
+                with open(self.path(name), "rb") as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return None
+            table = Table(name)
+            if data[:4] != Magic or data[4:HeaderSize].decode("ascii").strip() != name or \
+                    len(data) != HeaderSize + table.size:
+                data.close()
+                raise ValueError(self.path(name) + " is not a " + name + " table")
+            self.tables[name] = (table, data)
+        return self.tables[name]
+
+    '''
+    The (result, plies to mate) of the position of bs from the side to move (result 1 win, 0 draw, -1 loss),
+    or None when it is not in a table. Positions where no side can mate are draws without any table.
+    '''
+    def probe(self, bs):
+        if isDeadDraw(bs.pieceLocations):
+            return 0, 0
+        name, swap = endgameOf(bs.pieceLocations)
+        if name is None or bs.currentCastlingRights.wKs or bs.currentCastlingRights.wQs or \
+                bs.currentCastlingRights.bKs or bs.currentCastlingRights.bQs:
+            return None
+        entry = self.open(name)
+        if entry is None:
+            return None
+        table, data = entry
+        squares = []
+        for piece in table.pieces:
+            if swap:    # Black's pieces are looked up as White's on the board turned upside down
+                r, c = next(iter(bs.pieceLocations[("b" if piece[0] == "w" else "w") + piece[1]]))
+                squares.append((7 - r) * 8 + c)
+            else:
+                r, c = next(iter(bs.pieceLocations[piece]))
+                squares.append(r * 8 + c)
+        whiteToMove = bs.whiteToMove != swap
+        return decodeValue(data[HeaderSize + table.canonicalIndex(squares, whiteToMove)])
+
+    '''
+    The move of validMoves (the legal moves of bs) that keeps the result of the position: the fastest mate when
+    winning, a move that keeps the draw, or the longest way to be mated. None when bs is not in a table.
+    '''
+    def bestMove(self, bs, validMoves=None):
+        if self.probe(bs) is None:
+            return None
+        if validMoves is None:
+            validMoves = bs.getLegalMoves()
+        best = None
+        bestScore = None
+        for move in validMoves:
+            bs.makeMove(move)
+            value = self.probe(bs)
+            bs.undoMove()
+            if value is None:
+                continue
+            result, plies = value
+            # The child is scored from the opponent's side: their loss is our win, sooner is better
+            score = (-result, plies if result > 0 else -plies)
+            if bestScore is None or score > bestScore:
+                best, bestScore = move, score
+        return best
+
+    def close(self):
+        for entry in self.tables.values():
+            if entry is not None:
+                entry[1].close()
+        self.tables = {}
+
+
+class Generator():
+    '''
+    Works out a table by retrograde analysis. The positions are first set up one at a time on a BoardState to find
+    the impossible ones, the mates and the number of legal moves of Black; then the results spread backwards from
+    the mates, one ply of distance at a time, by taking moves back.
+    tablebases is the Tablebases the tables of the endgames a pawn promotes into are read from.
+    '''
+    def __init__(self, name, tablebases):
+        self.table = Table(name)
+        self.tablebases = tablebases
+        self.values = bytearray([Unknown]) * self.table.size
+        self.counters = bytearray(self.table.size)    # Legal moves of Black not known to lose yet
+        self.frontier = defaultdict(list)   # {plies: [indices whose value was set to mate in plies]}
+        self.promotions = defaultdict(list)     # {plies: [indices a promotion wins in plies]}
+        # A position without castling rights or enpassant tile, whose pieces are replaced by place and remove
+        self.bs = ChessEngine.BoardState.fromFEN("4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+        self.clearBoard()
+
+    def clearBoard(self):
+        for row in self.bs.board:
+            row[:] = ["--"] * 8
+        self.bs.loadPieceLocations()
+
+    def place(self, squares, whiteToMove):
+        bs = self.bs
+        for piece, sq in zip(self.table.pieces, squares):
+            bs.board[sq // 8][sq % 8] = piece
+            bs.pieceLocations[piece].add((sq // 8, sq % 8))
+        bs.whiteKingLocation = (squares[0] // 8, squares[0] % 8)
+        bs.blackKingLocation = (squares[1] // 8, squares[1] % 8)
+        bs.whiteToMove = whiteToMove
+
+    def remove(self, squares):
+        for piece, sq in zip(self.table.pieces, squares):
+            self.bs.board[sq // 8][sq % 8] = "--"
+            self.bs.pieceLocations[piece].clear()
+
+    def setValue(self, index, plies):
+        for equivalent in self.table.equivalentIndices(index):
+            self.values[equivalent] = plies + 1
+            self.frontier[plies].append(equivalent)
+
+    def generate(self):
+        self.classify()
+        plies = 0
+        while self.frontier or self.promotions:
+            for index in self.promotions.pop(plies, ()):
+                if self.values[index] == Unknown:   # No shorter mate without the promotion
+                    self.setValue(index, plies)
+            for index in self.frontier.pop(plies, ()):
+                self.retract(index, plies)
+            plies += 1
+        values = self.values
+        for index in range(self.table.size):
+            if values[index] == Unknown:
+                values[index] = Draw
+        return values
+
+    '''
+    The first pass: every index is marked Illegal, a draw, a mate, or gets the number of legal moves of Black.
+    A promotion of White that wins in a smaller table is a win here one ply later, unless a shorter mate is found.
+    '''
+    def classify(self):
+        table = self.table
+        bs = self.bs
+        for index in range(table.size):
+            squares, whiteToMove = table.decode(index)
+            if len(set(squares)) != len(squares):
+                self.values[index] = Illegal
+                continue
+            self.place(squares, whiteToMove)
+            # The side that is not to move must not be in check
+            if bs.isSquareAttacked(bs.blackKingLocation if whiteToMove else bs.whiteKingLocation,
+                                   "w" if whiteToMove else "b"):
+                self.values[index] = Illegal
+            elif whiteToMove:
+                if table.hasPawn:
+                    self.classifyPromotions(index)
+            else:
+                moves = bs.getLegalMoves()
+                if not moves:
+                    if bs.inCheck():
+                        self.setValue(index, 0)
+                    else:
+                        self.values[index] = Draw
+                elif any(move.pieceCaptured != "--" for move in moves):
+                    self.values[index] = Draw   # Black takes a piece, White cannot mate with what is left
+                else:
+                    self.counters[index] = len(moves)
+            self.remove(squares)
+
+    def classifyPromotions(self, index):
+        bs = self.bs
+        best = None
+        for move in bs.getLegalMoves():
+            if move.isPawnPromotion:
+                bs.makeMove(move)
+                value = self.tablebases.probe(bs)
+                bs.undoMove()
+                if value is None:
+                    raise ValueError("The tables the pawn of " + self.table.name + " promotes into are missing")
+                result, plies = value
+                if result < 0 and (best is None or plies < best):
+                    best = plies
+        if best is not None:
+            self.promotions[best + 1].append(index)
+
+    '''
+    The positions one move before the position of index, whose value is mate in plies: a Black loss makes every
+    position where White could move into it a win, a White win takes one escape away from the Black positions
+    before it, which are lost when none is left.
+    '''
+    def retract(self, index, plies):
+        table = self.table
+        squares, whiteToMove = table.decode(index)
+        occupied = set(squares)
+        values = self.values
+        if not whiteToMove:
+            for i in range(len(squares)):
+                if i == 1:
+                    continue    # Black's king did not move last
+                for target in self.unmoveTargets(table.pieces[i], squares[i], occupied):
+                    parent = list(squares)
+                    parent[i] = target
+                    parentIndex = table.canonicalIndex(parent, True)
+                    if values[parentIndex] == Unknown:
+                        self.setValue(parentIndex, plies + 1)
+        else:
+            for target in ChessEngine.kingTargets[squares[1] // 8][squares[1] % 8]:
+                target = target[0] * 8 + target[1]
+                if target in occupied:
+                    continue
+                parent = list(squares)
+                parent[1] = target
+                parentIndex = table.canonicalIndex(parent, False)
+                if values[parentIndex] == Unknown and self.counters[parentIndex]:
+                    self.counters[parentIndex] -= 1
+                    if self.counters[parentIndex] == 0:
+                        self.setValue(parentIndex, plies + 1)
+
+    '''
+    The squares a white piece now on sq could have come from without capturing: its own moves backwards
+    '''
+    def unmoveTargets(self, piece, sq, occupied):
+        r, c = sq // 8, sq % 8
+        kind = piece[1]
+        if kind == "p":
+            targets = []
+            if r + 1 <= 6 and (r + 1) * 8 + c not in occupied:
+                targets.append((r + 1) * 8 + c)
+                if r == 4 and (r + 2) * 8 + c not in occupied:
+                    targets.append((r + 2) * 8 + c)
+            return targets
+        if kind == "N":
+            tiles = ChessEngine.knightTargets[r][c]
+        elif kind == "K":
+            tiles = ChessEngine.kingTargets[r][c]
+        else:
+            first, last = {"R": (0, 4), "B": (4, 8), "Q": (0, 8)}[kind]
+            tiles = []
+            for ray in ChessEngine.tileRays[r][c][first:last]:
+                for tile in ray:
+                    if tile[0] * 8 + tile[1] in occupied:
+                        break
+                    tiles.append(tile)
+        return [tile[0] * 8 + tile[1] for tile in tiles if tile[0] * 8 + tile[1] not in occupied]
+
+
+'''
+This generates the table of an endgame (and first those it promotes into) and writes it to the directory.
+It returns the values, or None when the file was already there and force is False.
+'''
+
+def generateTable(name, directory=TablebaseDirectory, force=False, report=None):
+    tablebases = Tablebases(directory)
+    path = tablebases.path(name)
+    if os.path.exists(path) and not force:
+        return None
+    if "P" in name:
+        for promoted in ("KQK", "KRK"):
+            generateTable(promoted, directory, False, report)
+    start = time.perf_counter()
+    values = Generator(name, tablebases).generate()
+    tablebases.close()
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as file:    # Written aside and renamed, so a table file is never half written
+        file.write(Magic + name.ljust(HeaderSize - len(Magic)).encode("ascii"))
+        file.write(values)
+    os.replace(path + ".tmp", path)
+    if report is not None:
+        report(name, values, time.perf_counter() - start)
+    return values
+
+
+def printReport(name, values, seconds):
+    wins = draws = losses = longest = 0
+    for value in values:
+        if value == Illegal:
+            continue
+        result, plies = decodeValue(value)
+        if result > 0:
+            wins += 1
+        elif result < 0:
+            losses += 1
+        else:
+            draws += 1
+        longest = max(longest, plies)
+    print("%-5s %9d positions: %d wins, %d draws, %d losses, longest mate %d plies, %.1fs" % (
+        name, wins + draws + losses, wins, draws, losses, longest, seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Endgame tablebases")
+    parser.add_argument("-d", "--directory", default=TablebaseDirectory, help="folder of the tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="generate tables")
+    generate.add_argument("endgames", nargs="*", default=list(Endgames), choices=Endgames,
+                          help="endgames to generate (default: all)")
+    generate.add_argument("--force", action="store_true", help="generate tables that are already there again")
+    probe = commands.add_parser("probe", help="look up a position and its best move")
+    probe.add_argument("fen", help="position to look up")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for name in args.endgames:
+            if generateTable(name, args.directory, args.force, printReport) is None:
+                print("%-5s already generated" % name)
+        return 0
+    bs = ChessEngine.BoardState.fromFEN(args.fen)
+    tablebases = Tablebases(args.directory)
+    value = tablebases.probe(bs)
+    if value is None:
+        print("Not in the tables")
+        return 1
+    result, plies = value
+    print({1: "win", 0: "draw", -1: "loss"}[result] + (" in %d plies" % plies if result else ""))
+    move = tablebases.bestMove(bs)
+    if move is not None:
+        print("bestmove %s" % move.getChessNotation())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+This is responsible for running move generation and engine searches away from the pygame event loop.
+The front-end hands in a snapshot of the position (its FEN, an immutable string) and picks the results up from a queue
+whenever it likes, so the window keeps drawing and answering events while the worker thread is busy.
+Every request belongs to a generation; cancel() starts a new one, which drops the requests still waiting, stops a
+running search and makes any result of the old generation stale, so it is never handed back. A search checks the
+generation of its own request, so a cancel that lands while the search is starting still stops it.
+"""
+
+import queue
+import threading
+
+from Chess import ChessEngine
+from Chess import Search
+
+
+class WorkerResult():
+    '''
+    The answer to one request. kind is "moves" (moves, a ChessEngine.MoveIndex, checkmate and stalemate are set)
+    or "search" (move and search, the Search.SearchResult, are set). fen is the snapshot the result belongs to.
+    '''
+    def __init__(self, kind, fen, moves=None, checkmate=False, stalemate=False, move=None, search=None):
+        self.kind = kind
+        self.fen = fen
+        self.moves = moves
+        self.checkmate = checkmate
+        self.stalemate = stalemate
+        self.move = move
+        self.search = search
+
+
+class EngineWorker():
+    '''
+    notify, if given, is called on the worker thread every time a result is ready (to wake up an event loop)
+    '''
+    def __init__(self, backend="list", moveCacheSize=4096, tableSize=1 << 18, notify=None):
+        # The worker's own BoardState, the snapshots are loaded into it. Only the worker thread touches it
+        self.bs = ChessEngine.BoardState(backend)
+        self.bs.moveCache = ChessEngine.MoveCache(moveCacheSize) if moveCacheSize else None
+        self.searcher = Search.Searcher(tableSize)
+        self.notify = notify
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.pending = 0    # Requests of the current generation without a result yet
+        self.thread = threading.Thread(target=self.run, name="EngineWorker", daemon=True)
+        self.thread.start()
+
+    '''
+    This asks for the legal moves and the checkmate/stalemate flags of the position of bs
+    '''
+    def requestMoves(self, bs):
+        self.submit("moves", bs.toFEN(), None)
+
+    '''
+    This asks for the best move of the position of bs, searched for at most timeLimit seconds
+    '''
+    def requestBestMove(self, bs, timeLimit=1.0, maxDepth=Search.MaxPly - 1):
+        self.submit("search", bs.toFEN(), (timeLimit, maxDepth))
+
+    def submit(self, kind, fen, options):
+        with self.lock:
+            self.pending += 1
+            self.requests.put((self.generation, kind, fen, options))
+
+    '''
+    This makes every request made so far stale: waiting ones are skipped, a running search is stopped
+    and their results are never returned by poll
+    '''
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.pending = 0
+
+    '''
+    Whether a request of the current generation is still being worked on
+    '''
+    def busy(self):
+        return self.pending > 0
+
+    '''
+    The results that arrived since the last call, without waiting. Stale results are thrown away.
+    '''
+    def poll(self):
+        results = []
+        while True:
+            try:
+                generation, result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            with self.lock:
+                if generation != self.generation:
+                    continue
+                self.pending -= 1
+            results.append(result)
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            generation, kind, fen, options = request
+            if generation != self.generation:
+                continue    # Cancelled before it was started
+            self.bs.loadFEN(fen)
+            if kind == "moves":
+                # The index is built here, off the event loop, once per position
+                moves = ChessEngine.MoveIndex(self.bs.getValidMoves())
+                result = WorkerResult(kind, fen, moves, self.bs.checkmate, self.bs.stalemate)
+            else:
+                timeLimit, maxDepth = options
+                search = self.searcher.search(self.bs, maxDepth, timeLimit,
+                                              cancelled=lambda: self.generation != generation)
+                result = WorkerResult(kind, fen, move=search.move, search=search)
+            self.results.put((generation, result))
+            if self.notify is not None:
+                self.notify()
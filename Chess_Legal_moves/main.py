@@ -3,6 +3,8 @@ This is the main driver file.
 It is responsible for handling the user input and displaying the current BoardState object.
 """
 
+import argparse
+
 import pygame as p
 from Chess_Legal_moves import ChessEngine
 
@@ -12,7 +14,9 @@ Dimension = 8
 # A chessboard is a 8x8 grid
 TileSize = Height // Dimension
 MaxFPS = 30
-# this is relevant for the animations of the pieces
+# Most frames drawn per second, it can be changed with --fps
+IdleTimeout = 1000
+# Milliseconds the loop sleeps waiting for input when nothing is going on
 Images = {}
 
 '''
@@ -41,7 +45,7 @@ This is the main driver of the code. It is responsible for handling user input a
 '''
 
 
-def main():
+def main(maxFPS=MaxFPS):
     p.init()
     screen = p.display.set_mode((Width, Height))
     clock = p.time.Clock()
@@ -55,12 +59,22 @@ def main():
     # This is responsible for storing the selected tile, it stores row,column
     playerClicks = []
     # This is responsible for keeping track of the player's clicks
+    changed = True      # Flag variable for when the screen has to be drawn again
     while running:
-        for e in p.event.get():
+        # Sleeps until there is input instead of polling, then handles all the input that arrived at once
+        events = p.event.get()
+        if not events and not changed:
+            event = p.event.wait(IdleTimeout)
+            if event.type != p.NOEVENT:
+                events = [event] + p.event.get()
+        for e in events:
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEOEXPOSE:   # The window has to be drawn again
+                changed = True
             elif e.type == p.MOUSEBUTTONDOWN:
-                location = p.mouse.get_pos()
+                changed = True
+                location = e.pos
                 # this is responsible for x,y location of the mouse
                 col = location[0]//TileSize
                 row = location[1]//TileSize
@@ -86,15 +100,19 @@ def main():
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_LEFT:      # undoes a move when the left arrow key is pressed
                     bs.undoMove()
+                    changed = True
                     moveMade = True
 
             if moveMade:
                 validMoves = bs.getValidMoves()
                 moveMade = False
 
+        # Drawn at most once per frame, and only when something on the screen changed
+        if changed:
             DrawBoardState(screen, bs)
-            clock.tick(MaxFPS)
             p.display.flip()
+            changed = False
+            clock.tick(maxFPS)
 
 
 '''
@@ -138,4 +156,6 @@ def DrawPieces(screen, board):
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chess Engine")
+    parser.add_argument("--fps", type=int, default=MaxFPS, help="most frames drawn per second (default: %d)" % MaxFPS)
+    main(parser.parse_args().fps)
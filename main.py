@@ -3,65 +3,130 @@ This is the main driver file.
 It is responsible for handling the user input and displaying the current BoardState object.
 """
 
+import argparse
+import time
+
 import pygame as p
+from Chess import Book
 from Chess import ChessEngine
+from Chess import Profiling
+from Chess import Render
+from Chess import Tablebase
+from Chess import Worker
 
-Width = Height = 800
-Dimension = 8
-# A chessboard is a 8x8 grid
-TileSize = Height // Dimension
 MaxFPS = 30
-# this is relevant for the animations of the pieces
-Images = {}
-colors = [p.Color(215, 185, 105), p.Color(95, 60, 30)]
-
-'''
-This initializes a dictionary of the chess images. It is an expensive operation, therefore it is only called once.
-'''
-
-def loadImages():
-    pieces = ["bR", "bN", "bB", "bQ", "bK", "bp", "wR", "wN", "wB", "wQ", "wK", "wp"]
-    for piece in pieces:
-        Images[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (TileSize, TileSize))
-        # This is responsible for downloading images
+# Most frames drawn per second, it can be changed with --fps. Animations are not limited by it
+IdleTimeout = 1000
+# Milliseconds the loop sleeps waiting for input when nothing is going on
+MoveCacheSize = 4096
+# Number of positions whose legal moves are kept
+EngineTime = 2.0
+# Seconds the engine searches when asked for a move with the "e" key
+ThinkingDelay = 0.2
+# "Thinking..." is only shown when the moves take longer than this, so that it does not flicker after every move
+WorkerEvent = p.USEREVENT
 
 '''
-This is responsible for the title and the icon of the output
+This is responsible for the title and the icon of the output. It is called when the window is opened rather than on
+import, so that importing this module never touches the display.
 '''
 
-p.display.set_caption("Chess Engine")
-icon = p.image.load("images/mechanical-gears.png")
-p.display.set_icon(icon)
+def setCaption():
+    p.display.set_caption("Chess Engine")
+    p.display.set_icon(Render.assets.icon())
 
 '''
-This is the main driver of the code. It is responsible for handling user input and uploading the graphics
+This is the main driver of the code. It is responsible for handling user input and uploading the graphics.
+book is an optional Book.OpeningBook the engine plays from while the position is in it, tablebases optional
+Tablebase.Tablebases it plays the endgames they hold from. With profiling the engine is instrumented for the whole
+game, not only while the overlay is shown.
 '''
 
-def main():
+def main(maxFPS=MaxFPS, book=None, tablebases=None, profiling=False):
     p.init()
-    screen = p.display.set_mode((Width, Height))
+    setCaption()
+    if profiling:
+        Profiling.profiler.enable()
+    screen = p.display.set_mode((Render.Width, Render.Height), p.RESIZABLE)
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     bs = ChessEngine.BoardState()
-    validMoves = bs.getValidMoves()
+    # The legal moves and the engine's moves are worked out on another thread, the loop picks them up when ready.
+    # The worker posts a WorkerEvent when a result is ready, which wakes the loop up if it is waiting for input
+    worker = Worker.EngineWorker(moveCacheSize=MoveCacheSize, notify=lambda: p.event.post(p.event.Event(WorkerEvent)))
+    worker.requestMoves(bs)
+    requestTime = time.perf_counter()
+    validMoves = ChessEngine.MoveIndex()     # Legal moves of the position on the board, once the worker sent them
     moveMade = False    # Flag variable for when a move is made
     animate = False     # Flag variable for when an animation must be made
-    loadImages()
+    engineThinking = False      # Flag variable for when the engine is searching a move for the side to move
+    changed = True      # Flag variable for when the screen has to be drawn again
+    Render.loadImages()
+    renderer = Render.BoardRenderer(screen)
     running = True
-    gameOver = False
+    gameOver = False    # Recomputed every frame from the flags of the position on the board
+    texts = (None, None, None)
+    overlay = False     # Flag variable for when the performance overlay is shown, it is toggled with the "p" key
+    profiler = Profiling.profiler
+    wakeups = 0
     tileSelected = ()
     # This is responsible for storing the selected tile, it stores row,column
     playerClicks = []
     # This is responsible for keeping track of the player's clicks
     while running:
-        for e in p.event.get():
+        # Sleeps until there is input (or a worker result) instead of polling; while the worker is busy the loop
+        # still wakes up once per frame, so that "Thinking..." can appear
+        events = p.event.get()
+        if not events and not changed:
+            timeout = 1000 // maxFPS if worker.busy() else IdleTimeout
+            event = p.event.wait(timeout)
+            if event.type != p.NOEVENT:
+                events = [event] + p.event.get()
+        wakeups += 1
+        wakeTime = time.perf_counter_ns()
+
+        for result in worker.poll():
+            changed = True
+            if result.kind == "moves":
+                validMoves = result.moves
+                bs.checkmate = result.checkmate
+                bs.stalemate = result.stalemate
+                if bs.checkmate:
+                    print("Checkmate!")
+                elif bs.stalemate:
+                    print("Stalemate")
+            else:
+                engineThinking = False
+                if result.move is not None:     # The move was searched in the position currently on the board
+                    print(result.move.getChessNotation())
+                    bs.makeMove(result.move)
+                    moveMade = True
+                    animate = True
+
+        # All the input that arrived since the last frame is handled at once
+        for e in events:
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEOEXPOSE:   # The window has to be drawn again as a whole
+                renderer.invalidate()
+                changed = True
+            elif e.type == p.VIDEORESIZE:
+                Render.resizeBoard(e.w, e.h)
+                screen = renderer.screen = p.display.get_surface()
+                screen.fill(p.Color("white"))
+                p.display.flip()
+                renderer.resize()
+                changed = True
             elif e.type == p.MOUSEBUTTONDOWN:
-                location = p.mouse.get_pos()
+                if moveMade:
+                    continue    # Later clicks of the batch were aimed at the position before the move
+                location = e.pos
                 # this is responsible for x,y location of the mouse
-                col = location[0]//TileSize
-                row = location[1]//TileSize
+                col = location[0]//Render.TileSize
+                row = location[1]//Render.TileSize
+                if not (0 <= row < Render.Dimension and 0 <= col < Render.Dimension):
+                    continue    # A click in the margin of a window that is not square
+                changed = True
                 if tileSelected == (row, col):
                     # This is responsible for checking if the player clicked the same square twice
                     tileSelected = ()       # deselects the clicked tile
@@ -70,16 +135,15 @@ def main():
                     tileSelected = (row, col)
                     playerClicks.append(tileSelected)       # Append for both the first and second clicks
                 if len(playerClicks) == 2:
-                    move = ChessEngine.Move(playerClicks[0], playerClicks[1], bs.board)
-                    for i in range(len(validMoves)):
-                        if move == validMoves[i]:
-                            print(move.getChessNotation())
-                            bs.makeMove(validMoves[i])
-                            moveMade = True
-                            animate = True
-                            tileSelected = ()       # resets the player's clicks
-                            playerClicks = []
-                    if not moveMade:
+                    move = validMoves.find(playerClicks[0], playerClicks[1], promotionChoice())
+                    if move is not None:
+                        print(move.getChessNotation())
+                        bs.makeMove(move)
+                        moveMade = True
+                        animate = True
+                        tileSelected = ()       # resets the player's clicks
+                        playerClicks = []
+                    else:
                         playerClicks = [tileSelected]
 
             elif e.type == p.KEYDOWN:
@@ -88,116 +152,114 @@ def main():
                     moveMade = True
                     animate = False
                 elif e.key == p.K_r:
-                    bs = ChessEngine.BoardState()
-                    validMoves = bs.getValidMoves()
+                    bs.loadFEN(ChessEngine.StartFEN)
                     tileSelected = ()
                     playerClicks = []
-                    moveMade = False
+                    moveMade = True
                     animate = False
+                elif e.key == p.K_p:
+                    overlay = not overlay
+                    # The instrumentation costs nothing while it is off, so it only runs while it is looked at
+                    if overlay:
+                        profiler.enable()
+                    elif not profiling:
+                        profiler.disable()
+                    changed = True
+                elif e.key == p.K_e and not engineThinking and not gameOver:   # the engine plays the side to move
+                    bookMove = book.weightedMove(bs, validMoves or None) if book is not None else None
+                    source = "book"
+                    if bookMove is None and tablebases is not None:
+                        bookMove = tablebases.bestMove(bs, validMoves or None)
+                        source = "tablebase"
+                    if bookMove is not None:    # Book and tablebase moves are played at once, without a search
+                        print(bookMove.getChessNotation() + " (" + source + ")")
+                        bs.makeMove(bookMove)
+                        moveMade = True
+                        animate = True
+                    else:
+                        worker.requestBestMove(bs, EngineTime)
+                        engineThinking = True
 
-            if moveMade:
-                if animate:
-                    animateMove(bs.moveLog[-1], screen, bs.board, clock)
-                validMoves = bs.getValidMoves()
-                moveMade = False
-                animate = False
-
-            DrawBoardState(screen, bs, validMoves, tileSelected)
-
-            if bs.checkmate:
-                gameOver = True
-                if bs.whiteToMove:
-                    drawText(screen, "Black wins, Congratulations!")
-                else:
-                    drawText(screen, "White wins, Congratulations!")
-            elif bs.stalemate:
-                drawText(screen, "Stalemate")
-            clock.tick(MaxFPS)
-            p.display.flip()
+        if moveMade:
+            if animate:
+                Render.animateMove(bs.moveLog[-1], screen, bs.board, clock, renderer.background)
+                renderer.invalidate()
+            worker.cancel()     # Results for the position before this move, undo or reset are stale
+            engineThinking = False
+            worker.requestMoves(bs)
+            requestTime = time.perf_counter()
+            validMoves = ChessEngine.MoveIndex()
+            bs.checkmate = bs.stalemate = False     # Unknown until the worker sends the moves of the new position
+            moveMade = False
+            animate = False
+            changed = True
 
-'''
-This is responsible for all the graphics on the board
-'''
-
-def DrawBoardState(screen, bs, validMoves, tileSelected):
-    DrawTiles(screen)
-    # This is responsible for drawing the board tiles
-    HighlightTiles(screen, bs, validMoves, tileSelected)
-    DrawPieces(screen, bs.board)
-    # This is responsible for drawing pieces on top of the tiles
-
-
-'''
-This is responsible for drawing the tiles of the board
-'''
-
-def DrawTiles(screen):
-    for r in range(Dimension):
-        for c in range(Dimension):
-            color = colors[((r+c) % 2)]
-            p.draw.rect(screen, color, p.Rect(c*TileSize, r*TileSize, TileSize, TileSize))
-
-'''
-This is responsible for drawing the pieces on the board
-'''
+        message = status = None
+        gameOver = bs.checkmate or bs.stalemate
+        if bs.checkmate:
+            if bs.whiteToMove:
+                message = "Black wins, Congratulations!"
+            else:
+                message = "White wins, Congratulations!"
+        elif bs.stalemate:
+            message = "Stalemate"
+        elif engineThinking or (worker.busy() and time.perf_counter() - requestTime > ThinkingDelay):
+            status = "Thinking..."
+        # The overlay shows the times up to the previous frame; refreshing it only when something else happens keeps
+        # it from redrawing itself every frame
+        performance = texts[2]
+        if not overlay:
+            performance = None
+        elif changed or events or performance is None:
+            performance = Render.overlayText(profiler)
+        if (message, status, performance) != texts:
+            texts = (message, status, performance)
+            changed = True
 
-def DrawPieces(screen, board):
-    for r in range(Dimension):
-        for c in range(Dimension):
-            piece = board[r][c]
-            if piece != "--":
-                screen.blit(Images[piece], p.Rect(c * TileSize, r * TileSize, TileSize, TileSize))
+        # Drawn at most once per frame, and only when something on the screen changed
+        if changed:
+            frameStart = time.perf_counter_ns()
+            renderer.render(bs, validMoves, tileSelected, message, status, performance)
+            changed = False
+            if profiler.enabled():
+                end = time.perf_counter_ns()
+                profiler.record("frame", end - frameStart)
+                if events:      # From waking up with input to its frame being on the screen
+                    profiler.record("eventLatency", end - wakeTime)
+            clock.tick(maxFPS)
+    worker.close()
+    print("Loop: %d wakeups" % wakeups)
+    print("Renderer: " + renderer.stats())
+    if profiler.enabled():
+        print(profiler)
 
 '''
-This is responsible for highlighting tiles when a move is to be made
+The piece a pawn promotes to: a queen, or a knight, rook or bishop while Shift, Ctrl or Alt is held down
 '''
 
-def HighlightTiles(screen, bs, validMoves, tileSelected):
-    if tileSelected != ():
-        r, c = tileSelected
-        if bs.board[r][c][0] == ("w" if bs.whiteToMove else "b"):   # Checks that the selected piece is an ally
-            s = p.Surface((TileSize, TileSize))
-            s.set_alpha(80)
-            s.fill(p.Color("green"))
-            screen.blit(s, (c*TileSize, r*TileSize))
-            for move in validMoves:
-                if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol*TileSize, move.endRow*TileSize))
-
-def animateMove(move, screen, board, clock):
-    global colors
-    change_row = move.endRow - move.startRow
-    change_col = move.endCol - move.startCol
-    framesPerSquare = 5
-    # frameCount = (abs(change_row) + abs(change_col))*framesPerSquare
-    frameCount = max(abs(change_row), abs(change_col)) * framesPerSquare
-    if change_row != 0 and change_col != 0 or (change_row == 1 or change_col == 1):
-        frameCount += framesPerSquare
-    for frame in range(frameCount+1):
-        r, c = (move.startRow + change_row*frame/frameCount, move.startCol + change_col*frame/frameCount)
-        DrawTiles(screen)
-        DrawPieces(screen, board)
-        # Erase the moving piece in the ending tile
-        color = colors[(move.endRow + move.endCol) % 2]
-        endTile = p.Rect(move.endCol*TileSize, move.endRow*TileSize, TileSize, TileSize)
-        p.draw.rect(screen, color, endTile)
-        # Draw captured piece
-        if move.pieceCaptured != "--":
-            screen.blit(Images[move.pieceCaptured], endTile)
-        # Draw moving piece
-        screen.blit(Images[move.pieceMoved], p.Rect(c*TileSize, r*TileSize, TileSize, TileSize))
-        p.display.flip()
-        clock.tick(60)
-
-
-def drawText(screen, text):
-    font = p.font.SysFont("Verdana", 40, True, False)
-    textObject = font.render(text, False, p.Color("black"))
-    textLocation = p.Rect(0, 0, Width, Height).move(Width/2-textObject.get_width()/2, Height/2-textObject.get_height()/2)
-    screen.blit(textObject, textLocation)
-    textObject = font.render(text, False, (180, 180, 180))
-    screen.blit(textObject, textLocation.move(2, 2))
+def promotionChoice():
+    mods = p.key.get_mods()
+    for mod, piece in ((p.KMOD_SHIFT, "N"), (p.KMOD_CTRL, "R"), (p.KMOD_ALT, "B")):
+        if mods & mod:
+            return piece
+    return "Q"
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chess Engine")
+    parser.add_argument("--fps", type=int, default=MaxFPS, help="most frames drawn per second (default: %d)" % MaxFPS)
+    parser.add_argument("--atlas", help="directory where the scaled piece sprites are saved and loaded from")
+    parser.add_argument("--book", help="Polyglot opening book (.bin) the engine plays from")
+    parser.add_argument("--tablebases", metavar="DIR", help="folder of the endgame tables the engine plays from")
+    parser.add_argument("--profile", metavar="PATH", help="instrument the engine and write a JSON report to PATH on exit")
+    parser.add_argument("--cprofile", metavar="PATH", help="run under cProfile and write its statistics to PATH on exit")
+    args = parser.parse_args()
+    Render.assets.atlasDirectory = args.atlas
+    options = (args.fps, Book.OpeningBook(args.book) if args.book else None,
+               Tablebase.Tablebases(args.tablebases) if args.tablebases else None, bool(args.profile))
+    if args.cprofile:
+        Profiling.runProfiled(args.cprofile, main, *options)
+    else:
+        main(*options)
+    if args.profile:
+        Profiling.profiler.writeReport(args.profile)
@@ -0,0 +1,79 @@
+"""
+This is responsible for checking Book.polyglotKey against the reference keys of the Polyglot book format
+specification, which cover castling rights, the enpassant file and the side to move, on every backend, and the
+books written by buildBook and read back through OpeningBook.
+"""
+
+import pytest
+
+from Chess import Book
+from Chess import ChessEngine
+from Chess import Pgn
+
+Backends = ["list"] + sorted(ChessEngine.backends)
+# Moves from the start position and the key of the position they lead to
+ReferenceKeys = [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+]
+
+
+def play(bs, moves):
+    for notation in moves.split():
+        bs.makeMove(next(move for move in bs.getLegalMoves() if move.getChessNotation() == notation))
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("moves, key", ReferenceKeys)
+def testReferenceKeys(moves, key, backend):
+    bs = ChessEngine.BoardState(backend=backend)
+    play(bs, moves)
+    assert Book.polyglotKey(bs) == key
+    # The same position loaded from its FEN has the same key
+    assert Book.polyglotKey(ChessEngine.BoardState.fromFEN(bs.toFEN(), backend)) == key
+
+
+# Castling both ways and promotions to every piece, with and without a capture
+@pytest.mark.parametrize("fen", ["r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                                 "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 b kq - 0 1"])
+def testMoveCodes(fen):
+    validMoves = ChessEngine.BoardState.fromFEN(fen).getLegalMoves()
+    for move in validMoves:
+        assert Book.decodeMove(Book.encodeMove(move), validMoves) == move
+
+
+def testBuildAndProbeBook(tmp_path):
+    pgnPath = tmp_path / "games.pgn"
+    with Pgn.PgnWriter(pgnPath) as writer:
+        writer.writeGame({}, ["e4", "e5", "Nf3"], "1-0")
+        writer.writeGame({}, ["e4", "c5"], "0-1")
+        writer.writeGame({}, ["d4", "d5"], "1/2-1/2")
+        writer.writeGame({}, ["c4"], "*")        # Unfinished, left out
+    bookPath = tmp_path / "book.bin"
+    assert Book.buildBook([pgnPath], bookPath) == 6
+    with Book.OpeningBook(bookPath) as book:
+        assert len(book) == 6
+        bs = ChessEngine.BoardState()
+        # e4 scored a win and a loss for white (2 + 0), d4 a draw (1)
+        assert [(move.getChessNotation(), weight) for move, weight in book.moves(bs)] == [("e2e4", 2), ("d2d4", 1)]
+        assert book.bestMove(bs).getChessNotation() == "e2e4"
+        play(bs, "e2e4")
+        # e5 lost, it stays in the book with weight 0 and is never played
+        assert [(move.getChessNotation(), weight) for move, weight in book.moves(bs)] == [("c7c5", 2), ("e7e5", 0)]
+        play(bs, "a7a6")
+        assert book.moves(bs) == [] and book.bestMove(bs) is None and book.weightedMove(bs) is None
+
+
+def testEmptyBook(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    with Book.OpeningBook(path) as book:
+        assert len(book) == 0
+        assert book.bestMove(ChessEngine.BoardState()) is None
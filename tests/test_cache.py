@@ -0,0 +1,66 @@
+"""
+This is responsible for checking the MoveCache: lookups by position key, least recently used eviction, and that
+getValidMoves gives the same moves and game status with the cache as without it.
+"""
+
+from Chess import ChessEngine
+from Chess import Perft
+
+
+def testHitsAndMisses():
+    cache = ChessEngine.MoveCache()
+    assert cache.get(1) is None
+    cache.put(1, "one")
+    assert cache.get(1) == "one"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hitRate() == 0.5
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == cache.misses == 0
+
+
+def testLeastRecentlyUsedEviction():
+    cache = ChessEngine.MoveCache(maxSize=3)
+    for key in (1, 2, 3):
+        cache.put(key, key)
+    cache.get(1)            # 2 is now the one used longest ago
+    cache.put(4, 4)
+    assert len(cache) == 3
+    assert cache.get(2) is None
+    assert [cache.get(key) for key in (1, 3, 4)] == [1, 3, 4]
+    cache.put(3, 33)        # Storing a key again also makes it the most recent
+    cache.put(5, 5)
+    assert cache.get(1) is None
+    assert cache.get(3) == 33
+
+
+def testCachedMovesMatch():
+    cached = ChessEngine.BoardState.fromFEN(Perft.ReferencePositions["kiwipete"][0])
+    cached.moveCache = ChessEngine.MoveCache()
+    plain = ChessEngine.BoardState.fromFEN(Perft.ReferencePositions["kiwipete"][0])
+    assert Perft.perft(cached, 3, cached.getValidMoves) == Perft.perft(plain, 3) == 97862
+    hits, misses = cached.moveCache.hits, cached.moveCache.misses
+    assert misses == len(cached.moveCache)
+    # The second walk of the same tree finds every position it generates moves in (1 + 48 + 2039) in the cache
+    assert Perft.perft(cached, 3, cached.getValidMoves) == 97862
+    assert cached.moveCache.misses == misses
+    assert cached.moveCache.hits == hits + 2088
+
+    moves = cached.getValidMoves()
+    moves.clear()       # The caller gets a copy, the cached entry is not changed
+    moveIDs = sorted(move.moveID for move in plain.getValidMoves())
+    assert sorted(move.moveID for move in cached.getValidMoves()) == moveIDs
+
+
+def testCachedGameStatus():
+    bs = ChessEngine.BoardState()
+    bs.moveCache = ChessEngine.MoveCache()
+    for notation in "f2f3 e7e5 g2g4 d8h4".split():
+        bs.makeMove(next(move for move in bs.getValidMoves() if move.getChessNotation() == notation))
+    assert bs.getValidMoves() == [] and bs.checkmate
+    bs.undoMove()
+    bs.getValidMoves()
+    assert not bs.checkmate
+    bs.makeMove(next(move for move in bs.getValidMoves() if move.getChessNotation() == "d8h4"))
+    hits = bs.moveCache.hits
+    assert bs.getValidMoves() == [] and bs.checkmate
+    assert bs.moveCache.hits == hits + 1
@@ -0,0 +1,76 @@
+"""
+This is responsible for checking the evaluation sums BoardState keeps up to date in makeMove and undoMove: they equal
+the sums computed from scratch at every node of a small tree (Perft.checkKeys), after captures, promotions, castling
+and enpassant, and the sums of a position are the opposite of those of its mirror image with the colors swapped.
+"""
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Evaluation
+from Chess import Perft
+
+Backends = ["list"] + sorted(ChessEngine.backends)
+
+
+def play(bs, moves):
+    for notation in moves.split():
+        bs.makeMove(next(move for move in bs.getLegalMoves() if move.getChessNotation() == notation))
+
+
+def swapColors(fen):
+    fields = fen.split()
+    placement = "/".join(reversed(fields[0].split("/"))).swapcase()
+    rights = "".join(sorted(fields[2].swapcase(), key="KQkq".index)) if fields[2] != "-" else "-"
+    enpassant = fields[3][0] + ("6" if fields[3][1] == "3" else "3") if fields[3] != "-" else "-"
+    return " ".join([placement, "b" if fields[1] == "w" else "w", rights, enpassant] + fields[4:])
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("name", ["kiwipete", "promotions", "talkchess", "endgame"])
+def testSumsAtEveryNode(name, backend):
+    fen, counts = Perft.ReferencePositions[name]
+    bs = ChessEngine.BoardState.fromFEN(fen, backend)
+    # checkKeys checks the evaluation sums with the Zobrist key
+    assert Perft.checkKeys(bs, 2) == 1 + counts[1] + counts[2]
+
+
+def testMismatchIsReported():
+    bs = ChessEngine.BoardState()
+    bs.middlegameScore += 1
+    bs.evaluationLog[-1] = (bs.material, bs.middlegameScore, bs.endgameScore, bs.phase)
+    with pytest.raises(ValueError):
+        Perft.checkKeys(bs, 1)
+
+
+@pytest.mark.parametrize("backend", Backends)
+def testSpecialMoves(backend):
+    # Enpassant, castling, a capture and a promotion with capture, then back to the start
+    bs = ChessEngine.BoardState.fromFEN("rn2k3/P7/8/8/3pP3/8/8/4K2R b K e3 0 1", backend)
+    start = bs.evaluationLog[-1]
+    play(bs, "d4e3 e1g1 e3e2 a7b8q")
+    assert bs.evaluationLog[-1] == bs.computeEvaluation()
+    assert bs.material == 900 + 500 - 500 - 100
+    for _ in range(4):
+        bs.undoMove()
+    assert bs.evaluationLog[-1] == start == (bs.material, bs.middlegameScore, bs.endgameScore, bs.phase)
+
+
+@pytest.mark.parametrize("fen", [fen for fen, counts in Perft.ReferencePositions.values()])
+def testSymmetry(fen):
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    swapped = ChessEngine.BoardState.fromFEN(swapColors(fen))
+    assert (swapped.material, swapped.middlegameScore, swapped.endgameScore) == \
+        (-bs.material, -bs.middlegameScore, -bs.endgameScore)
+    assert swapped.phase == bs.phase
+    # taper rounds down, which can make a negative score one lower
+    assert abs(Evaluation.evaluate(swapped) - Evaluation.evaluate(bs)) <= 1
+
+
+def testStartPosition():
+    bs = ChessEngine.BoardState()
+    assert (bs.material, bs.middlegameScore, bs.endgameScore, bs.phase) == (0, 0, 0, Evaluation.MaxPhase)
+    assert Evaluation.evaluate(bs) == 0
+    play(bs, "e2e4")
+    # Black to move after a good first move for White
+    assert Evaluation.evaluate(bs) < 0
@@ -0,0 +1,98 @@
+"""
+This is responsible for checking that loadFEN and toFEN give back the FEN they were given, on every backend and also
+for positions reached by playing moves, and that PositionLoader reads FEN and EPD files line by line.
+"""
+
+import gzip
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Perft
+from Chess import PositionLoader
+
+Backends = ["list"] + sorted(ChessEngine.backends)
+Fens = [fen for fen, counts in Perft.ReferencePositions.values()] + [
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "8/8/8/8/8/8/6k1/4K2R w K - 12 60",
+    "4k3/8/8/8/8/8/8/4K3 b - - 99 120",
+]
+
+
+def play(bs, moves):
+    for notation in moves.split():
+        bs.makeMove(next(move for move in bs.getValidMoves() if move.getChessNotation() == notation))
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("fen", Fens)
+def testRoundTrip(fen, backend):
+    assert ChessEngine.BoardState.fromFEN(fen, backend).toFEN() == fen
+
+
+def testStartPosition():
+    assert ChessEngine.BoardState().toFEN() == ChessEngine.StartFEN
+
+
+@pytest.mark.parametrize("backend", Backends)
+def testAfterMoves(backend):
+    bs = ChessEngine.BoardState(backend)
+    play(bs, "e2e4 c7c5 g1f3")
+    assert bs.toFEN() == "rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    bs.undoMove()
+    assert bs.toFEN() == "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2"
+
+
+def testEPDCounters():
+    bs = ChessEngine.BoardState.fromFEN("4k3/8/8/8/8/8/8/4K3 w - -")
+    assert bs.toFEN() == "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
+
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",         # 7 ranks
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQ1BNR w kq - 0 1",  # No white king
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KX - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e5 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - zero 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w",
+])
+def testInvalidFEN(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.BoardState.fromFEN(fen)
+
+
+def testSplitLine():
+    assert PositionLoader.splitLine('4k3/8/8/8/8/8/8/4K3 w - - bm Kd2; id "pos 1"; hmvc 7;') == \
+        ("4k3/8/8/8/8/8/8/4K3 w - - 7 1", {"bm": "Kd2", "id": "pos 1", "hmvc": "7"})
+    assert PositionLoader.splitLine("4k3/8/8/8/8/8/8/4K3 b - - 3 40") == ("4k3/8/8/8/8/8/8/4K3 b - - 3 40", {})
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def testIterPositions(tmp_path, compressed):
+    lines = ["# reference positions", ""] + Fens + ['4k3/8/8/8/8/8/8/4K3 w - - id "bare kings";']
+    path = tmp_path / ("positions.fen.gz" if compressed else "positions.fen")
+    with (gzip.open(path, "wt") if compressed else open(path, "w")) as file:
+        file.write("\n".join(lines) + "\n")
+    positions = list(PositionLoader.iterPositions(path, withOperations=True))
+    assert [bs.toFEN() for bs, operations in positions] == Fens + ["4k3/8/8/8/8/8/8/4K3 w - - 0 1"]
+    assert positions[-1][1] == {"id": "bare kings"}
+    reused = [bs.toFEN() for bs in PositionLoader.iterPositions(path, reuse=True)]
+    assert reused == Fens + ["4k3/8/8/8/8/8/8/4K3 w - - 0 1"]
+
+
+def testInvalidLine(tmp_path):
+    path = tmp_path / "positions.fen"
+    path.write_text(ChessEngine.StartFEN + "\nnot a position\n")
+    with pytest.raises(ValueError, match="positions.fen:2"):
+        list(PositionLoader.iterPositions(path))
+    assert len(list(PositionLoader.iterPositions(path, skipInvalid=True))) == 1
+
+
+@pytest.mark.parametrize("backend", Backends)
+def testRightsWithoutPiecesAtHomeAreDropped(backend):
+    bs = ChessEngine.BoardState.fromFEN("r3k3/8/8/8/8/8/8/R3K1R1 w KQkq - 0 1", backend)
+    assert bs.toFEN() == "r3k3/8/8/8/8/8/8/R3K1R1 w Qq - 0 1"
+    # Castling is never generated with a right whose rook is missing
+    assert all(not move.isCastleMove or move.endCol == 2 for move in bs.getLegalMoves())
@@ -0,0 +1,59 @@
+"""
+This is responsible for checking the incremental Zobrist key: Perft.checkKeys compares it with the key computed from
+scratch at every node of a small tree, and the same position reached in different ways has the same key.
+"""
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Perft
+
+Backends = ["list"] + sorted(ChessEngine.backends)
+
+
+def play(bs, moves):
+    for notation in moves.split():
+        bs.makeMove(next(move for move in bs.getValidMoves() if move.getChessNotation() == notation))
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("name", sorted(Perft.ReferencePositions))
+def testCheckKeys(name, backend):
+    fen, counts = Perft.ReferencePositions[name]
+    bs = ChessEngine.BoardState.fromFEN(fen, backend)
+    # Every node of a depth 2 tree: the root, its moves and their replies
+    assert Perft.checkKeys(bs, 2) == 1 + counts[1] + counts[2]
+
+
+def testMismatchIsReported():
+    bs = ChessEngine.BoardState()
+    bs.zobristKey ^= 1
+    with pytest.raises(ValueError):
+        Perft.checkKeys(bs, 1)
+
+
+@pytest.mark.parametrize("backend", Backends)
+def testTransposition(backend):
+    first = ChessEngine.BoardState(backend)
+    play(first, "g1f3 g8f6 b1c3 b8c6")
+    second = ChessEngine.BoardState(backend)
+    play(second, "b1c3 b8c6 g1f3 g8f6")
+    assert first.zobristKey == second.zobristKey
+    assert first.zobristKey == ChessEngine.BoardState.fromFEN(first.toFEN(), backend).zobristKey
+
+
+def testStateIsPartOfTheKey():
+    keys = {ChessEngine.BoardState.fromFEN(fen).zobristKey for fen in (
+        "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1",
+        "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1",     # Side to move
+        "r3k2r/8/8/8/8/8/8/R3K2R w Kkq - 0 1",      # Castling rights
+        "r3k2r/8/8/8/8/8/8/R3K2R w KQk - 0 1",
+        "r3k2r/8/8/8/8/8/8/R3K2R w - - 0 1",
+    )}
+    assert len(keys) == 5
+    # Moving the kings away and back loses the castling rights, so the position is not the same
+    bs = ChessEngine.BoardState.fromFEN("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    key = bs.zobristKey
+    play(bs, "e1d1 e8d8 d1e1 d8e8")
+    assert bs.zobristKey != key
+    assert bs.zobristKey == ChessEngine.BoardState.fromFEN("r3k2r/8/8/8/8/8/8/R3K2R w - - 0 1").zobristKey
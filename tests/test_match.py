@@ -0,0 +1,40 @@
+"""
+This is responsible for checking the statistics of a match: the SPRT log-likelihood ratio ends the test when every
+game had the same result, and the score interval keeps a width.
+"""
+
+import math
+
+from Chess.Match import MatchStats
+
+
+def statsOf(wins, draws, losses):
+    stats = MatchStats()
+    for score, count in ((1.0, wins), (0.5, draws), (0.0, losses)):
+        for _ in range(count):
+            stats.add(score)
+    return stats
+
+
+def testSweepCrossesBounds():
+    assert statsOf(100, 0, 0).llr(0, 10) == math.inf
+    assert statsOf(0, 0, 100).llr(0, 10) == -math.inf
+
+
+def testDrawsFavourTheCloserHypothesis():
+    assert statsOf(0, 50, 0).llr(10, 20) == -math.inf
+    assert statsOf(0, 50, 0).llr(-10, 10) == 0.0
+
+
+def testNoGames():
+    assert MatchStats().llr(0, 10) == 0.0
+
+
+def testLlrSign():
+    assert statsOf(60, 20, 20).llr(0, 10) > 0
+    assert statsOf(20, 20, 60).llr(0, 10) < 0
+
+
+def testSweepIntervalKeepsWidth():
+    low, high = statsOf(10, 0, 0).scoreInterval()
+    assert 0.5 < low < 1.0 and high == 1.0
@@ -0,0 +1,52 @@
+"""
+This is responsible for checking MoveIndex, the legal moves of a position indexed by tile: every legal move is
+found from its start and end tiles, promotions by their piece, and the highlighted tiles are the ends of the moves.
+"""
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Perft
+
+# Promotions with and without a capture, castling, enpassant and pins
+Fens = [fen for fen, counts in Perft.ReferencePositions.values()] + [
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+]
+
+
+@pytest.mark.parametrize("fen", Fens)
+def testEveryMoveIsFound(fen):
+    moves = ChessEngine.BoardState.fromFEN(fen).getLegalMoves()
+    index = ChessEngine.MoveIndex(moves)
+    assert len(index) == len(moves)
+    for move in moves:
+        start, end = (move.startRow, move.startCol), (move.endRow, move.endCol)
+        assert index.find(start, end, move.promotionChoice) is move
+        assert move in index.movesFrom(start)
+        assert end in index.highlights(start)
+    for start in {(move.startRow, move.startCol) for move in moves}:
+        assert index.highlights(start) == frozenset([start] + [(move.endRow, move.endCol) for move in moves
+                                                               if (move.startRow, move.startCol) == start])
+
+
+def testPromotions():
+    # b7 can push to b8 or take on a8, a promotion each way to every piece
+    bs = ChessEngine.BoardState.fromFEN("r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+    index = ChessEngine.MoveIndex(bs.getLegalMoves())
+    for end in ((0, 1), (0, 0)):
+        assert sorted(index.promotionChoices((1, 1), end)) == ["B", "N", "Q", "R"]
+        for piece in "QRBN":
+            move = index.find((1, 1), end, piece)
+            assert move.isPawnPromotion and move.promotionChoice == piece
+        assert index.find((1, 1), end).promotionChoice == "Q"      # A queen unless another piece is asked for
+    assert index.promotionChoices((7, 4), (7, 3)) == ()
+
+
+def testMissingMoves():
+    index = ChessEngine.MoveIndex(ChessEngine.BoardState().getLegalMoves())
+    assert index.find((6, 4), (3, 4)) is None       # e2e5
+    assert index.find((4, 4), (3, 4)) is None       # Nothing on e4
+    assert index.movesFrom((4, 4)) == ()
+    assert index.highlights((4, 4)) == frozenset([(4, 4)])
+    assert index.promotionChoices((6, 4), (4, 4)) == ()
+    assert len(ChessEngine.MoveIndex()) == 0
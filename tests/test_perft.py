@@ -0,0 +1,102 @@
+"""
+This is responsible for checking the move generator against the published perft node counts of the reference
+positions, on every backend. Depths are kept to the ones that count up to MaxNodes nodes, so the suite runs in seconds.
+"""
+
+import concurrent.futures
+import copy
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Perft
+
+MaxNodes = 100000
+Backends = ["list"] + sorted(ChessEngine.backends)
+Cases = [(name, depth, nodes) for name, (fen, counts) in Perft.ReferencePositions.items()
+         for depth, nodes in counts.items() if nodes <= MaxNodes]
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("name, depth, nodes", Cases)
+def testPerft(name, depth, nodes, backend):
+    bs = ChessEngine.BoardState.fromFEN(Perft.ReferencePositions[name][0], backend)
+    assert Perft.perft(bs, depth) == nodes
+
+
+# The make/undo generator is the reference the pin and check generator was written against
+@pytest.mark.parametrize("name", ["start", "kiwipete", "endgame", "promotions", "talkchess"])
+def testMakeUndoGenerator(name):
+    fen, counts = Perft.ReferencePositions[name]
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    assert Perft.perft(bs, 2, bs.getLegalMovesMakeUndo) == counts[2]
+
+
+@pytest.mark.parametrize("backend", Backends)
+def testPerftRestoresPosition(backend):
+    bs = ChessEngine.BoardState.fromFEN(Perft.ReferencePositions["kiwipete"][0], backend)
+    board = copy.deepcopy(bs.board)
+    rights = vars(bs.currentCastlingRights).copy()
+    Perft.perft(bs, 3)
+    assert bs.board == board
+    assert vars(bs.currentCastlingRights) == rights
+    assert bs.possibleEnpassant == ()
+    assert bs.whiteToMove
+    assert len(bs.moveLog) == 0
+
+
+def checkCaptures(bs, depth):
+    captures = [move for move in bs.getLegalMoves() if move.pieceCaptured != "--" or move.isPawnPromotion]
+    assert sorted(move.pack() for move in bs.getLegalMoves(quiet=False)) == sorted(move.pack() for move in captures)
+    if depth > 1:
+        for move in bs.getLegalMoves():
+            bs.makeMove(move)
+            checkCaptures(bs, depth - 1)
+            bs.undoMove()
+
+
+@pytest.mark.parametrize("backend", Backends)
+@pytest.mark.parametrize("name", ["kiwipete", "endgame", "promotions", "talkchess"])
+def testCapturesAreTheCapturingMoves(name, backend):
+    # quiet=False generates exactly the captures and promotions, for the quiescence search
+    checkCaptures(ChessEngine.BoardState.fromFEN(Perft.ReferencePositions[name][0], backend), 2)
+
+
+def testDivideSumsToPerft():
+    bs = ChessEngine.BoardState.fromFEN(Perft.ReferencePositions["kiwipete"][0])
+    split = Perft.divide(bs, 2)
+    assert len(split) == 48
+    assert sum(split.values()) == 2039
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self, workers):
+        super().__init__(workers)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+def testParallelDivideUsesGivenExecutor():
+    # The tasks are split into about 8 chunks per worker of the executor given, not per CPU
+    fen = Perft.ReferencePositions["kiwipete"][0]
+    with CountingExecutor(1) as executor:
+        split = Perft.parallelDivide(fen, 3, executor=executor)
+    assert split == Perft.divide(ChessEngine.BoardState.fromFEN(fen), 3)
+    assert executor.submitted <= 9
+
+
+def testUnknownBackend():
+    with pytest.raises(ValueError):
+        ChessEngine.BoardState("abacus")
+
+
+def testPerftIsSilent(capsys):
+    # Mates and stalemates at the leaves are counted without printing or touching the game status flags
+    bs = ChessEngine.BoardState.fromFEN("k7/8/1K6/8/8/8/8/6Q1 w - - 0 1")
+    Perft.perft(bs, 2)
+    Perft.divide(bs, 2)
+    assert capsys.readouterr().out == ""
+    assert not bs.checkmate and not bs.stalemate
@@ -0,0 +1,112 @@
+"""
+This is responsible for checking SAN and PGN: moves written in SAN read back as the same moves, and a game written
+with formatGame reads back with iterGames to the same tags, moves, result and final position.
+"""
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Pgn
+
+# Castling on both sides, enpassant, under-promotion with capture, a file and a rank disambiguation, check and mate
+Games = [
+    ("e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 e1g1 f8c5 d2d3 d7d6 c1g5 h7h6 g5f6 d8f6 b1c3 c8g4 h2h3 g4h5 c3d5 f6d8 c2c3 e8g8",
+     ChessEngine.StartFEN),
+    ("f2f4 e7e5 g2g4 d8h4", ChessEngine.StartFEN),
+    ("e2e4 a7a6 e4e5 d7d5 e5d6 c7d6 d2d4 b8c6 b1c3 c8d7 c1e3 d8c7 d1d2 e8c8", ChessEngine.StartFEN),
+    ("a7b8n", "rn2k3/P7/8/8/8/8/8/4K3 w - - 0 1"),
+    ("a1d1 e8e7 d1d5", "4k3/8/8/R7/8/8/8/R4RK1 w - - 0 1"),
+    ("a5a3 e8d7", "4k3/8/8/R7/8/8/8/R5K1 w - - 0 1"),
+    ("e1g1 e8c8", "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"),
+]
+
+
+@pytest.mark.parametrize("moves, fen", Games)
+def testSANRoundTrip(moves, fen):
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    sanMoves = Pgn.coordinatesToSAN(moves.split(), fen)
+    for notation, san in zip(moves.split(), sanMoves):
+        move = Pgn.sanToMove(bs, san)
+        assert move.getChessNotation() == notation
+        assert Pgn.sanToMoveTrusted(bs, san) == move
+        bs.makeMove(move)
+
+
+def testSANNotation():
+    assert Pgn.coordinatesToSAN("e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 f3g5 d7d5 e4d5 f6d5 g5f7".split()) == \
+        ["e4", "e5", "Nf3", "Nc6", "Bc4", "Nf6", "Ng5", "d5", "exd5", "Nxd5", "Nxf7"]
+    assert Pgn.coordinatesToSAN("f2f3 e7e5 g2g4 d8h4".split())[-1] == "Qh4#"
+    assert Pgn.coordinatesToSAN(["a7b8n"], "rn2k3/P7/8/8/8/8/8/4K3 w - - 0 1") == ["axb8=N"]
+    assert Pgn.coordinatesToSAN(["e1g1"], "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1") == ["O-O"]
+    assert Pgn.coordinatesToSAN("a1d1 e8e7 d1d5".split(), "4k3/8/8/R7/8/8/8/R4RK1 w - - 0 1") == \
+        ["Rad1", "Ke7", "Rdd5"]
+    assert Pgn.coordinatesToSAN(["a5a3"], "4k3/8/8/R7/8/8/8/R5K1 w - - 0 1") == ["R5a3"]
+
+
+def testTwinOutOfReachGeneratesNoMoves(monkeypatch):
+    # The knights on b1 and g1 cannot both reach f3, so Nf3 needs no legal moves to be written
+    bs = ChessEngine.BoardState()
+    move = ChessEngine.Move((7, 6), (5, 5), bs.board)
+    monkeypatch.setattr(bs, "getLegalMoves", lambda: pytest.fail("legal moves generated"))
+    assert Pgn.moveToSAN(bs, move) == "Nf3"
+
+
+def testIllegalSAN():
+    bs = ChessEngine.BoardState()
+    with pytest.raises(ValueError):
+        Pgn.sanToMove(bs, "e5")
+    with pytest.raises(ValueError):
+        Pgn.sanToMove(bs, "Zz9")
+
+
+@pytest.mark.parametrize("moves, fen", Games)
+def testPGNRoundTrip(moves, fen):
+    sanMoves = Pgn.coordinatesToSAN(moves.split(), fen)
+    tags = {"Event": 'Test "round trip"', "White": "A", "Black": "B"}
+    text = Pgn.formatGame(tags, sanMoves, "1/2-1/2", fen)
+    games = list(Pgn.iterGames(text.splitlines()))
+    assert len(games) == 1
+    game = games[0]
+    assert game.moves == sanMoves
+    assert game.result == "1/2-1/2"
+    assert game.tags["Event"] == tags["Event"]
+    assert game.fen() == fen
+    assert str(game) == text
+
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    for notation in moves.split():
+        bs.makeMove(next(move for move in bs.getLegalMoves() if move.getChessNotation() == notation))
+    for final, _ in game.replay():     # The last move is made when the replay finishes
+        pass
+    assert final.toFEN() == bs.toFEN()
+
+
+def testSeveralGames():
+    text = "".join(Pgn.formatGame({}, Pgn.coordinatesToSAN(moves.split(), fen), "*", fen) for moves, fen in Games)
+    assert [game.moves for game in Pgn.iterGames(text.splitlines())] == \
+        [Pgn.coordinatesToSAN(moves.split(), fen) for moves, fen in Games]
+
+
+def testCommentsAndVariations():
+    text = "1. e4 {best by test} e5 (1... c5 2. Nf3) 2. Nf3 $1 Nc6 ; a comment\n3. Bb5 1-0\n"
+    game = next(Pgn.iterGames(text.splitlines()))
+    assert game.moves == ["e4", "e5", "Nf3", "Nc6", "Bb5"]
+    assert game.result == "1-0"
+
+
+def testWriteAndReadFile(tmp_path):
+    path = tmp_path / "games.pgn"
+    with Pgn.PgnWriter(path) as writer:
+        for moves, fen in Games:
+            writer.writeGame({"Event": "Test"}, Pgn.coordinatesToSAN(moves.split(), fen), "*", fen)
+    assert writer.games == len(Games)
+    games = list(Pgn.readGames(path))
+    assert [game.fen() for game in games] == [fen for moves, fen in Games]
+    assert [game.moves for game in games] == [Pgn.coordinatesToSAN(moves.split(), fen) for moves, fen in Games]
+
+
+def testLongGameIsWrapped():
+    moves = "g1f3 g8f6 f3g1 f6g8 " * 10
+    text = Pgn.formatGame({}, Pgn.coordinatesToSAN(moves.split()))
+    assert max(len(line) for line in text.splitlines()) <= Pgn.LineLength
+    assert len(next(Pgn.iterGames(text.splitlines())).moves) == 40
@@ -0,0 +1,114 @@
+"""
+This is responsible for checking the tablebases: a KQK table is generated once for the module and every probed
+position must agree with the probes of the positions after its legal moves (a win in n plies has a move to a loss in
+n - 1, a loss has only moves to wins, a draw has no move to a loss), whatever side has the pieces and however the
+board is mirrored.
+"""
+
+import random
+
+import pytest
+
+from Chess import ChessEngine
+from Chess import Tablebase
+
+
+@pytest.fixture(scope="module")
+def tablebases(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("tablebases")
+    Tablebase.generateTable("KQK", str(directory))
+    tablebases = Tablebase.Tablebases(str(directory))
+    yield tablebases
+    tablebases.close()
+
+
+'''
+Legal KQK positions from a seeded generator, as FEN with White or Black holding the queen
+'''
+
+def randomPositions(count, seed=1):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        tiles = rng.sample(range(64), 3)
+        board = [["--"] * 8 for _ in range(8)]
+        for tile, piece in zip(tiles, ("wK", "bK", "wQ")):
+            board[tile // 8][tile % 8] = piece
+        bs = ChessEngine.BoardState.fromFEN("4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+        bs.board = board
+        bs.whiteKingLocation = divmod(tiles[0], 8)
+        bs.blackKingLocation = divmod(tiles[1], 8)
+        bs.whiteToMove = rng.random() < 0.5
+        fen = bs.toFEN()
+        bs = ChessEngine.BoardState.fromFEN(fen)
+        # Kings side by side, or the side not to move in check, cannot happen in a game
+        if max(abs(tiles[0] // 8 - tiles[1] // 8), abs(tiles[0] % 8 - tiles[1] % 8)) <= 1:
+            continue
+        bs.whiteToMove = not bs.whiteToMove
+        inCheck = bs.inCheck()
+        bs.whiteToMove = not bs.whiteToMove
+        if not inCheck:
+            positions.append(fen)
+    return positions
+
+
+def swapColors(fen):
+    fields = fen.split()
+    placement = "/".join(reversed(fields[0].split("/"))).swapcase()
+    return " ".join([placement, "b" if fields[1] == "w" else "w"] + fields[2:])
+
+
+def mirror(fen):
+    fields = fen.split()
+    ranks = []
+    for rank in fields[0].split("/"):
+        expanded = "".join("1" * int(char) if char.isdigit() else char for char in rank)[::-1]
+        ranks.append(expanded)
+    board = ChessEngine.BoardState.fromFEN(" ".join(["/".join(ranks)] + fields[1:]))
+    return board.toFEN()
+
+
+@pytest.mark.parametrize("fen", randomPositions(60))
+def testProbeConsistency(tablebases, fen):
+    bs = ChessEngine.BoardState.fromFEN(fen)
+    result, plies = tablebases.probe(bs)
+    moves = bs.getLegalMoves()
+    children = []
+    for move in moves:
+        bs.makeMove(move)
+        children.append(tablebases.probe(bs))
+        bs.undoMove()
+    if not moves:
+        assert (result, plies) == ((-1, 0) if bs.inCheck() else (0, 0))
+    elif result == 1:
+        assert (-1, plies - 1) in children
+        assert all(not (child[0] == -1 and child[1] < plies - 1) for child in children)
+    elif result == -1:
+        assert all(child[0] == 1 for child in children)
+        assert max(child[1] for child in children) == plies - 1
+    else:
+        assert all(child[0] != -1 for child in children)
+
+    # The same position with the colors swapped, or mirrored left to right, has the same value
+    assert tablebases.probe(ChessEngine.BoardState.fromFEN(swapColors(fen))) == (result, plies)
+    assert tablebases.probe(ChessEngine.BoardState.fromFEN(mirror(fen))) == (result, plies)
+
+
+def testKnownValues(tablebases):
+    probe = lambda fen: tablebases.probe(ChessEngine.BoardState.fromFEN(fen))
+    assert probe("k7/2Q5/1K6/8/8/8/8/8 b - - 0 1") == (0, 0)         # Stalemate
+    assert probe("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1") == (-1, 0)        # Mated
+    assert probe("k7/8/1K6/8/8/8/8/6Q1 w - - 0 1") == (1, 1)         # Qg8 mates
+    assert probe("k7/1Q6/8/8/8/8/8/7K b - - 0 1") == (0, 0)          # The queen is taken
+    assert probe("4k3/8/8/8/8/8/8/4K3 w - - 0 1") == (0, 0)          # Dead draw, no table needed
+    assert probe("r3k3/8/8/8/8/8/8/4K3 w q - 0 1") is None          # Castling rights are not in the tables
+    assert probe("4k3/8/8/8/8/8/8/4KR2 w - - 0 1") is None          # KRK was not generated
+
+
+def testBestMoveMates(tablebases):
+    bs = ChessEngine.BoardState.fromFEN("8/8/8/3k4/8/8/8/Q3K3 w - - 0 1")
+    result, plies = tablebases.probe(bs)
+    assert result == 1
+    for ply in range(plies):
+        bs.makeMove(tablebases.bestMove(bs))
+    assert bs.getLegalMoves() == [] and bs.inCheck()
@@ -0,0 +1,65 @@
+"""
+This is responsible for checking the EngineWorker: results of cancelled requests are never handed back, and a
+cancel stops a search even when it lands before the search has started.
+"""
+
+import threading
+import time
+
+from Chess import ChessEngine
+from Chess import Search
+from Chess import Worker
+
+
+def waitFor(worker, kind, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        for result in worker.poll():
+            if result.kind == kind:
+                return result
+        time.sleep(0.01)
+    return None
+
+
+def testMoves():
+    worker = Worker.EngineWorker()
+    try:
+        worker.requestMoves(ChessEngine.BoardState())
+        result = waitFor(worker, "moves")
+        assert len(result.moves) == 20 and not result.checkmate and not worker.busy()
+    finally:
+        worker.close()
+
+
+def testCancelledSearchStopsAtOnce():
+    worker = Worker.EngineWorker()
+    loadFEN = worker.bs.loadFEN
+    cancelled = threading.Event()
+
+    def loadThenCancel(fen):    # The cancel lands after the generation check, while the position is loaded
+        worker.bs.loadFEN = loadFEN
+        loadFEN(fen)
+        worker.cancel()
+        cancelled.set()
+    worker.bs.loadFEN = loadThenCancel
+    try:
+        bs = ChessEngine.BoardState()
+        worker.requestBestMove(bs, timeLimit=60)
+        assert cancelled.wait(5)
+        start = time.perf_counter()
+        worker.requestMoves(bs)
+        assert waitFor(worker, "moves") is not None
+        assert time.perf_counter() - start < 5
+        assert waitFor(worker, "search", timeout=0.5) is None     # Stale searches are never handed back
+    finally:
+        worker.close()
+
+
+def testCancelledCallable():
+    bs = ChessEngine.BoardState()
+    searcher = Search.Searcher()
+    result = searcher.search(bs, maxDepth=20, timeLimit=60, cancelled=lambda: True)
+    assert result.nodes <= 1024
+    assert result.move is not None
+    # The next search does not inherit the cancel
+    assert searcher.search(bs, maxDepth=2).depth() == 2